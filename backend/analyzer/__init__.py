@@ -1,5 +1,18 @@
 """Item analysis functionality."""
 
-from .engine import Analyzer
+import typing as tp
+
+if tp.TYPE_CHECKING:
+    from .engine import Analyzer
 
 __all__ = ["Analyzer"]
+
+
+def __getattr__(name: str) -> tp.Any:
+    # The engine pulls in the model provider SDKs, which take most of the
+    # startup time: load it only when the analyzer is first needed.
+    if name == "Analyzer":
+        from .engine import Analyzer
+
+        return Analyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
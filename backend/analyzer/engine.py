@@ -1,13 +1,49 @@
+import contextlib
+import json
+import time
+import typing as tp
 from textwrap import dedent
 
 import instructor
-from groq import AsyncGroq
-from pydantic import BaseModel, Field, create_model
+import openai
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+from openai import AsyncOpenAI
+from pydantic import BaseModel, ValidationError
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt
 
 from backend.common.logging import log
+from backend.common.metrics import (
+    LLM_CALL_DURATION,
+    LLM_CALLS_IN_FLIGHT,
+    LLM_TOKENS,
+    QUEUE_DEPTH,
+    STAGE_DURATION,
+)
+from backend.common.timing import timed
 from backend.config import settings
 
+from .filters import filter_registry, schema_size
+from .images import image_fetcher
 from .models import FilterModel, ImageModel, ItemModel
+from .packing import ItemPacker
+from .resilience import Resilience
+from .scheduler import RateScheduler
+
+FAKE_SERVER_URL = "http://127.0.0.1:8001/v1"
+REASK_ATTEMPTS = 3
+
+
+def reask_retrying() -> AsyncRetrying:
+    """Let instructor re-ask the model when its answer does not validate.
+
+    Any other error is raised at once: provider errors are retried by
+    `Resilience`, with backoff and a circuit breaker.
+    """
+    return AsyncRetrying(
+        stop=stop_after_attempt(REASK_ATTEMPTS),
+        retry=retry_if_exception_type((ValidationError, json.JSONDecodeError)),
+        reraise=True,
+    )
 
 
 class Analyzer:
@@ -27,16 +63,79 @@ class Analyzer:
     )
 
     def __init__(self):
-        """Initialize the analyzer with Groq."""
-        self.config = settings.groq
-        log.info("Initializing Groq model", name=self.config.model_name)
-        self.client = self._create_groq_client(api_key=self.config.api_key)
+        """Initialize the analyzer with the configured model provider."""
+        self.config = settings.provider
+        log.info(
+            "Initializing model", name=self.config.model_name, backend=settings.inference.backend
+        )
+        self.scheduler = RateScheduler(
+            requests_per_minute=self.config.requests_per_minute,
+            tokens_per_minute=self.config.tokens_per_minute,
+            max_concurrency=self.config.max_concurrency,
+            max_queue=self.config.max_queue,
+            queue_timeout=self.config.queue_timeout,
+            headroom=self.config.rate_headroom * self.config.rate_share,
+        )
+        self.resilience = Resilience(settings.resilience)
+        self.client = self._create_client()
+        self.packer = ItemPacker(self, settings.packing) if settings.packing.enabled else None
+        QUEUE_DEPTH.set_function(lambda: self.scheduler.waiting, queue="llm")
+        QUEUE_DEPTH.set_function(
+            lambda: self.packer.stats()["pending"] if self.packer is not None else 0,
+            queue="packing",
+        )
+        LLM_CALLS_IN_FLIGHT.set_function(lambda: self.scheduler.running)
+
+    def _create_client(self) -> instructor.AsyncInstructor:
+        """Create the configured provider client with instructor patch."""
+        inference = settings.inference
+        log.debug("Creating model client", backend=inference.backend)
+        # Retries are handled by `Resilience`, with backoff and a circuit breaker
+        if inference.backend == "groq":
+            groq_client = AsyncGroq(
+                api_key=settings.groq.api_key,
+                base_url=inference.base_url,
+                http_client=DefaultAsyncHttpxClient(
+                    event_hooks={"response": [self.scheduler.observe]}
+                ),
+                max_retries=0,
+            )
+            return instructor.from_groq(groq_client, mode=instructor.Mode.JSON)
+
+        base_url = inference.base_url
+        if inference.backend == "fake" and base_url is None:
+            base_url = FAKE_SERVER_URL
+        openai_client = AsyncOpenAI(
+            api_key=inference.api_key or "unused",
+            base_url=base_url,
+            http_client=openai.DefaultAsyncHttpxClient(
+                event_hooks={"response": [self.scheduler.observe]}
+            ),
+            max_retries=0,
+        )
+        return instructor.from_openai(openai_client, mode=instructor.Mode.JSON)
+
+    @staticmethod
+    def image_parts(images: list[ImageModel]) -> list[dict[str, tp.Any]]:
+        return [{"type": "image_url", "image_url": {"url": image.base64}} for image in images]
+
+    @staticmethod
+    def format_details(item: ItemModel) -> str:
+        if item.model_extra is not None:
+            item_details = [
+                f"- {key.title().replace('_', ' ')}: {value}"
+                for key, value in item.model_extra.items()
+            ]
+        else:
+            item_details = ["N/A"]
+        return "\n".join(item_details)
 
-    def _create_groq_client(self, api_key: str) -> instructor.AsyncInstructor:
-        """Create an AsyncGroq model with instructor patch."""
-        log.debug("Creating AsyncGroq model")
-        groq_client = AsyncGroq(api_key=api_key)
-        return instructor.from_groq(groq_client, mode=instructor.Mode.JSON)
+    def build_prompt(self, item: ItemModel, images: list[ImageModel]) -> str:
+        return self.PROMPT_TEMPLATE.format(
+            item_title=item.title,
+            item_images="<image>" * len(images),
+            item_details=self.format_details(item),
+        )
 
     async def predict(
         self,
@@ -45,38 +144,55 @@ class Analyzer:
         images: list[ImageModel],
         schema: type[BaseModel],
     ) -> "BaseModel":
-        response = await self.client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        *[
-                            {"type": "image_url", "image_url": {"url": image.base64}}
-                            for image in images
-                        ],
-                    ],
-                }
-            ],
-            response_model=schema,
-        )
-        return response
+        content = [{"type": "text", "text": prompt}, *self.image_parts(images)]
+        return await self.complete(model, content, schema)
 
-    @staticmethod
-    def _create_filter_schema(filters: list[FilterModel]) -> type[BaseModel]:
-        """Create a Pydantic model schema based on filters list."""
-        return create_model(
-            "DynamicSchema",
-            **{
-                f.name: (
-                    bool,
-                    Field(title=f"FilterModel {i}", json_schema_extra={"desc": f.desc}),
-                )
-                for i, f in enumerate(filters, start=1)
-            },
+    async def complete(
+        self,
+        model: str,
+        content: list[dict[str, tp.Any]],
+        schema: type[BaseModel],
+    ) -> "BaseModel":
+        """Send one user message with interleaved text and images, with retries."""
+        # Rough reservation (~4 characters per token), corrected with the actual usage
+        text_chars = sum(len(part["text"]) for part in content if part["type"] == "text")
+        images_count = sum(part["type"] == "image_url" for part in content)
+        text_chars += schema_size(schema)
+        reserved = text_chars // 4 + self.config.image_tokens * images_count
+        return await self.resilience.call(
+            lambda: self._complete_once(model, content, schema, reserved),
+            admit=lambda: self._admitted(reserved),
         )
 
+    @contextlib.asynccontextmanager
+    async def _admitted(self, reserved: int) -> tp.AsyncIterator[None]:
+        """Hold a scheduler slot for one request, recording the time spent queued."""
+        queued_at = time.perf_counter()
+        async with self.scheduler.slot(reserved):
+            STAGE_DURATION.observe(
+                time.perf_counter() - queued_at, stage="llm_queue", outcome="success"
+            )
+            yield
+
+    async def _complete_once(
+        self,
+        model: str,
+        content: list[dict[str, tp.Any]],
+        schema: type[BaseModel],
+        reserved: int,
+    ) -> "BaseModel":
+        with LLM_CALL_DURATION.time(model=model):
+            response, completion = await self.client.chat.completions.create_with_completion(
+                model=model,
+                messages=[{"role": "user", "content": content}],
+                response_model=schema,
+                max_retries=reask_retrying(),
+            )
+        if completion.usage is not None:
+            self.scheduler.reconcile(reserved, completion.usage.total_tokens)
+            LLM_TOKENS.inc(completion.usage.total_tokens, model=model)
+        return response
+
     async def analyze_item(self, item: ItemModel, filters: list[FilterModel]) -> list[FilterModel]:
         """Analyze a single item against the provided filter descriptions."""
         log.debug(
@@ -87,29 +203,21 @@ class Analyzer:
             images_count=len(item.images),
         )
 
-        if item.model_extra is not None:
-            item_details = [
-                f"- {key.title().replace('_', ' ')}: {value}"
-                for key, value in item.model_extra.items()
-            ]
-        else:
-            item_details = ["N/A"]
-
-        prompt = self.PROMPT_TEMPLATE.format(
-            item_title=item.title,
-            item_images="<image>" * len(item.images),
-            item_details="\n".join(item_details),
-        )
-
-        DynamicSchema = self._create_filter_schema(filters)
+        with timed("images"):
+            images = await image_fetcher.load(item.images)
+        compiled = filter_registry.compile([f.desc for f in filters])
 
         try:
-            response = await self.predict(
-                model=self.config.model_name,
-                prompt=prompt,
-                images=item.images,
-                schema=DynamicSchema,
-            )
+            with timed("predict"):
+                if self.packer is not None:
+                    response = await self.packer.submit(item, images, compiled)
+                else:
+                    response = await self.predict(
+                        model=self.config.model_name,
+                        prompt=self.build_prompt(item, images),
+                        images=images,
+                        schema=compiled.response_model,
+                    )
 
             matched_filters = 0
             for f in filters:
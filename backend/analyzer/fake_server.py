@@ -0,0 +1,241 @@
+"""OpenAI-compatible stand-in for the model provider, for offline load testing.
+
+Run it with `python -m backend.analyzer.fake_server` and point the API at it
+with `INFERENCE_BACKEND=fake`. It answers chat completions with random but
+schema-valid JSON, after a configurable latency, and can be told to fail or
+rate limit a share of the requests. It also serves generated JPEGs under
+`/images/`, as a stand-in for the platforms' image servers.
+"""
+
+import argparse
+import asyncio
+import functools
+import hashlib
+import io
+import json
+import math
+import random
+import time
+import typing as tp
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image
+from pydantic import BaseModel, Field
+
+from .scheduler import TokenBucket
+
+
+class FakeServerConfig(BaseModel):
+    latency: tp.Literal["fixed", "uniform", "lognormal"] = Field(
+        default="lognormal",
+        description="Latency distribution of a completion",
+    )
+    latency_mean: float = Field(default=0.5, ge=0, description="Mean latency in seconds")
+    latency_spread: float = Field(
+        default=0.3,
+        ge=0,
+        description="Half-width in seconds (uniform) or sigma (lognormal) of the latency",
+    )
+    error_rate: float = Field(default=0.0, ge=0, le=1, description="Share of 500 responses")
+    rate_limit_rate: float = Field(
+        default=0.0, ge=0, le=1, description="Share of random 429 responses"
+    )
+    requests_per_minute: float | None = Field(
+        default=None, gt=0, description="Request rate above which requests get a 429"
+    )
+    tokens_per_minute: float = Field(
+        default=300_000, gt=0, description="Token rate limit reported in the response headers"
+    )
+    true_ratio: float = Field(default=0.5, ge=0, le=1, description="Share of true booleans")
+    image_tokens: int = Field(default=1_000, ge=0, description="Prompt tokens counted per image")
+    seed: int | None = Field(default=None, description="Random seed, for reproducible runs")
+    image_size: int = Field(default=800, gt=0, description="Side in pixels of served images")
+
+
+def sample_latency(config: FakeServerConfig, rng: random.Random) -> float:
+    if config.latency == "fixed":
+        return config.latency_mean
+    if config.latency == "uniform":
+        low = max(0.0, config.latency_mean - config.latency_spread)
+        return rng.uniform(low, config.latency_mean + config.latency_spread)
+    if config.latency_mean == 0:
+        return 0.0
+    # Lognormal with the requested mean: mu = ln(mean) - sigma^2 / 2
+    sigma = config.latency_spread
+    return rng.lognormvariate(mu=math.log(config.latency_mean) - sigma**2 / 2, sigma=sigma)
+
+
+def _text_parts(message: dict[str, tp.Any]) -> list[str]:
+    content = message.get("content")
+    if isinstance(content, str):
+        return [content]
+    return [part.get("text", "") for part in content or [] if part.get("type") == "text"]
+
+
+def extract_schema(messages: list[dict[str, tp.Any]]) -> dict[str, tp.Any] | None:
+    """Find the JSON schema that instructor embeds in its JSON-mode system prompt."""
+    decoder = json.JSONDecoder()
+    for message in messages:
+        for text in _text_parts(message):
+            start = text.find("json_schema")
+            start = text.find("{", start if start >= 0 else 0)
+            if start < 0:
+                continue
+            try:
+                schema, _ = decoder.raw_decode(text, start)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(schema, dict):
+                return schema
+    return None
+
+
+def fake_instance(
+    schema: dict[str, tp.Any], defs: dict[str, tp.Any], rng: random.Random, true_ratio: float
+) -> tp.Any:
+    """Generate a value valid against a (pydantic-generated) JSON schema."""
+    if "$ref" in schema:
+        return fake_instance(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, rng, true_ratio)
+    match schema.get("type"):
+        case "object":
+            return {
+                name: fake_instance(prop, defs, rng, true_ratio)
+                for name, prop in schema.get("properties", {}).items()
+            }
+        case "boolean":
+            return rng.random() < true_ratio
+        case "integer" | "number":
+            return 0
+        case "array":
+            return []
+        case "string":
+            return ""
+    return None
+
+
+@functools.lru_cache(maxsize=1024)
+def fake_image(name: str, size: int) -> bytes:
+    """A JPEG whose colors derive from `name`, so each path has distinct content."""
+    digest = hashlib.sha256(name.encode()).digest()
+    img = Image.linear_gradient("L").resize((size, size))
+    img = Image.merge("RGB", [img.point(lambda v, d=d: (v + d) % 256) for d in digest[:3]])
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def create_fake_app(config: FakeServerConfig) -> FastAPI:
+    app = FastAPI(title="Fake model provider")
+    rng = random.Random(config.seed)
+    requests = TokenBucket(config.requests_per_minute) if config.requests_per_minute else None
+    tokens = TokenBucket(config.tokens_per_minute)
+
+    def rate_limit_headers() -> dict[str, str]:
+        return {
+            "x-ratelimit-limit-tokens": str(int(config.tokens_per_minute)),
+            "x-ratelimit-remaining-tokens": str(max(0, int(tokens.level))),
+            "x-ratelimit-reset-tokens": f"{max(0.0, -tokens.level) / tokens.rate:.2f}s",
+        }
+
+    def error(status_code: int, message: str, headers: dict[str, str]) -> JSONResponse:
+        return JSONResponse(
+            {"error": {"message": message, "type": "fake_error"}},
+            status_code=status_code,
+            headers=headers,
+        )
+
+    async def chat_completions(request: Request) -> JSONResponse:
+        body = await request.json()
+        messages = body.get("messages", [])
+        headers = rate_limit_headers()
+
+        retry_after = requests.delay(1) if requests is not None else 0.0
+        if retry_after > 0 or rng.random() < config.rate_limit_rate:
+            retry_after = retry_after or 1.0
+            return error(
+                429, "Rate limit reached", {**headers, "retry-after": f"{retry_after:.2f}"}
+            )
+        if requests is not None:
+            requests.consume(1)
+
+        await asyncio.sleep(sample_latency(config, rng))
+        if rng.random() < config.error_rate:
+            return error(500, "Internal server error", headers)
+
+        schema = extract_schema(messages)
+        if schema is None:
+            return error(400, "No JSON schema found in the messages", headers)
+        answer = fake_instance(schema, schema.get("$defs", {}), rng, config.true_ratio)
+
+        text_chars = sum(len(text) for message in messages for text in _text_parts(message))
+        images_count = sum(
+            part.get("type") == "image_url"
+            for message in messages
+            if isinstance(message.get("content"), list)
+            for part in message["content"]
+        )
+        prompt_tokens = text_chars // 4 + config.image_tokens * images_count
+        completion = json.dumps(answer)
+        completion_tokens = len(completion) // 4
+        tokens.consume(prompt_tokens + completion_tokens)
+        return JSONResponse(
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": completion},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+            headers=rate_limit_headers(),
+        )
+
+    # OpenAI clients call /v1, Groq clients call /openai/v1
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/openai/v1/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/images/{name:path}")
+    async def image(name: str):
+        content = await asyncio.to_thread(fake_image, name, config.image_size)
+        return Response(content, media_type="image/jpeg")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    for name, field in FakeServerConfig.model_fields.items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            dest=name,
+            default=None,
+            help=f"{field.description} (default: {field.default})",
+        )
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+    config = FakeServerConfig.model_validate({k: v for k, v in args.items() if v is not None})
+    uvicorn.run(create_fake_app(config), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import functools
+import json
+import typing as tp
+
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+from backend.common.cache import (
+    canonical_filter,
+    get_values,
+    make_filters_hash,
+    set_values,
+)
+from backend.common.logging import log
+from backend.common.lru import LRUCache
+from backend.common.metrics import CACHE_REQUESTS
+from backend.config import settings
+
+from .models import FilterModel
+
+
+class CompiledFilterSet(BaseModel):
+    """A validated filter list with its response schema, built once and reused."""
+
+    model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
+
+    id: str
+    filters: list[str]
+    response_model: type[BaseModel]
+    json_schema: dict[str, tp.Any]
+
+    def filter_models(self) -> list[FilterModel]:
+        return [FilterModel(desc=desc) for desc in self.filters]
+
+
+def create_filter_schema(filters: list[FilterModel]) -> type[BaseModel]:
+    """Create a Pydantic model schema based on filters list."""
+    return create_model(
+        "DynamicSchema",
+        **{
+            f.name: (
+                bool,
+                Field(title=f"FilterModel {i}", json_schema_extra={"desc": f.desc}),
+            )
+            for i, f in enumerate(filters, start=1)
+        },
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def schema_size(schema: type[BaseModel]) -> int:
+    """Length of a response model's JSON schema, computed once per model class.
+
+    Response models are built once per filter set (and per packed size), so
+    the size is not recomputed on every model call.
+    """
+    return len(str(schema.model_json_schema()))
+
+
+def normalize_filters(descs: list[str]) -> list[FilterModel]:
+    """Strip, deduplicate and sort filter descriptions, rejecting unusable ones."""
+    filters: dict[str, FilterModel] = {}
+    names: dict[str, str] = {}
+    for desc in descs:
+        desc = " ".join(desc.split())
+        if not desc or canonical_filter(desc) in filters:
+            continue
+        f = FilterModel(desc=desc)
+        if not f.name:
+            raise ValueError(f"Filter has no usable characters: {desc!r}")
+        if f.name in names:
+            raise ValueError(f"Filters {names[f.name]!r} and {desc!r} are ambiguous")
+        names[f.name] = desc
+        filters[canonical_filter(desc)] = f
+    if not filters:
+        raise ValueError("At least one filter is required")
+    return sorted(filters.values(), key=lambda f: f.desc)
+
+
+class FilterRegistry:
+    """Bounded registry of compiled filter sets, addressable by a stable ID.
+
+    IDs are derived from the canonical filter list, so the same filters always
+    compile to the same ID. Registered filter lists are also stored in Redis so
+    that any worker can resolve an ID compiled elsewhere.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self._compiled = LRUCache(max_entries=max_entries)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(filter_set_id: str) -> str:
+        return f"filterset:{filter_set_id}"
+
+    def compile(self, descs: list[str]) -> CompiledFilterSet:
+        filters = normalize_filters(descs)
+        filter_set_id = make_filters_hash(filters)
+        compiled = self._compiled.get(filter_set_id)
+        if compiled is not None:
+            return compiled
+
+        response_model = create_filter_schema(filters)
+        compiled = CompiledFilterSet(
+            id=filter_set_id,
+            filters=[f.desc for f in filters],
+            response_model=response_model,
+            json_schema=response_model.model_json_schema(),
+        )
+        self._compiled.set(filter_set_id, compiled)
+        log.debug("Compiled filter set", filter_set_id=filter_set_id, filters_count=len(filters))
+        return compiled
+
+    async def register(self, descs: list[str]) -> CompiledFilterSet:
+        """Compile a filter list and make its ID resolvable by every worker."""
+        compiled = self.compile(descs)
+        await set_values({self._key(compiled.id): json.dumps(compiled.filters)}, ttl=self.ttl)
+        return compiled
+
+    async def resolve(self, filter_set_id: str) -> CompiledFilterSet | None:
+        compiled = self._compiled.get(filter_set_id)
+        if compiled is not None:
+            return compiled
+        values = await get_values([self._key(filter_set_id)])
+        if not values or values[0] is None:
+            return None
+        return self.compile(json.loads(values[0]))
+
+    def stats(self) -> dict[str, int | None]:
+        return self._compiled.stats()
+
+
+filter_registry = FilterRegistry(
+    max_entries=settings.cache.filter_sets_max_entries,
+    ttl=settings.cache.filter_sets_ttl,
+)
+CACHE_REQUESTS.set_function(
+    lambda: filter_registry.stats()["hits"] or 0, cache="filter_sets", result="hit"
+)
+CACHE_REQUESTS.set_function(
+    lambda: filter_registry.stats()["misses"] or 0, cache="filter_sets", result="miss"
+)
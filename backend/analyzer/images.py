@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import hashlib
+import typing as tp
+from urllib.parse import urlsplit
+
+import httpx
+
+from backend.common.cache import get_values, set_values
+from backend.common.logging import log
+from backend.common.lru import LRUCache
+from backend.common.metrics import CACHE_REQUESTS, STAGE_DURATION
+from backend.common.timing import timed
+from backend.common.utils import bytes_to_pil, pil_to_base64
+from backend.config import settings
+
+from .models import ImageModel
+
+
+def encode_image(content: bytes, max_size: int) -> str:
+    """Decode, resize and re-encode raw image bytes as a base64 data URI."""
+    return pil_to_base64(bytes_to_pil(content, max_size=max_size))
+
+
+class ImageCache:
+    """Two-tier cache of encoded images: an in-process LRU backed by Redis.
+
+    Entries are content-addressed: a URL maps to the hash of the downloaded
+    bytes, and the hash maps to the final data URI. Identical images served
+    under different URLs are therefore encoded and stored only once.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int, max_size: int):
+        self.local = LRUCache(max_bytes=max_bytes)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.counters = {"local_hits": 0, "redis_hits": 0, "content_hits": 0, "misses": 0}
+
+    def _count(self, counter: str, result: str) -> None:
+        self.counters[counter] += 1
+        CACHE_REQUESTS.inc(cache="image", result=result)
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def _url_key(url: str) -> str:
+        return f"image:url:{url}"
+
+    def _data_key(self, content_hash: str) -> str:
+        return f"image:data:{content_hash}:{self.max_size}"
+
+    @staticmethod
+    async def _get_remote(key: str) -> str | None:
+        values = await get_values([key])
+        return values[0] if values else None
+
+    async def get_by_url(self, url: str) -> str | None:
+        """Return the cached payload of an image URL without downloading it."""
+        content_hash = self.local.get(self._url_key(url))
+        if content_hash is not None:
+            payload = self.local.get(self._data_key(content_hash))
+            if payload is not None:
+                self._count("local_hits", "local_hit")
+                return payload
+
+        if content_hash is None:
+            content_hash = await self._get_remote(self._url_key(url))
+            if content_hash is None:
+                return None
+        payload = await self._get_remote(self._data_key(content_hash))
+        if payload is None:
+            return None
+        self._count("redis_hits", "redis_hit")
+        self.local.set(self._url_key(url), content_hash)
+        self.local.set(self._data_key(content_hash), payload)
+        return payload
+
+    async def get_by_content(self, url: str, content_hash: str) -> str | None:
+        """Return the cached payload of already-downloaded image bytes."""
+        payload = self.local.get(self._data_key(content_hash))
+        if payload is None:
+            payload = await self._get_remote(self._data_key(content_hash))
+        if payload is None:
+            self._count("misses", "miss")
+            return None
+        self._count("content_hits", "content_hit")
+        await self.set(url, content_hash, payload)
+        return payload
+
+    async def set(self, url: str, content_hash: str, payload: str) -> None:
+        self.local.set(self._url_key(url), content_hash)
+        self.local.set(self._data_key(content_hash), payload)
+        await set_values(
+            {self._url_key(url): content_hash, self._data_key(content_hash): payload},
+            ttl=self.ttl,
+        )
+
+    def clear(self) -> int:
+        return self.local.clear()
+
+    def stats(self) -> dict[str, tp.Any]:
+        return {**self.counters, "local": self.local.stats()}
+
+
+class ImageFetcher:
+    """Download and encode item images over a shared, connection-pooled HTTP client."""
+
+    def __init__(self):
+        self.config = settings.images
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Per host: the semaphore and the number of downloads holding or awaiting it
+        self._host_limits: dict[str, tuple[asyncio.Semaphore, int]] = {}
+        self.cache = ImageCache(
+            max_bytes=self.config.cache_max_bytes,
+            ttl=self.config.cache_ttl,
+            max_size=self.config.max_size,
+        )
+
+    def open(self) -> None:
+        """Create the pooled HTTP client for the running event loop."""
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.config.timeout),
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_connections,
+            ),
+            follow_redirects=True,
+        )
+        self._loop = asyncio.get_running_loop()
+        self._host_limits = {}
+        log.debug("Image HTTP client opened", max_connections=self.config.max_connections)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+            log.debug("Image HTTP client closed")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # The client is normally opened in the app lifespan; open lazily when it
+        # was not, or when it belongs to another event loop (e.g. in tests).
+        if self._client is None or self._loop is not asyncio.get_running_loop():
+            self.open()
+        return self._client  # ty: ignore[invalid-return-type]
+
+    @contextlib.asynccontextmanager
+    async def _host_limit(self, url: str) -> tp.AsyncIterator[None]:
+        """Hold one of the host's download slots.
+
+        A host's semaphore only lives while downloads use it, so that the hosts
+        tracked stay bounded by the downloads in flight.
+        """
+        host = urlsplit(url).netloc
+        semaphore, users = self._host_limits.get(host, (None, 0))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.config.max_per_host)
+        self._host_limits[host] = (semaphore, users + 1)
+        try:
+            async with semaphore:
+                yield
+        finally:
+            current, users = self._host_limits.get(host, (None, 0))
+            if current is semaphore:
+                if users <= 1:
+                    del self._host_limits[host]
+                else:
+                    self._host_limits[host] = (semaphore, users - 1)
+
+    async def fetch(self, url: str) -> bytes:
+        """Download the raw bytes of an image."""
+        client = self.client
+        async with self._host_limit(url):
+            with STAGE_DURATION.time(stage="image_download"), timed("image_download"):
+                response = await client.get(url)
+                response.raise_for_status()
+        return response.content
+
+    async def fetch_base64(self, url: str) -> str:
+        """Return the encoded image, downloading and encoding it only on cache misses."""
+        payload = await self.cache.get_by_url(url)
+        if payload is not None:
+            return payload
+
+        content = await self.fetch(url)
+        content_hash = self.cache.content_hash(content)
+        payload = await self.cache.get_by_content(url, content_hash)
+        if payload is not None:
+            return payload
+
+        with STAGE_DURATION.time(stage="image_encode"), timed("image_encode"):
+            payload = await asyncio.to_thread(encode_image, content, self.config.max_size)
+        with STAGE_DURATION.time(stage="image_cache_set"):
+            await self.cache.set(url, content_hash, payload)
+        return payload
+
+    async def _load_one(self, image: ImageModel) -> bool:
+        if image.is_loaded:
+            return True
+        try:
+            image.base64 = await self.fetch_base64(image.url)
+            return True
+        except Exception as e:
+            log.warning("Failed to load image", url=image.url, error=str(e))
+            return False
+
+    async def load(self, images: list[ImageModel]) -> list[ImageModel]:
+        """Load all images concurrently, dropping the ones that fail to download."""
+        loaded = await asyncio.gather(*(self._load_one(image) for image in images))
+        return [image for image, ok in zip(images, loaded, strict=True) if ok]
+
+
+image_fetcher = ImageFetcher()
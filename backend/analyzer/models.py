@@ -1,22 +1,31 @@
-from PIL.Image import Image
-from pydantic import BaseModel, ConfigDict, Field, computed_field
+from functools import cached_property
+
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, computed_field
 
 from backend.common.logging import log
-from backend.common.utils import pil_to_base64, sanitize_text, url_to_pil
+from backend.common.utils import sanitize_text
 
 
 class ImageModel(BaseModel):
     """Model for item images with computed properties."""
 
     url: str = Field(...)
+    _base64: str | None = PrivateAttr(default=None)
 
     @property
-    def pil(self) -> Image:
-        return url_to_pil(self.url)
+    def is_loaded(self) -> bool:
+        return self._base64 is not None
 
     @property
     def base64(self) -> str:
-        return pil_to_base64(self.pil)
+        """Encoded image payload, available once fetched by the image fetcher."""
+        if self._base64 is None:
+            raise ValueError(f"Image has not been loaded: {self.url}")
+        return self._base64
+
+    @base64.setter
+    def base64(self, value: str) -> None:
+        self._base64 = value
 
 
 class ItemModel(BaseModel):
@@ -52,6 +61,6 @@ class FilterModel(BaseModel):
     value: bool | None = Field(default=None, init=False)
 
     @computed_field
-    @property
+    @cached_property
     def name(self) -> str:
         return sanitize_text(self.desc)
@@ -0,0 +1,187 @@
+import asyncio
+import typing as tp
+from dataclasses import dataclass, field
+from textwrap import dedent
+
+from pydantic import BaseModel, create_model
+
+from backend.common.logging import log
+from backend.common.lru import LRUCache
+from backend.config import PackingConfig
+
+from .filters import CompiledFilterSet
+from .models import ImageModel, ItemModel
+from .resilience import CircuitOpenError, is_retryable
+from .scheduler import SchedulerBusyError
+
+if tp.TYPE_CHECKING:
+    from .engine import Analyzer
+
+PACKED_PROMPT_TEMPLATE = dedent(
+    """
+    Analyze each of the following {items_count} items separately.
+    Each item is introduced by its key, followed by its details and images.
+    """
+)
+
+PACKED_ITEM_TEMPLATE = dedent(
+    """
+    [{key}]
+    - Title: {item_title}
+    - Images: {item_images}
+
+    Additional details:
+    {item_details}
+    """
+)
+
+PACKED_FILTERS_TEMPLATE = dedent(
+    """
+    For each item, determine if each of the following filters applies to it,
+    and answer under the item's key.
+    """
+)
+
+
+@dataclass
+class PendingItem:
+    item: ItemModel
+    images: list[ImageModel]
+    future: asyncio.Future = field(repr=False)
+
+
+def item_key(index: int) -> str:
+    return f"item_{index}"
+
+
+class ItemPacker:
+    """Micro-batches items sharing a filter set into a single model call.
+
+    Items submitted within `window` seconds of each other are packed together,
+    up to `max_items` items and `max_images` images per call. The packed
+    response holds one filter object per item key. When a packed call fails
+    for a non-transient reason, typically a response that does not validate,
+    the batch is split in halves and retried, down to single items.
+    """
+
+    def __init__(self, analyzer: "Analyzer", config: PackingConfig):
+        self.analyzer = analyzer
+        self.config = config
+        self._pending: dict[str, list[PendingItem]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._schemas = LRUCache(max_entries=256)
+        self.calls = 0
+        self.packed_items = 0
+        self.splits = 0
+
+    async def submit(
+        self, item: ItemModel, images: list[ImageModel], compiled: CompiledFilterSet
+    ) -> BaseModel:
+        """Queue an item for the next packed call and wait for its filter values."""
+        batch = self._pending.get(compiled.id, [])
+        if batch and (
+            len(batch) >= self.config.max_items
+            or sum(len(p.images) for p in batch) + len(images) > self.config.max_images
+        ):
+            self._flush(compiled)
+
+        loop = asyncio.get_running_loop()
+        pending = PendingItem(item=item, images=images, future=loop.create_future())
+        batch = self._pending.setdefault(compiled.id, [])
+        batch.append(pending)
+        if len(batch) == 1:
+            self._timers[compiled.id] = loop.call_later(self.config.window, self._flush, compiled)
+        if len(batch) >= self.config.max_items:
+            self._flush(compiled)
+        return await pending.future
+
+    def _flush(self, compiled: CompiledFilterSet) -> None:
+        timer = self._timers.pop(compiled.id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(compiled.id, [])
+        if batch:
+            task = asyncio.create_task(self._run(compiled, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, compiled: CompiledFilterSet, batch: list[PendingItem]) -> None:
+        batch = [p for p in batch if not p.future.done()]
+        if not batch:
+            return
+        try:
+            responses = await self._analyze(compiled, batch)
+        except Exception as e:
+            splittable = not (
+                isinstance(e, (CircuitOpenError, SchedulerBusyError)) or is_retryable(e)
+            )
+            if len(batch) > 1 and splittable:
+                self.splits += 1
+                log.warning("Splitting packed batch", items_count=len(batch), error=str(e))
+                middle = len(batch) // 2
+                await asyncio.gather(
+                    self._run(compiled, batch[:middle]), self._run(compiled, batch[middle:])
+                )
+                return
+            for p in batch:
+                if not p.future.done():
+                    p.future.set_exception(e)
+            return
+        for p, response in zip(batch, responses):
+            if not p.future.done():
+                p.future.set_result(response)
+
+    async def _analyze(
+        self, compiled: CompiledFilterSet, batch: list[PendingItem]
+    ) -> list[BaseModel]:
+        self.calls += 1
+        model = self.analyzer.config.model_name
+        if len(batch) == 1:
+            p = batch[0]
+            prompt = self.analyzer.build_prompt(p.item, p.images)
+            return [await self.analyzer.predict(model, prompt, p.images, compiled.response_model)]
+
+        self.packed_items += len(batch)
+        log.debug("Packing items", items_count=len(batch), filter_set_id=compiled.id)
+        response = await self.analyzer.complete(
+            model=model,
+            content=self.build_content(compiled, batch),
+            schema=self.packed_schema(compiled, len(batch)),
+        )
+        return [getattr(response, item_key(i)) for i in range(1, len(batch) + 1)]
+
+    def build_content(
+        self, compiled: CompiledFilterSet, batch: list[PendingItem]
+    ) -> list[dict[str, tp.Any]]:
+        content = [{"type": "text", "text": PACKED_PROMPT_TEMPLATE.format(items_count=len(batch))}]
+        for i, p in enumerate(batch, start=1):
+            text = PACKED_ITEM_TEMPLATE.format(
+                key=item_key(i),
+                item_title=p.item.title,
+                item_images="<image>" * len(p.images),
+                item_details=self.analyzer.format_details(p.item),
+            )
+            content.append({"type": "text", "text": text})
+            content.extend(self.analyzer.image_parts(p.images))
+        content.append({"type": "text", "text": PACKED_FILTERS_TEMPLATE})
+        return content
+
+    def packed_schema(self, compiled: CompiledFilterSet, items_count: int) -> type[BaseModel]:
+        key = f"{compiled.id}:{items_count}"
+        schema = self._schemas.get(key)
+        if schema is None:
+            schema = create_model(
+                "PackedSchema",
+                **{item_key(i): (compiled.response_model, ...) for i in range(1, items_count + 1)},
+            )
+            self._schemas.set(key, schema)
+        return schema
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": sum(len(batch) for batch in self._pending.values()),
+            "calls": self.calls,
+            "packed_items": self.packed_items,
+            "splits": self.splits,
+        }
@@ -0,0 +1,272 @@
+import asyncio
+import contextlib
+import json
+import random
+import time
+import typing as tp
+from collections import deque
+
+import groq
+import openai
+from pydantic import ValidationError
+
+from backend.common.logging import log
+from backend.config import ResilienceConfig
+
+from .scheduler import SchedulerBusyError, parse_duration
+
+T = tp.TypeVar("T")
+
+Admission = tp.Callable[[], tp.AsyncContextManager[tp.Any]]
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+CONNECTION_ERRORS = (groq.APIConnectionError, openai.APIConnectionError)
+STATUS_ERRORS = (groq.APIStatusError, openai.APIStatusError)
+RATE_LIMIT_ERRORS = (groq.RateLimitError, openai.RateLimitError)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when model calls are short-circuited after repeated provider failures."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Model provider unavailable, try again later")
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether an inference error is transient: timeouts, connection errors, 408/409/429/5xx."""
+    if isinstance(exc, SchedulerBusyError):
+        # Not admitted locally: retrying would only queue the call again
+        return False
+    for error in (exc, exc.__cause__):
+        if isinstance(error, (TimeoutError, *CONNECTION_ERRORS)):
+            return True
+        if isinstance(error, STATUS_ERRORS):
+            return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def is_provider_answer(exc: BaseException) -> bool:
+    """Whether an error carries the provider's answer: an error status or an invalid response."""
+    for error in (exc, exc.__cause__):
+        if isinstance(error, (*STATUS_ERRORS, ValidationError, json.JSONDecodeError)):
+            return True
+    return False
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    if isinstance(exc, STATUS_ERRORS):
+        return parse_duration(exc.response.headers.get("retry-after"))
+    return None
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies."""
+
+    def __init__(self, window: int):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast for `reset_timeout` seconds. It then turns half-open and lets a
+    single probe call through, whose outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.times_opened = 0
+        self._probing = False
+
+    @property
+    def state(self) -> tp.Literal["closed", "open", "half_open"]:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Raise `CircuitOpenError` unless a call may go through now.
+
+        Returns whether the call is the half-open probe, which must end with
+        `record_success`, `record_failure` or `release`.
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        retry_after = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+        raise CircuitOpenError(retry_after=retry_after or 1.0)
+
+    def release(self) -> None:
+        """End a probe that has no outcome (cancelled, or never sent), freeing its slot."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            log.info("Circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.times_opened += 1
+                log.warning("Circuit opened", failures=self.failures)
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> dict[str, tp.Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class Resilience:
+    """Retries, hedging and circuit breaking around a single model call.
+
+    Retryable failures are retried with full-jitter exponential backoff, never
+    sooner than the provider's `retry-after`. When hedging is enabled, an
+    attempt still running past the recent latency quantile gets a duplicate
+    request, and whichever finishes first wins.
+
+    Each request first goes through `admit` (the local rate-limit queue); the
+    attempt timeout and the latency samples only start once it is admitted,
+    so time spent throttled locally is never mistaken for a slow provider.
+    """
+
+    def __init__(self, config: ResilienceConfig):
+        self.config = config
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.breaker_failure_threshold,
+            reset_timeout=config.breaker_reset_timeout,
+        )
+        self.latency = LatencyTracker(window=config.latency_window)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def backoff(self, retry: int, exc: BaseException) -> float:
+        cap = min(self.config.backoff_max, self.config.backoff_base * 2**retry)
+        return max(random.uniform(0, cap), _retry_after(exc) or 0.0)
+
+    def hedge_delay(self) -> float | None:
+        if not self.config.hedge or len(self.latency.samples) < self.config.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.config.hedge_quantile)
+
+    async def call(
+        self, attempt: tp.Callable[[], tp.Awaitable[T]], admit: Admission | None = None
+    ) -> T:
+        admit = admit or contextlib.nullcontext
+        for retry in range(self.config.max_retries + 1):
+            probe = self.breaker.allow()
+            try:
+                result = await self._attempt(attempt, admit)
+            except Exception as e:
+                if not is_retryable(e):
+                    if is_provider_answer(e):
+                        # The provider answered, the request itself was bad
+                        self.breaker.record_success()
+                    elif probe:
+                        # The call never reached the provider (e.g. the scheduler was busy)
+                        self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if retry == self.config.max_retries:
+                    raise
+                delay = self.backoff(retry, e)
+                self.retries += 1
+                log.warning(
+                    "Retrying model call",
+                    retry=retry + 1,
+                    delay=f"{delay:.2f}s",
+                    error=str(e) or type(e).__name__,
+                )
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled (client gone, hedge lost, shutdown): the call has no outcome
+                if probe:
+                    self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+        raise AssertionError("unreachable")
+
+    async def _attempt(self, attempt: tp.Callable[[], tp.Awaitable[T]], admit: Admission) -> T:
+        async with admit():
+            start = time.monotonic()
+            async with asyncio.timeout(self.config.attempt_timeout):
+                hedge_delay = self.hedge_delay()
+                if hedge_delay is None:
+                    result = await attempt()
+                else:
+                    result = await self._hedged(attempt, admit, hedge_delay)
+            self.latency.add(time.monotonic() - start)
+        return result
+
+    async def _hedge(self, attempt: tp.Callable[[], tp.Awaitable[T]], admit: Admission) -> T:
+        async with admit():
+            return await attempt()
+
+    async def _hedged(
+        self, attempt: tp.Callable[[], tp.Awaitable[T]], admit: Admission, delay: float
+    ) -> T:
+        primary = asyncio.ensure_future(attempt())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                log.debug("Hedging slow model call", delay=f"{delay:.2f}s")
+                tasks.add(asyncio.ensure_future(self._hedge(attempt, admit)))
+            error: BaseException | None = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict[str, tp.Any]:
+        p50, p95 = self.latency.quantile(0.5), self.latency.quantile(0.95)
+        return {
+            "circuit": self.breaker.stats(),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency": {
+                "samples": len(self.latency.samples),
+                "p50": None if p50 is None else round(p50, 3),
+                "p95": None if p95 is None else round(p95, 3),
+            },
+        }
@@ -0,0 +1,215 @@
+import asyncio
+import re
+import time
+import typing as tp
+from contextlib import asynccontextmanager
+
+import httpx
+
+from backend.common.logging import log
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when a model call cannot be admitted within the wait queue limits."""
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parse provider durations such as `7.66s`, `2m59.56s` or `250ms` into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers: httpx.Headers, name: str) -> int | None:
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` units per minute.
+
+    The level may go negative when actual usage exceeds what was reserved;
+    later callers then wait for the debt to be refilled.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds to wait before `amount` units are available."""
+        self._refill()
+        # A request larger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def resize(self, per_minute: float) -> None:
+        self._refill()
+        self.capacity = per_minute
+        self.level = min(self.level, per_minute)
+
+    def sync(self, remaining: float) -> None:
+        """Lower the level to what the provider reports as remaining."""
+        self._refill()
+        self.level = min(self.level, remaining)
+
+
+class RateScheduler:
+    """Admission control for model calls, kept just under the provider's limits.
+
+    Calls go through `slot`, which bounds the number of concurrent calls, waits
+    for request and token budget in FIFO order, and rejects callers with
+    `SchedulerBusyError` once the wait queue is full or the wait is too long.
+    The buckets follow the provider's `x-ratelimit-*` and `retry-after` response
+    headers, fed through `observe`. Limits apply per process.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        headroom: float = 1.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute * headroom)
+        self.tokens = TokenBucket(tokens_per_minute * headroom)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.headroom = headroom
+        self._resume_at = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+
+    def _bind_loop(self) -> None:
+        # Primitives belong to one event loop; recreate them if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._admission = asyncio.Lock()
+
+    async def _wait_for_budget(self, tokens: int) -> None:
+        while True:
+            delay = max(
+                self._resume_at - time.monotonic(),
+                self.requests.delay(1),
+                self.tokens.delay(tokens),
+            )
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> tp.AsyncIterator[None]:
+        """Wait for permission to send a call expected to use `tokens` tokens."""
+        self._bind_loop()
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusyError("Too many model calls waiting, try again later")
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+                try:
+                    async with self._admission:
+                        await self._wait_for_budget(tokens)
+                except BaseException:
+                    self._slots.release()
+                    raise
+        except TimeoutError as e:
+            self.rejected += 1
+            raise SchedulerBusyError(
+                f"Model call not admitted within {self.queue_timeout}s, try again later"
+            ) from e
+        finally:
+            self.waiting -= 1
+            self.wait_time += time.monotonic() - start
+
+        self.admitted += 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def reconcile(self, reserved: int, used: int) -> None:
+        """Charge the difference between reserved and actually used tokens."""
+        self.tokens.consume(used - reserved)
+
+    async def observe(self, response: httpx.Response) -> None:
+        """httpx response hook adapting the buckets to the provider's headers."""
+        headers = response.headers
+        limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+        if limit_tokens and limit_tokens * self.headroom != self.tokens.capacity:
+            log.info("Adapting token rate limit", tokens_per_minute=limit_tokens)
+            self.tokens.resize(limit_tokens * self.headroom)
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.tokens.sync(remaining_tokens)
+        # Groq's request headers count requests per day, not per minute: they
+        # only pause calls once the day's budget is exhausted
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        if remaining_requests == 0:
+            reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset_requests:
+                log.warning("Daily request limit reached", reset_after=reset_requests)
+                self._resume_at = max(self._resume_at, time.monotonic() + reset_requests)
+
+        if response.status_code == 429:
+            self.throttled += 1
+            retry_after = parse_duration(headers.get("retry-after")) or parse_duration(
+                headers.get("x-ratelimit-reset-tokens")
+            )
+            if retry_after:
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+            log.warning("Rate limited by provider", retry_after=retry_after)
+
+    def stats(self) -> dict[str, tp.Any]:
+        return {
+            "waiting": self.waiting,
+            "running": self.running,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "wait_time": round(self.wait_time, 3),
+            "requests_per_minute": self.requests.capacity,
+            "tokens_per_minute": self.tokens.capacity,
+        }
@@ -0,0 +1,269 @@
+"""ASGI middlewares that need access to the raw request stream."""
+
+import gzip
+import io
+import json
+import queue
+import random
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import zstandard
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.common.logging import log
+from backend.common.metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_FLIGHT,
+)
+
+SUPPORTED_ENCODINGS = ("gzip", "deflate", "zstd")
+_DECODE_ERRORS = (ValueError, zlib.error, zstandard.ZstdError)
+
+
+class BodyTooLargeError(ValueError):
+    """Raised when a request body exceeds the configured size limit."""
+
+
+class UnsupportedEncodingError(ValueError):
+    """Raised when a request body uses a `Content-Encoding` that cannot be decoded."""
+
+
+def _inflate_zlib(body: bytes, wbits: int, limit: int) -> bytes:
+    decoder = zlib.decompressobj(wbits)
+    data = decoder.decompress(body, limit + 1)
+    if len(data) > limit or decoder.unconsumed_tail:
+        raise BodyTooLargeError
+    if not decoder.eof:
+        raise ValueError("Truncated compressed body")
+    return data
+
+
+def _inflate_zstd(body: bytes, limit: int) -> bytes:
+    reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+    data = reader.read(limit + 1)
+    if len(data) > limit:
+        raise BodyTooLargeError
+    return data
+
+
+def decompress(body: bytes, encoding: str, limit: int) -> bytes:
+    """Decode a request body, refusing to produce more than `limit` bytes."""
+    if encoding == "gzip":
+        return _inflate_zlib(body, 16 + zlib.MAX_WBITS, limit)
+    if encoding == "deflate":
+        return _inflate_zlib(body, zlib.MAX_WBITS, limit)
+    if encoding == "zstd":
+        return _inflate_zstd(body, limit)
+    raise UnsupportedEncodingError(f"Unsupported Content-Encoding: {encoding}")
+
+
+def _unsupported_encoding(encoding: str) -> PlainTextResponse:
+    return PlainTextResponse(
+        f"Unsupported Content-Encoding: {encoding}",
+        status_code=415,
+        headers={"Accept-Encoding": ", ".join(SUPPORTED_ENCODINGS)},
+    )
+
+
+class DecompressionMiddleware:
+    """Transparently decode `Content-Encoding` request bodies.
+
+    The compressed body and its decoded form are both capped at `max_size`
+    bytes, so a small compressed payload cannot expand without bound.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+        if encoding not in SUPPORTED_ENCODINGS:
+            await _unsupported_encoding(encoding)(scope, receive, send)
+            return
+
+        chunks, size = [], 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_size:
+                await PlainTextResponse("Request body too large", 413)(scope, receive, send)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+
+        try:
+            body = decompress(b"".join(chunks), encoding, self.max_size)
+        except BodyTooLargeError:
+            log.warning("Decompressed body too large", encoding=encoding, compressed_size=size)
+            await PlainTextResponse("Request body too large", 413)(scope, receive, send)
+            return
+        except UnsupportedEncodingError:
+            await _unsupported_encoding(encoding)(scope, receive, send)
+            return
+        except _DECODE_ERRORS as e:
+            log.warning("Invalid compressed body", encoding=encoding, error=str(e))
+            await PlainTextResponse("Invalid compressed body", 400)(scope, receive, send)
+            return
+        log.debug("Decompressed request body", encoding=encoding, size=size, decoded=len(body))
+
+        headers = [
+            (k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        scope = {**scope, "headers": headers}
+        sent = False
+
+        async def receive_decoded() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, receive_decoded, send)
+
+
+class CaptureWriter:
+    """Append captured requests to a gzip JSONL file from a background thread."""
+
+    def __init__(self, path: str | Path, sample_rate: float = 1.0):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self._queue: queue.SimpleQueue[dict | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self.captured = 0
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._write, name="capture-writer", daemon=True)
+        self._thread.start()
+        log.info("Capturing requests", path=str(self.path), sample_rate=self.sample_rate)
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        log.info("Stopped capturing requests", captured=self.captured)
+
+    def sampled(self) -> bool:
+        return self._thread is not None and random.random() < self.sample_rate
+
+    def record(self, entry: dict) -> None:
+        self.captured += 1
+        self._queue.put(entry)
+
+    def _write(self) -> None:
+        # Appending adds a gzip member per run, which gzip readers concatenate
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            while (entry := self._queue.get()) is not None:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+
+class CaptureMiddleware:
+    """Record request bodies and timings of selected paths for later replay.
+
+    Sits inside `DecompressionMiddleware`, so bodies are stored decoded, and
+    only keeps the headers needed to replay a request, never credentials.
+    """
+
+    REPLAY_HEADERS = ("content-type", "accept")
+
+    def __init__(self, app: ASGIApp, writer: CaptureWriter, paths: tuple[str, ...]):
+        self.app = app
+        self.writer = writer
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths or not self.writer.sampled():
+            await self.app(scope, receive, send)
+            return
+
+        arrived, start = time.time(), time.perf_counter()
+        chunks: list[bytes] = []
+        status_code = 500
+
+        async def receive_captured() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def send_captured(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_captured, send_captured)
+        finally:
+            headers = Headers(scope=scope)
+            self.writer.record(
+                {
+                    "time": arrived,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "headers": {k: headers[k] for k in self.REPLAY_HEADERS if k in headers},
+                    "body": b"".join(chunks).decode("utf-8", errors="replace"),
+                    "status": status_code,
+                    "duration": time.perf_counter() - start,
+                }
+            )
+
+
+class MetricsMiddleware:
+    """Count HTTP requests and time them until their body is fully sent.
+
+    Requests are labelled with the matched route template rather than the raw
+    path, which keeps the number of series bounded. It must sit inside any
+    middleware that copies the scope, to see the route set by the router.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+        async def send_observed(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status_code)
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, method=scope["method"], route=route
+            )
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+import typing as tp
+
+from pydantic import BaseModel, Field, model_validator
 
 
 class ItemSource(BaseModel):
@@ -9,15 +11,99 @@ class ItemSource(BaseModel):
     html: str
 
 
-class AnalysisRequest(BaseModel):
+class FilterSelection(BaseModel):
+    """Filters given either as raw descriptions or as a compiled filter-set ID"""
+
+    filters: list[str] | None = None
+    filter_set_id: str | None = None
+
+    @model_validator(mode="after")
+    def check_filters_source(self) -> "FilterSelection":
+        if (self.filters is None) == (self.filter_set_id is None):
+            raise ValueError("Exactly one of 'filters' or 'filter_set_id' must be provided")
+        return self
+
+
+class AnalysisRequest(FilterSelection):
     """Request model for analyzing a single item against filters"""
 
     item: ItemSource
-    filters: list[str]
     max_images: int
+    include_timings: bool = False
+
+
+class BatchAnalysisRequest(FilterSelection):
+    """Request model for analyzing several items against the same filters"""
+
+    items: list[ItemSource]
+    max_images: int
+
+
+class FilterCompileRequest(BaseModel):
+    """Request model for compiling a filter list"""
+
+    filters: list[str]
+
+
+class FilterCompileResponse(BaseModel):
+    """Response model for a compiled filter list"""
+
+    filter_set_id: str
+    filters: list[str]
+    json_schema: dict
+
+
+class CacheClearRequest(BaseModel):
+    """Scope of a cache invalidation; everything cached by the API when empty"""
+
+    key_types: list[tp.Literal["scraped", "analysis", "image", "filterset"]] | None = None
+    platform: str | None = None
+    url_prefix: str | None = None
+    # Resolved by every worker only when registered with /filters/compile
+    filter_set_id: str | None = None
+
+    @model_validator(mode="after")
+    def check_scope(self) -> "CacheClearRequest":
+        scoped = any(
+            value is not None for value in (self.platform, self.url_prefix, self.filter_set_id)
+        )
+        if scoped and self.key_types is not None:
+            unscoped = {"image", "filterset"} & set(self.key_types)
+            if unscoped:
+                raise ValueError(
+                    f"Key types {sorted(unscoped)} cannot be scoped by platform, URL or filter set"
+                )
+        return self
+
+    def resolved_key_types(self) -> list[str]:
+        if self.key_types is not None:
+            return list(self.key_types)
+        if self.filter_set_id is not None:
+            return ["analysis"]
+        if self.platform is not None or self.url_prefix is not None:
+            return ["scraped", "analysis"]
+        return ["scraped", "analysis", "image", "filterset"]
+
+
+class AnalysisTimings(BaseModel):
+    """Time spent in each analysis stage and in total, in milliseconds"""
+
+    stages: dict[str, float]
+    total: float
+    cache: dict[str, str]
 
 
 class AnalysisResponse(BaseModel):
     """Response model for the analyzer endpoint"""
 
     filters: dict[str, bool]
+    timings: AnalysisTimings | None = None
+
+
+class BatchAnalysisResult(BaseModel):
+    """Streamed result for a single item of a batch analysis"""
+
+    index: int
+    url: str
+    filters: dict[str, bool] = Field(default_factory=dict)
+    error: str | None = None
@@ -0,0 +1,137 @@
+"""Sampled request profiling, kept in a bounded in-memory ring buffer.
+
+Profiling is opt-in (`API_PROFILE=true`). A share of requests is profiled,
+and when a slow threshold is set, every request is profiled at a coarse
+interval and kept only if it turned out slow. Responses are never altered:
+profiles are stored and rendered on demand through `/debug/profiles`.
+"""
+
+import random
+import time
+import typing as tp
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.common.logging import log
+from backend.config import ApiConfig, settings
+
+if tp.TYPE_CHECKING:
+    from pyinstrument.session import Session
+
+RENDER_FORMATS = ("html", "speedscope", "text")
+
+
+@dataclass
+class CapturedProfile:
+    method: str
+    path: str
+    status: int
+    duration: float
+    reason: tp.Literal["sampled", "slow"]
+    session: "Session" = field(repr=False)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    time: float = field(default_factory=time.time)
+
+    def summary(self) -> dict[str, tp.Any]:
+        return {
+            "id": self.id,
+            "time": self.time,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration": round(self.duration, 4),
+            "reason": self.reason,
+        }
+
+
+class ProfileStore:
+    """Keep the most recent profiles, dropping the oldest beyond `max_entries`."""
+
+    def __init__(self, max_entries: int):
+        self._profiles: deque[CapturedProfile] = deque(maxlen=max_entries)
+        self.captured = 0
+
+    def add(self, profile: CapturedProfile) -> None:
+        self._profiles.append(profile)
+        self.captured += 1
+
+    def get(self, profile_id: str) -> CapturedProfile | None:
+        return next((p for p in self._profiles if p.id == profile_id), None)
+
+    def list(self) -> list[dict[str, tp.Any]]:
+        """Summaries of the stored profiles, newest first."""
+        return [p.summary() for p in reversed(self._profiles)]
+
+    def clear(self) -> None:
+        self._profiles.clear()
+
+
+def render_profile(profile: CapturedProfile, fmt: str) -> str:
+    from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer, SpeedscopeRenderer
+
+    if fmt == "html":
+        renderer = HTMLRenderer()
+    elif fmt == "speedscope":
+        renderer = SpeedscopeRenderer()
+    elif fmt == "text":
+        renderer = ConsoleRenderer(unicode=True, color=False)
+    else:
+        raise ValueError(f"Unknown profile format: {fmt}")
+    return renderer.render(profile.session)
+
+
+class SamplingProfilerMiddleware:
+    """Profile a sample of requests, and slow requests, without altering responses."""
+
+    def __init__(self, app: ASGIApp, store: ProfileStore, config: ApiConfig):
+        self.app = app
+        self.store = store
+        self.sample_rate = config.profile_sample_rate
+        self.slow_threshold = config.profile_slow_threshold
+        self.interval = config.profile_interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_threshold is None:
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        status_code = 500
+
+        async def send_observed(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            session = profiler.stop()
+            duration = time.perf_counter() - start
+            slow = self.slow_threshold is not None and duration >= self.slow_threshold
+            if sampled or slow:
+                profile = CapturedProfile(
+                    method=scope["method"],
+                    path=scope["path"],
+                    status=status_code,
+                    duration=duration,
+                    reason="slow" if slow else "sampled",
+                    session=session,
+                )
+                self.store.add(profile)
+                log.debug("Request profiled", profile_id=profile.id, reason=profile.reason)
+
+
+profile_store = ProfileStore(max_entries=settings.api.profile_max_entries)
@@ -1,15 +1,60 @@
-import traceback
+import asyncio
+import math
+import os
+import typing as tp
+import uuid
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import (
+    HTMLResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 
-from backend.analyzer import Analyzer
-from backend.analyzer.models import FilterModel
-from backend.api.models import AnalysisRequest, AnalysisResponse
-from backend.api.services import get_or_analyze_filters, get_or_scrape_item
+from backend.analyzer.filters import CompiledFilterSet, filter_registry
+from backend.analyzer.images import image_fetcher
+from backend.analyzer.scheduler import SchedulerBusyError, parse_duration
+from backend.api.models import (
+    AnalysisRequest,
+    AnalysisResponse,
+    BatchAnalysisRequest,
+    CacheClearRequest,
+    FilterCompileRequest,
+    FilterCompileResponse,
+    FilterSelection,
+)
+from backend.api.profiling import RENDER_FORMATS, profile_store, render_profile
+from backend.api.services import (
+    analyze_source,
+    resolve_filters,
+    response_filters,
+    stream_batch_analysis,
+)
 from backend.auth import verify_api_key
-from backend.common.cache import clear_cache
+from backend.common.cache import (
+    cache_active,
+    invalidate,
+    invalidation_listener,
+    invalidation_patterns,
+    local_cache,
+    redis_probe,
+)
 from backend.common.logging import log
+from backend.common.metrics import CONTENT_TYPE, registry
+from backend.common.timing import start_timings
 from backend.dependencies import get_analyzer, get_redis
+from backend.scraper.executor import ScraperBusyError, ScraperTimeoutError
+
+if tp.TYPE_CHECKING:
+    from backend.analyzer import Analyzer
 
 public_router = APIRouter()
 authenticated_router = APIRouter(dependencies=[Depends(verify_api_key)])
@@ -33,74 +78,307 @@ async def check_api_auth():
     return {"status": "ok", "message": "API key is valid."}
 
 
-@authenticated_router.post("/cache/clear")
-async def clear_cache_endpoint(redis=Depends(get_redis)):
-    """Clear cache entries."""
+async def run_cache_clear(job_id: str, patterns: list[str]) -> None:
     from backend.config import settings
 
-    if not settings.cache_enabled:
+    try:
+        count = await invalidate(
+            patterns,
+            batch_size=settings.cache.clear_batch_size,
+            max_rate=settings.cache.clear_max_rate,
+        )
+    except Exception as e:
+        log.error("Error clearing cache", job_id=job_id, error=str(e), exc_info=e)
+        return
+    log.info("Cache cleared", job_id=job_id, entries_cleared=count, patterns=patterns)
+
+
+@authenticated_router.post("/cache/clear")
+async def clear_cache_endpoint(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    request: CacheClearRequest | None = None,
+    redis=Depends(get_redis),
+):
+    """Clear cache entries, optionally scoped by key type, platform, URL prefix or filter set.
+
+    The paced deletion runs after the response is sent; its outcome is logged
+    with the returned job ID.
+    """
+    if not cache_active():
         return {
             "status": "disabled",
             "entries_cleared": None,
             "message": "Cache is disabled or unavailable.",
         }
+    request = request or CacheClearRequest()
+    filters = None
+    if request.filter_set_id is not None:
+        compiled = await filter_registry.resolve(request.filter_set_id)
+        if compiled is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=(
+                    f"Unknown filter set: {request.filter_set_id}. Only IDs returned by "
+                    "/filters/compile (and not expired) can scope a cache clear."
+                ),
+            )
+        filters = compiled.filter_models()
+    key_types = request.resolved_key_types()
+    if "image" in key_types:
+        image_fetcher.cache.clear()
+    patterns = invalidation_patterns(
+        key_types,
+        platform=request.platform,
+        url_prefix=request.url_prefix,
+        filters=filters,
+    )
+    job_id = uuid.uuid4().hex[:12]
+    background_tasks.add_task(run_cache_clear, job_id, patterns)
+    log.info("Cache clear scheduled", job_id=job_id, patterns=patterns)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {
+        "status": "accepted",
+        "job_id": job_id,
+        "entries_cleared": None,
+        "patterns": patterns,
+        "message": "Cache clear started.",
+    }
+
+
+@authenticated_router.get("/analyzer/status")
+async def analyzer_status(analyzer: "Analyzer" = Depends(get_analyzer)):
+    """Report the model call circuit breaker, retries, latency, rate limiting and packing."""
+    return {
+        **analyzer.resilience.stats(),
+        "scheduler": analyzer.scheduler.stats(),
+        "packing": analyzer.packer.stats() if analyzer.packer is not None else None,
+    }
+
+
+@authenticated_router.get("/cache/stats")
+async def cache_stats():
+    """Report in-process cache statistics and whether Redis is reachable."""
+    from backend.config import settings
+
+    return {
+        "redis": {"enabled": settings.cache_enabled, "available": redis_probe.available},
+        "images": image_fetcher.cache.stats(),
+        "filter_sets": filter_registry.stats(),
+        "local": local_cache.stats() if local_cache is not None else None,
+        "invalidations_received": invalidation_listener.received,
+        # The in-process statistics above are this worker's only
+        "worker": os.getpid(),
+    }
+
+
+@authenticated_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose request, pipeline stage, queue and cache metrics in the Prometheus text format."""
+    # Each worker process keeps its own metrics: the label tells their series apart
+    return PlainTextResponse(registry.render({"worker": str(os.getpid())}), media_type=CONTENT_TYPE)
+
+
+@authenticated_router.get("/debug/profiles")
+async def list_profiles():
+    """List the most recently captured request profiles."""
+    from backend.config import settings
+
+    return {
+        "enabled": settings.api.profile,
+        "captured": profile_store.captured,
+        "profiles": profile_store.list(),
+        "worker": os.getpid(),
+    }
+
+
+@authenticated_router.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "html"):
+    """Render a captured profile as HTML, speedscope JSON or plain text."""
+    if format not in RENDER_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown format: {format} (expected one of {', '.join(RENDER_FORMATS)})",
+        )
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=(
+                f"Unknown profile: {profile_id}. Profiles are kept by the worker process "
+                f"that captured them; this is worker {os.getpid()}."
+            ),
+        )
+    content = await asyncio.to_thread(render_profile, profile, format)
+    if format == "html":
+        return HTMLResponse(content)
+    if format == "speedscope":
+        return Response(content, media_type="application/json")
+    return PlainTextResponse(content)
+
+
+async def get_compiled_filters(selection: FilterSelection) -> CompiledFilterSet:
+    """Resolve the request's filters, mapping lookup and validation errors to HTTP errors."""
     try:
-        count = await clear_cache()
-        return {
-            "status": "success",
-            "entries_cleared": count,
-            "message": "Cache cleared successfully.",
-        }
-    except Exception as e:
-        log.error("Error clearing cache", error=str(e), exc_info=e)
+        compiled = await resolve_filters(selection)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error clearing cache: {str(e)}",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        ) from e
+    if compiled is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown filter set: {selection.filter_set_id}",
+        )
+    return compiled
+
+
+@authenticated_router.post("/filters/compile", response_model=FilterCompileResponse)
+async def compile_filters(request: FilterCompileRequest):
+    """Validate and compile a filter list once, returning an ID reusable in analyze requests."""
+    try:
+        compiled = await filter_registry.register(request.filters)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
         ) from e
+    return FilterCompileResponse(
+        filter_set_id=compiled.id,
+        filters=compiled.filters,
+        json_schema=compiled.json_schema,
+    )
 
 
-@authenticated_router.post("/item/analyze", response_model=AnalysisResponse)
+@authenticated_router.post(
+    "/item/analyze", response_model=AnalysisResponse, response_model_exclude_none=True
+)
 async def analyze_item(
     request: AnalysisRequest,
+    response: Response,
     background_tasks: BackgroundTasks,
-    analyzer: Analyzer = Depends(get_analyzer),
+    analyzer: "Analyzer" = Depends(get_analyzer),
     redis=Depends(get_redis),
 ):
-    try:
-        item = await get_or_scrape_item(
-            platform=request.item.platform,
-            url=request.item.url,
-            html=request.item.html,
-            max_images=request.max_images,
-            background_tasks=background_tasks,
-        )
+    """Analyze an item, reporting the time spent in each stage in a `Server-Timing` header."""
+    from backend.analyzer.resilience import (
+        RATE_LIMIT_ERRORS,
+        CircuitOpenError,
+        is_retryable,
+    )
 
-        filter_models = [FilterModel(desc=desc) for desc in sorted(request.filters)]
-
-        analyzed_filters = await get_or_analyze_filters(
+    timings = start_timings()
+    filters = await get_compiled_filters(request)
+    try:
+        analyzed_filters = await analyze_source(
             analyzer=analyzer,
-            item=item,
-            filters=filter_models,
+            source=request.item,
+            filters=filters,
             max_images=request.max_images,
             background_tasks=background_tasks,
         )
 
         matched_count = sum(1 for f in analyzed_filters if f.value)
+        breakdown = timings.as_dict()
         log.info(
             "Analysis completed successfully",
             matched_filters=matched_count,
-            total_filters=len(filter_models),
+            total_filters=len(analyzed_filters),
+            timings=breakdown,
         )
-        return AnalysisResponse(filters={f.desc: f.value for f in analyzed_filters})
-    except Exception as e:
-        error_traceback = traceback.format_exc()
-        log.error(
-            "Error during analysis",
-            error=str(e),
-            traceback=error_traceback,
-            exc_info=e,
+        response.headers["Server-Timing"] = timings.server_timing()
+        return AnalysisResponse(
+            filters=response_filters(analyzed_filters, request.filters),
+            timings=breakdown if request.include_timings else None,
         )
+    except (ScraperBusyError, ScraperTimeoutError) as e:
+        log.warning("Scraper unavailable", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        ) from e
+    except SchedulerBusyError as e:
+        log.warning("Analyzer busy", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        ) from e
+    except RATE_LIMIT_ERRORS as e:
+        retry_after = parse_duration(e.response.headers.get("retry-after")) or 1
+        log.warning("Model provider rate limit reached", retry_after=retry_after)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Model provider rate limit reached, try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        ) from e
+    except CircuitOpenError as e:
+        log.warning("Model provider circuit open", retry_after=e.retry_after)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        ) from e
+    except Exception as e:
+        log.error("Error during analysis", error=str(e), exc_info=e)
+        if is_retryable(e):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Model provider unavailable, try again later.",
+                headers={"Retry-After": "1"},
+            ) from e
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail={"error": str(e), "traceback": error_traceback},
+            detail="Error during analysis.",
         ) from e
+
+
+@authenticated_router.post("/items/analyze")
+async def analyze_items(
+    request: BatchAnalysisRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    analyzer: "Analyzer" = Depends(get_analyzer),
+):
+    """Analyze several items and stream each result as soon as it is ready.
+
+    Results are sent as NDJSON by default, or as server-sent events when the
+    client accepts `text/event-stream`. Each result carries the index of its
+    item in the request, since results are streamed in completion order.
+    """
+    from backend.config import settings
+
+    if len(request.items) > settings.api.batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many items in batch (max {settings.api.batch_max_items}).",
+        )
+
+    filters = await get_compiled_filters(request)
+    log.info("Batch analysis started", items_count=len(request.items))
+    results = stream_batch_analysis(
+        analyzer=analyzer,
+        sources=request.items,
+        filters=filters,
+        max_images=request.max_images,
+        background_tasks=background_tasks,
+        concurrency=settings.api.batch_concurrency,
+        client_filters=request.filters,
+    )
+
+    if "text/event-stream" in http_request.headers.get("accept", ""):
+
+        async def sse_events():
+            async for result in results:
+                yield f"data: {result.model_dump_json()}\n\n"
+            yield "event: done\ndata: {}\n\n"
+
+        return StreamingResponse(sse_events(), media_type="text/event-stream")
+
+    async def ndjson_lines():
+        async for result in results:
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
@@ -1,16 +1,41 @@
+import asyncio
+import typing as tp
+
 from fastapi import BackgroundTasks
 
-from backend.analyzer import Analyzer
+from backend.analyzer.filters import CompiledFilterSet, filter_registry
 from backend.analyzer.models import FilterModel, ItemModel
+from backend.api.models import BatchAnalysisResult, FilterSelection, ItemSource
 from backend.common.cache import (
+    cache_active,
+    canonical_filter,
     get_analysis_cache,
     get_scraped_cache,
+    make_filters_hash,
     set_analysis_cache,
     set_scraped_cache,
 )
 from backend.common.logging import log
+from backend.common.metrics import CACHE_REQUESTS, STAGE_DURATION
+from backend.common.singleflight import SingleFlight
+from backend.common.timing import record_cache, timed
 from backend.config import settings
-from backend.scraper import scrape_item
+from backend.scraper import scrape_item_async
+
+if tp.TYPE_CHECKING:
+    from backend.analyzer import Analyzer
+
+analysis_flight = SingleFlight(
+    "analysis",
+    lock_ttl=settings.cache.lock_ttl,
+    wait_timeout=settings.cache.lock_wait_timeout,
+    poll_interval=settings.cache.lock_poll_interval,
+)
+
+
+async def write_scraped_cache(platform: str, url: str, max_images: int, value: dict) -> None:
+    with STAGE_DURATION.time(stage="scrape_cache_set"):
+        await set_scraped_cache(platform, url, max_images, value)
 
 
 async def get_or_scrape_item(
@@ -20,22 +45,24 @@ async def get_or_scrape_item(
     max_images: int,
     background_tasks: BackgroundTasks,
 ) -> ItemModel:
-    if settings.cache_enabled:
-        item_data = await get_scraped_cache(platform=platform, url=url, max_images=max_images)
-        if item_data:
-            log.debug(
-                "Scrape cache hit",
-                platform=platform,
-                url=url,
-                max_images=max_images,
-            )
-            return ItemModel(**item_data)
-    item = scrape_item(platform=platform, url=url, html=html)
+    if cache_active():
+        with STAGE_DURATION.time(stage="scrape_cache_get"), timed("scrape_cache"):
+            entry = await get_scraped_cache(platform=platform, url=url, max_images=max_images)
+        result = "miss" if entry is None else "stale" if entry.is_stale else "hit"
+        CACHE_REQUESTS.inc(cache="scraped", result=result)
+        record_cache("scrape_cache", result)
+        if entry is not None and not entry.is_stale:
+            log.debug("Scrape cache hit", platform=platform, url=url, max_images=max_images)
+            return ItemModel(**entry.value)
+    # A stale item is parsed again from the page sent with the request, rather
+    # than served: the client may be looking at a changed listing
+    with timed("scrape"):
+        item = await scrape_item_async(platform=platform, url=url, html=html)
     item.images = item.images[:max_images]
 
-    if settings.cache_enabled:
+    if cache_active():
         background_tasks.add_task(
-            set_scraped_cache,
+            write_scraped_cache,
             platform,
             url,
             max_images,
@@ -51,39 +78,189 @@ async def get_or_scrape_item(
 
 
 async def get_or_analyze_filters(
-    analyzer: Analyzer,
+    analyzer: "Analyzer",
     item: ItemModel,
     filters: list[FilterModel],
     max_images: int,
-    background_tasks: BackgroundTasks,
 ) -> list[FilterModel]:
-    if settings.cache_enabled:
-        data = await get_analysis_cache(
-            platform=item.platform, url=item.url, max_images=max_images, filters=filters
-        )
-        if data:
+    model = analyzer.config.model_name
+    missing_filters = filters
+    if cache_active():
+        with STAGE_DURATION.time(stage="analysis_cache_get"), timed("analysis_cache"):
+            cached = await get_analysis_cache(
+                platform=item.platform,
+                url=item.url,
+                max_images=max_images,
+                model=model,
+                filters=filters,
+            )
+        cached = cached or {}
+        stale = sum(1 for entry in cached.values() if entry.is_stale)
+        hits = len(cached)
+        CACHE_REQUESTS.inc(hits - stale, cache="analysis", result="hit")
+        CACHE_REQUESTS.inc(stale, cache="analysis", result="stale")
+        CACHE_REQUESTS.inc(len(filters) - hits, cache="analysis", result="miss")
+        if hits < len(filters):
+            record_cache("analysis_cache", "partial" if hits else "miss")
+        else:
+            record_cache("analysis_cache", "stale" if stale else "hit")
+        if cached:
+            for f in filters:
+                if f.desc in cached:
+                    f.value = cached[f.desc].value
+            missing_filters = [f for f in filters if f.desc not in cached]
             log.debug(
                 "Analysis cache hit",
                 platform=item.platform,
                 url=item.url,
                 max_images=max_images,
+                cached_filters=len(filters) - len(missing_filters),
+                stale_filters=stale,
+                missing_filters=len(missing_filters),
             )
-            return [FilterModel(**f) for f in data]
-    analyzed_filters = await analyzer.analyze_item(item=item, filters=filters)
+        if stale:
+            stale_filters = [f for f in filters if f.desc in cached and cached[f.desc].is_stale]
+            refresh_analysis(analyzer, item, stale_filters, max_images)
+    if not missing_filters:
+        return filters
 
-    if settings.cache_enabled:
-        background_tasks.add_task(
-            set_analysis_cache,
-            item.platform,
-            item.url,
-            max_images,
-            [f.model_dump() for f in analyzed_filters],
-            filters,
+    async def analyze_missing() -> dict[str, bool]:
+        await analyzer.analyze_item(item=item, filters=missing_filters)
+        if cache_active():
+            # Written before the lock is released so that waiting workers find it
+            with STAGE_DURATION.time(stage="analysis_cache_set"):
+                await set_analysis_cache(
+                    item.platform, item.url, max_images, model, missing_filters
+                )
+        return {canonical_filter(f.desc): bool(f.value) for f in missing_filters}
+
+    async def lookup_missing() -> dict[str, bool] | None:
+        cached = await get_analysis_cache(
+            item.platform, item.url, max_images, model, missing_filters
         )
+        if not cached or len(cached) < len(missing_filters):
+            return None
+        return {canonical_filter(desc): entry.value for desc, entry in cached.items()}
+
+    flight_key = analysis_flight_key(item, missing_filters, max_images, model)
+    results = await analysis_flight.run(flight_key, analyze_missing, lookup_missing)
+    for f in missing_filters:
+        f.value = results[canonical_filter(f.desc)]
+    return filters
+
+
+def analysis_flight_key(
+    item: ItemModel, filters: list[FilterModel], max_images: int, model: str
+) -> str:
+    return f"{item.platform}:{item.url}:{make_filters_hash(filters)}:{max_images}:{model}"
+
+
+def refresh_analysis(
+    analyzer: "Analyzer",
+    item: ItemModel,
+    stale_filters: list[FilterModel],
+    max_images: int,
+) -> None:
+    """Recompute stale analysis results in the background, once per item and filters."""
+    model = analyzer.config.model_name
+    # Copies, so that the refresh does not change the values being returned
+    filters = [f.model_copy() for f in stale_filters]
+
+    async def reanalyze() -> None:
+        await analyzer.analyze_item(item=item, filters=filters)
+        await set_analysis_cache(item.platform, item.url, max_images, model, filters)
+
+    if analysis_flight.refresh(analysis_flight_key(item, filters, max_images, model), reanalyze):
         log.debug(
-            "Analysis cache write scheduled",
+            "Refreshing stale analysis",
             platform=item.platform,
             url=item.url,
-            max_images=max_images,
+            stale_filters=len(filters),
+        )
+
+
+async def resolve_filters(selection: FilterSelection) -> CompiledFilterSet | None:
+    """Compile the request's filters, or look up the filter set it references."""
+    if selection.filter_set_id is not None:
+        return await filter_registry.resolve(selection.filter_set_id)
+    return filter_registry.compile(selection.filters or [])
+
+
+def response_filters(
+    analyzed_filters: list[FilterModel], client_filters: list[str] | None
+) -> dict[str, bool | None]:
+    """Filter values keyed by the descriptions the client sent, when it sent raw filters."""
+    if client_filters is None:
+        return {f.desc: f.value for f in analyzed_filters}
+    values = {canonical_filter(f.desc): f.value for f in analyzed_filters}
+    return {desc: values[canonical_filter(desc)] for desc in client_filters if desc.strip()}
+
+
+async def analyze_source(
+    analyzer: "Analyzer",
+    source: ItemSource,
+    filters: CompiledFilterSet,
+    max_images: int,
+    background_tasks: BackgroundTasks,
+) -> list[FilterModel]:
+    """Scrape (or fetch from cache) an item and analyze it against the filters."""
+    item = await get_or_scrape_item(
+        platform=source.platform,
+        url=source.url,
+        html=source.html,
+        max_images=max_images,
+        background_tasks=background_tasks,
+    )
+    return await get_or_analyze_filters(
+        analyzer=analyzer,
+        item=item,
+        filters=filters.filter_models(),
+        max_images=max_images,
+    )
+
+
+async def stream_batch_analysis(
+    analyzer: "Analyzer",
+    sources: list[ItemSource],
+    filters: CompiledFilterSet,
+    max_images: int,
+    background_tasks: BackgroundTasks,
+    concurrency: int,
+    client_filters: list[str] | None = None,
+) -> tp.AsyncIterator[BatchAnalysisResult]:
+    """Analyze items concurrently and yield each result as soon as it is ready."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int, source: ItemSource) -> BatchAnalysisResult:
+        async with semaphore:
+            try:
+                analyzed_filters = await analyze_source(
+                    analyzer=analyzer,
+                    source=source,
+                    filters=filters,
+                    max_images=max_images,
+                    background_tasks=background_tasks,
+                )
+            except Exception as e:
+                log.error(
+                    "Error during batch item analysis",
+                    index=index,
+                    platform=source.platform,
+                    url=source.url,
+                    error=str(e),
+                    exc_info=e,
+                )
+                return BatchAnalysisResult(index=index, url=source.url, error=str(e))
+        return BatchAnalysisResult(
+            index=index,
+            url=source.url,
+            filters=response_filters(analyzed_filters, client_filters),
         )
-    return analyzed_filters
+
+    tasks = [asyncio.create_task(run(i, source)) for i, source in enumerate(sources)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
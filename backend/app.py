@@ -1,3 +1,6 @@
+import asyncio
+import importlib
+import os
 import time
 from contextlib import asynccontextmanager
 
@@ -6,13 +9,36 @@ from fastapi import FastAPI, Request, status
 from fastapi.exception_handlers import http_exception_handler
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from backend.analyzer.filters import create_filter_schema, normalize_filters
+from backend.analyzer.images import image_fetcher
+from backend.api.middleware import (
+    CaptureMiddleware,
+    CaptureWriter,
+    DecompressionMiddleware,
+    MetricsMiddleware,
+)
+from backend.api.profiling import SamplingProfilerMiddleware, profile_store
 from backend.api.routes import authenticated_router, public_router
-from backend.common.cache import close_redis_client
+from backend.common.cache import (
+    close_redis_client,
+    invalidation_listener,
+    open_redis_client,
+    redis_probe,
+)
 from backend.common.logging import log, setup_logging
 from backend.config import settings
+from backend.dependencies import get_analyzer
+from backend.scraper import PARSER_BY_PLATFORM, parse_html
+from backend.scraper.executor import parse_executor
+
+capture_writer = (
+    CaptureWriter(settings.api.capture_path, sample_rate=settings.api.capture_sample_rate)
+    if settings.api.capture_path
+    else None
+)
 
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
@@ -40,6 +66,17 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
 
 
 def register_middlewares(app: FastAPI):
+    # Metrics, innermost so that the route matched by the router is visible
+    app.add_middleware(MetricsMiddleware)
+    # Traffic capture, inside decompression so that bodies are stored decoded
+    if capture_writer is not None:
+        app.add_middleware(
+            CaptureMiddleware,
+            writer=capture_writer,
+            paths=("/item/analyze", "/items/analyze"),
+        )
+    # Compressed request bodies, inside CORS so that its error responses carry CORS headers
+    app.add_middleware(DecompressionMiddleware, max_size=settings.api.max_body_size)
     # CORS
     app.add_middleware(
         CORSMiddleware,
@@ -47,7 +84,7 @@ def register_middlewares(app: FastAPI):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*", "X-Request-ID"],
-        expose_headers=["X-Request-ID"],
+        expose_headers=["X-Request-ID", "Server-Timing"],
     )
     # Correlation ID
     app.add_middleware(
@@ -58,29 +95,88 @@ def register_middlewares(app: FastAPI):
     # Logging
     app.add_middleware(RequestLoggingMiddleware)
 
-    # Profiling
+    # Sampled profiling
     if settings.api.profile:
-        from pyinstrument import Profiler
-        from pyinstrument.renderers.html import HTMLRenderer
+        app.add_middleware(SamplingProfilerMiddleware, store=profile_store, config=settings.api)
+
+
+_WARMUP_HTML = "<html><head><title>Warm-up</title></head><body><h1>Warm-up</h1></body></html>"
+
+
+async def _warm_up_parsers() -> None:
+    # One parse per platform, concurrently: with the process executor, this
+    # also starts the parsing processes
+    await asyncio.gather(
+        *(parse_executor.run(parse_html, platform, _WARMUP_HTML) for platform in PARSER_BY_PLATFORM)
+    )
+
+
+async def warm_up() -> dict[str, float | None]:
+    """Pay one-off initialization costs so that the first requests don't.
+
+    The model SDKs are imported off the event loop and the analyzer (with its
+    model client) is built. With `SERVER_WARMUP`, the Redis pool connects, and
+    a filter schema build and a parse run once. Failed steps are logged and
+    skipped. Returns the duration of each step, None when it failed.
+    """
+
+    async def build_analyzer() -> None:
+        await asyncio.to_thread(importlib.import_module, "backend.analyzer.engine")
+        get_analyzer()
+
+    async def build_schema() -> None:
+        create_filter_schema(normalize_filters(["Warm-up filter"])).model_json_schema()
 
-        class ProfilingMiddleware(BaseHTTPMiddleware):
-            async def dispatch(self, request: Request, call_next):
-                if request.query_params.get("profile", "false").lower() == "true":
-                    with Profiler(interval=0.001, async_mode="enabled") as profiler:
-                        await call_next(request)
-                    html = profiler.output(renderer=HTMLRenderer())
-                    return HTMLResponse(content=html, media_type="text/html")
-                return await call_next(request)
+    steps = {"analyzer": build_analyzer}
+    if settings.server.warmup:
+        if settings.cache_enabled:
+            steps["redis"] = redis_probe.check
+        steps["schema"] = build_schema
+        steps["parse"] = _warm_up_parsers
 
-        app.add_middleware(ProfilingMiddleware)
+    durations: dict[str, float | None] = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            log.warning("Warm-up step failed", step=name, error=str(e))
+            durations[name] = None
+            continue
+        durations[name] = round(time.perf_counter() - start, 4)
+    log.info("Worker warmed up", pid=os.getpid(), durations=durations)
+    return durations
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application startup and shutdown event handler."""
     log.info("Application starting up")
+    log.debug("Settings loaded", **settings.model_dump(exclude_none=True))
+    image_fetcher.open()
+    if settings.cache_enabled:
+        open_redis_client()
+        # Reachability is checked in the background rather than delaying startup
+        redis_probe.open()
+        invalidation_listener.open()
+    parse_executor.start()
+    if capture_writer is not None:
+        capture_writer.open()
+    warmup = None
+    if settings.api.fast_startup:
+        warmup = asyncio.create_task(warm_up())
+    else:
+        await warm_up()
     yield
     log.info("Application shutting down")
+    if warmup is not None:
+        await warmup
+    if capture_writer is not None:
+        capture_writer.close()
+    parse_executor.shutdown()
+    await image_fetcher.close()
+    await invalidation_listener.close()
+    await redis_probe.close()
     await close_redis_client()
 
 
@@ -1,20 +1,234 @@
+import asyncio
+import functools
 import hashlib
 import json
+import re
+import time
 import types as t
 import typing as tp
-from functools import partial
+import uuid
+from dataclasses import dataclass
 
 import redis.asyncio as redis
 
-from backend.analyzer.models import FilterModel
+from backend.common.codec import Codec
 from backend.common.logging import log
-from backend.config import settings
+from backend.common.lru import LRUCache
+from backend.common.metrics import CACHE_REQUESTS
+from backend.config import TtlPolicy, settings
 
-redis_client = redis.Redis(host="localhost", port=6379, decode_responses=True)
+if tp.TYPE_CHECKING:
+    from backend.analyzer.models import FilterModel
 
+T = tp.TypeVar("T")
 
-def _make_filters_hash(filters: list[FilterModel]) -> str:
-    filters_json = json.dumps([f.desc for f in filters], sort_keys=True)
+codec = Codec(
+    serializer=settings.cache.serializer,
+    compression=settings.cache.compression,
+    compress_threshold=settings.cache.compress_threshold,
+)
+
+
+class CommandBatcher:
+    """Coalesce cache reads and writes issued in the same event loop iteration.
+
+    Concurrent lookups (the items of a batch, the images of an item) are sent
+    as a single MGET, and concurrent writes as SETs with their TTL followed by
+    the invalidation messages published with them, all in one pipelined
+    round-trip instead of one round-trip per call.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._reads: dict[str, list[asyncio.Future]] = {}
+        self._writes: list[tuple[str, bytes, int, asyncio.Future]] = []
+        self._publishes: list[tuple[str, str]] = []
+        self._scheduled = False
+        self._flushes: set[asyncio.Task] = set()
+        self.round_trips = 0
+
+    def _schedule(self) -> None:
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._scheduled = False
+        reads, self._reads = self._reads, {}
+        writes, self._writes = self._writes, []
+        publishes, self._publishes = self._publishes, []
+        task = asyncio.ensure_future(self._flush(reads, writes, publishes))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def get(self, keys: list[str]) -> list[bytes | None]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key in keys:
+            future = loop.create_future()
+            self._reads.setdefault(key, []).append(future)
+            futures.append(future)
+        self._schedule()
+        return list(await asyncio.gather(*futures))
+
+    async def set(
+        self, values: dict[str, bytes], ttl: int, publish: tuple[str, str] | None = None
+    ) -> None:
+        """Write values, then publish the (channel, message) pair if given."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key, value in values.items():
+            future = loop.create_future()
+            self._writes.append((key, value, ttl, future))
+            futures.append(future)
+        if publish is not None:
+            self._publishes.append(publish)
+        self._schedule()
+        await asyncio.gather(*futures)
+
+    async def _flush(
+        self,
+        reads: dict[str, list[asyncio.Future]],
+        writes: list[tuple[str, bytes, int, asyncio.Future]],
+        publishes: list[tuple[str, str]],
+    ) -> None:
+        write_futures = [future for *_, future in writes]
+        read_futures = [future for futures in reads.values() for future in futures]
+        try:
+            self.round_trips += 1
+            async with self.client.pipeline(transaction=False) as pipe:
+                # Writes first, so that a read issued alongside sees the new value
+                for key, value, ttl, _ in writes:
+                    pipe.set(key, value, ex=ttl)
+                for channel, message in publishes:
+                    pipe.publish(channel, message)
+                if reads:
+                    pipe.mget(list(reads))
+                results = await pipe.execute()
+        except Exception as e:
+            for future in write_futures + read_futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in write_futures:
+            if not future.done():
+                future.set_result(None)
+        values = results[-1] if reads else []
+        for futures, value in zip(reads.values(), values, strict=True):
+            for future in futures:
+                if not future.done():
+                    future.set_result(value)
+
+
+_client: redis.Redis | None = None
+_batcher: CommandBatcher | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def open_redis_client() -> redis.Redis:
+    """Create the connection pool and client for the running event loop."""
+    global _client, _batcher, _loop
+    config = settings.redis
+    pool = redis.BlockingConnectionPool.from_url(
+        config.url,
+        max_connections=config.max_connections,
+        timeout=config.pool_timeout,
+        **config.connection_kwargs(),
+    )
+    _client = redis.Redis.from_pool(pool)
+    _batcher = CommandBatcher(_client)
+    _loop = asyncio.get_running_loop()
+    log.debug("Redis connection pool created", max_connections=config.max_connections)
+    return _client
+
+
+def get_redis_client() -> redis.Redis:
+    # The pool is normally opened in the app lifespan; open lazily when it was
+    # not, or when it belongs to another event loop (e.g. in tests).
+    if _client is None or _loop is not asyncio.get_running_loop():
+        return open_redis_client()
+    return _client
+
+
+class RedisProbe:
+    """Check in the background whether Redis is reachable.
+
+    Until the first check completes, Redis is assumed to be reachable (cache
+    calls fail softly anyway). While it is not, cache calls skip Redis rather
+    than each waiting for a connection timeout.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.available: bool | None = None
+        self._task: asyncio.Task | None = None
+
+    async def check(self) -> bool:
+        config = settings.redis
+        try:
+            await asyncio.wait_for(
+                get_redis_client().ping(),
+                timeout=config.socket_connect_timeout + config.socket_timeout,
+            )
+            available, error = True, None
+        except Exception as e:
+            available, error = False, str(e) or type(e).__name__
+        if available and self.available is not True:
+            log.info("Redis is available")
+        elif not available and self.available is not False:
+            log.warning("Redis is not available, only the in-process cache is used", error=error)
+        self.available = available
+        return available
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def open(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+redis_probe = RedisProbe(interval=settings.redis.probe_interval)
+
+
+def redis_available() -> bool:
+    """Whether Redis is enabled and not known to be unreachable."""
+    return settings.cache_enabled and redis_probe.available is not False
+
+
+def get_batcher() -> CommandBatcher:
+    get_redis_client()
+    return _batcher  # ty: ignore[invalid-return-type]
+
+
+def canonical_filter(desc: str) -> str:
+    """Normalize a filter description so equivalent filters share cache entries."""
+    return " ".join(desc.split()).casefold()
+
+
+@functools.lru_cache(maxsize=4096)
+def _hash_filter_desc(desc: str) -> str:
+    return hashlib.sha256(canonical_filter(desc).encode("utf-8")).hexdigest()
+
+
+def _make_filter_hash(filter_model: "FilterModel") -> str:
+    return _hash_filter_desc(filter_model.desc)
+
+
+def make_filters_hash(filters: list["FilterModel"]) -> str:
+    filters_json = json.dumps(sorted(canonical_filter(f.desc) for f in filters))
     return hashlib.sha256(filters_json.encode("utf-8")).hexdigest()
 
 
@@ -23,18 +237,21 @@ def make_cache_key(
     platform: str,
     url: str,
     max_images: int,
-    filters: list[FilterModel] | None = None,
+    filter_model: "FilterModel | None" = None,
+    model: str | None = None,
 ) -> str:
     if key_type == "scraped":
         return f"scraped:{platform}:{url}:{max_images}"
     if key_type == "analysis":
-        filters_hash = _make_filters_hash(filters or [])
-        return f"analysis:{platform}:{url}:{filters_hash}:{max_images}"
+        if filter_model is None or model is None:
+            raise ValueError("Analysis cache keys require a filter and a model name")
+        filter_hash = _make_filter_hash(filter_model)
+        return f"analysis:{platform}:{url}:{filter_hash}:{max_images}:{model}"
 
 
 def redis_catch(func: t.FunctionType) -> t.FunctionType:
     async def wrapper(*args, **kwargs):
-        if not settings.cache_enabled:
+        if not redis_available():
             return None
         try:
             return await func(*args, **kwargs)
@@ -44,52 +261,390 @@ def redis_catch(func: t.FunctionType) -> t.FunctionType:
     return wrapper
 
 
+@dataclass
+class CacheEntry(tp.Generic[T]):
+    """A cached value and the time after which it is stale and should be refreshed.
+
+    Entries are stored as `[fresh_until, value]` with the hard expiry of their
+    TTL policy as Redis TTL, so a stale entry can still be served while it is
+    being recomputed.
+    """
+
+    value: T
+    fresh_until: float
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() >= self.fresh_until
+
+    def encode(self) -> bytes:
+        return codec.encode([self.fresh_until, self.value])
+
+    @classmethod
+    def decode(cls, data: bytes | None) -> "CacheEntry | None":
+        envelope = codec.decode_or_none(data)
+        if not isinstance(envelope, list) or len(envelope) != 2:
+            # Missing, or written before entries carried their freshness
+            return None
+        fresh_until, value = envelope
+        return cls(value=value, fresh_until=fresh_until)
+
+
+# In-process tier in front of Redis, holding decoded entries. Without Redis,
+# it is the only tier and keeps entries until their hard expiry; with Redis,
+# entries are kept for `local_ttl` at most, and evicted early when another
+# worker overwrites or clears them.
+local_cache = (
+    LRUCache(max_entries=settings.cache.local_max_entries) if settings.cache.local_enabled else None
+)
+_instance_id = uuid.uuid4().hex
+
+
+def cache_active() -> bool:
+    """Whether scraped items and analysis results are cached, in Redis or in process."""
+    return redis_available() or local_cache is not None
+
+
 @redis_catch
-async def get_cache(
-    key_type: tp.Literal["scraped", "analysis"],
+async def _get_remote_entries(keys: list[str]) -> list[CacheEntry | None]:
+    return [CacheEntry.decode(v) for v in await get_batcher().get(keys)]
+
+
+@redis_catch
+async def _set_remote_entries(entries: dict[str, CacheEntry], ttl: int):
+    await get_batcher().set(
+        {key: entry.encode() for key, entry in entries.items()},
+        ttl=ttl,
+        publish=invalidation_message(keys=list(entries)),
+    )
+
+
+async def get_entries(keys: list[str]) -> list[CacheEntry | None]:
+    """Look up entries in process first, then in Redis, keeping what Redis returns."""
+    if local_cache is not None:
+        entries = {key: local_cache.get(key) for key in keys}
+    else:
+        entries = dict.fromkeys(keys)
+    missing = [key for key, entry in entries.items() if entry is None]
+    if missing and redis_available():
+        remote = await _get_remote_entries(missing) or []
+        for key, entry in zip(missing, remote):
+            if entry is None:
+                continue
+            entries[key] = entry
+            if local_cache is not None:
+                local_cache.set(key, entry, ttl=settings.cache.local_ttl)
+    return [entries[key] for key in keys]
+
+
+async def set_entries(values: dict[str, tp.Any], policy: TtlPolicy) -> None:
+    """Store values in process and in Redis, evicting other workers' copies."""
+    fresh_until = time.time() + policy.fresh
+    entries = {
+        key: CacheEntry(value=value, fresh_until=fresh_until) for key, value in values.items()
+    }
+    if local_cache is not None:
+        ttl = min(settings.cache.local_ttl, policy.hard) if redis_available() else policy.hard
+        for key, entry in entries.items():
+            local_cache.set(key, entry, ttl=ttl)
+    if redis_available():
+        await _set_remote_entries(entries, ttl=policy.hard)
+
+
+async def get_cache(key: str) -> CacheEntry | None:
+    [entry] = await get_entries([key])
+    return entry
+
+
+async def set_cache(key: str, value: dict | list, policy: TtlPolicy):
+    await set_entries({key: value}, policy)
+
+
+async def get_scraped_cache(platform: str, url: str, max_images: int) -> CacheEntry[dict] | None:
+    return await get_cache(make_cache_key("scraped", platform, url, max_images))
+
+
+async def set_scraped_cache(platform: str, url: str, max_images: int, value: dict):
+    policy = settings.cache.ttl_policy("scraped", platform)
+    await set_cache(make_cache_key("scraped", platform, url, max_images), value, policy)
+
+
+async def get_analysis_cache(
     platform: str,
     url: str,
     max_images: int,
-    filters: list[FilterModel] | None = None,
-) -> dict | list | None:
-    key = make_cache_key(key_type, platform, url, max_images, filters)
-    data = await redis_client.get(key)
-    if data:
-        return json.loads(data)
-    return None
+    model: str,
+    filters: list["FilterModel"],
+) -> dict[str, CacheEntry[bool]]:
+    """Look up the cached result of each filter, returning only the ones found."""
+    if not filters:
+        return {}
+    keys = [make_cache_key("analysis", platform, url, max_images, f, model) for f in filters]
+    entries = await get_entries(keys)
+    return {f.desc: e for f, e in zip(filters, entries, strict=True) if e is not None}
 
 
-@redis_catch
-async def set_cache(
-    key_type: tp.Literal["scraped", "analysis"],
+async def set_analysis_cache(
     platform: str,
     url: str,
     max_images: int,
-    value: dict | list,
-    filters: list[FilterModel] | None = None,
-    ttl: int = 3600,
+    model: str,
+    filters: list["FilterModel"],
 ):
-    key = make_cache_key(key_type, platform, url, max_images, filters)
-    await redis_client.set(key, json.dumps(value), ex=ttl)
+    """Store the result of each analyzed filter under its own key."""
+    policy = settings.cache.ttl_policy("analysis", platform)
+    values = {
+        make_cache_key("analysis", platform, url, max_images, f, model): f.value for f in filters
+    }
+    await set_entries(values, policy)
 
 
-get_scraped_cache = partial(get_cache, "scraped")
-get_analysis_cache = partial(get_cache, "analysis")
-set_scraped_cache = partial(set_cache, "scraped")
-set_analysis_cache = partial(set_cache, "analysis")
+@redis_catch
+async def get_values(keys: list[str]) -> list[str | None]:
+    """Fetch several string values, batched with concurrent lookups."""
+    if not keys:
+        return []
+    return [codec.decode_or_none(v) for v in await get_batcher().get(keys)]
+
+
+@redis_catch
+async def set_values(values: dict[str, str], ttl: int = 3600):
+    """Store several string values with a TTL, batched with concurrent writes."""
+    if not values:
+        return
+    await get_batcher().set({key: codec.encode(value) for key, value in values.items()}, ttl=ttl)
+
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 
 @redis_catch
-async def clear_cache() -> int:
-    keys_count = await redis_client.dbsize()
-    if keys_count == 0:
-        log.info("Cache is already empty")
+async def acquire_lock(name: str, token: str, ttl: float) -> bool:
+    """Try to take a lease lock, returning whether it was acquired."""
+    return bool(await get_redis_client().set(f"lock:{name}", token, nx=True, px=int(ttl * 1000)))
+
+
+@redis_catch
+async def release_lock(name: str, token: str):
+    """Release a lease lock, only if it is still held with the given token."""
+    await get_redis_client().eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{name}", token)
+
+
+KEY_TYPES = ("scraped", "analysis", "image", "filterset")
+
+
+def escape_glob(value: str) -> str:
+    """Escape the glob special characters of a key part, for SCAN MATCH patterns."""
+    return re.sub(r"([\\*?\[\]])", r"\\\1", value)
+
+
+def invalidation_patterns(
+    key_types: tp.Sequence[str] = KEY_TYPES,
+    platform: str | None = None,
+    url_prefix: str | None = None,
+    filters: list["FilterModel"] | None = None,
+) -> list[str]:
+    """Build SCAN patterns matching the cache keys in scope.
+
+    `platform`, `url_prefix` and `filters` narrow scraped and analysis keys
+    only; `filters` matches the analysis results of those filters.
+    """
+    scoped = platform is not None or url_prefix is not None or filters is not None
+    patterns = []
+    for key_type in key_types:
+        if key_type in ("image", "filterset"):
+            if scoped:
+                raise ValueError(f"Cache keys of type {key_type!r} cannot be scoped")
+            patterns.append(f"{key_type}:*")
+            continue
+        if key_type == "scraped" and filters is not None:
+            continue
+        prefix = f"{key_type}:{escape_glob(platform) if platform is not None else '*'}:"
+        prefix += f"{escape_glob(url_prefix)}*" if url_prefix is not None else "*"
+        if filters is None:
+            patterns.append(prefix)
+        else:
+            patterns.extend(f"{prefix}:{_make_filter_hash(f)}:*" for f in filters)
+    return patterns
+
+
+@redis_catch
+async def clear_cache(
+    patterns: list[str],
+    batch_size: int = 500,
+    max_rate: float | None = None,
+) -> int:
+    """Delete the keys matching `patterns` with incremental SCAN and UNLINK batches.
+
+    Deletion is paced to at most `max_rate` keys per second, so that clearing
+    a large scope does not hog Redis or turn the whole cache cold at once.
+    """
+    client = get_redis_client()
+    start = time.monotonic()
+    deleted = 0
+
+    async def unlink(keys: list[bytes]) -> None:
+        nonlocal deleted
+        deleted += await client.unlink(*keys)
+        if max_rate is not None:
+            await asyncio.sleep(max(0.0, start + deleted / max_rate - time.monotonic()))
+
+    for pattern in patterns:
+        batch: list[bytes] = []
+        async for key in client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                await unlink(batch)
+                batch = []
+        if batch:
+            await unlink(batch)
+    log.info(
+        "Cache cleared",
+        patterns=patterns,
+        keys_cleared=deleted,
+        duration=round(time.monotonic() - start, 3),
+    )
+    return deleted
+
+
+def _glob_regex(pattern: str) -> re.Pattern:
+    """Translate a Redis glob pattern, as built by `invalidation_patterns`, to a regex."""
+    parts = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == "\\":
+            parts.append(re.escape(next(chars, "\\")))
+        elif char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def invalidate_local(keys: tp.Iterable[str] = (), patterns: tp.Iterable[str] = ()) -> int:
+    """Evict keys, and keys matching glob patterns, from the in-process cache."""
+    if local_cache is None:
         return 0
-    await redis_client.flushdb(asynchronous=True)
-    log.info("Cache cleared", keys_cleared=keys_count)
-    return keys_count
+    count = sum(local_cache.pop(key) is not None for key in keys)
+    regexes = [_glob_regex(pattern) for pattern in patterns]
+    if regexes:
+        for key in local_cache.keys():
+            if any(regex.fullmatch(key) for regex in regexes):
+                local_cache.pop(key)
+                count += 1
+    return count
+
+
+def invalidation_message(
+    keys: list[str] | None = None, patterns: list[str] | None = None
+) -> tuple[str, str] | None:
+    """The (channel, message) telling other workers to evict keys, if invalidations are on."""
+    channel = settings.cache.invalidation_channel
+    if channel is None:
+        return None
+    message = {"origin": _instance_id, "keys": keys or [], "patterns": patterns or []}
+    return channel, json.dumps(message)
 
 
 @redis_catch
+async def publish_invalidation(keys: list[str] | None = None, patterns: list[str] | None = None):
+    """Tell the other workers to evict keys from their in-process cache."""
+    publish = invalidation_message(keys, patterns)
+    if publish is not None:
+        await get_redis_client().publish(*publish)
+
+
+async def invalidate(patterns: list[str], batch_size: int = 500, max_rate: float | None = None):
+    """Clear the keys matching `patterns` in process, in Redis and in the other workers.
+
+    Returns the number of keys deleted from Redis, or from the in-process
+    cache when Redis is disabled.
+    """
+    count = invalidate_local(patterns=patterns)
+    if not redis_available():
+        return count
+    await publish_invalidation(patterns=patterns)
+    return await clear_cache(patterns, batch_size=batch_size, max_rate=max_rate)
+
+
+class InvalidationListener:
+    """Apply the invalidations published by other workers to the in-process cache."""
+
+    def __init__(
+        self, channel: str | None, retry_interval: float = 5.0, poll_interval: float = 1.0
+    ):
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self.poll_interval = poll_interval
+        self.received = 0
+        self._task: asyncio.Task | None = None
+
+    def handle(self, data: bytes | str) -> int:
+        message = json.loads(data)
+        if message.get("origin") == _instance_id:
+            return 0
+        self.received += 1
+        return invalidate_local(message.get("keys", ()), message.get("patterns", ()))
+
+    async def _listen(self) -> None:
+        while True:
+            if not redis_available():
+                await asyncio.sleep(self.retry_interval)
+                continue
+            try:
+                async with get_redis_client().pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    log.debug("Listening for cache invalidations", channel=self.channel)
+                    while True:
+                        # Polled with its own timeout: a blocking read would time out
+                        # after the pool's socket timeout whenever the channel is quiet
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=self.poll_interval
+                        )
+                        if message is not None and message["type"] == "message":
+                            self.handle(message["data"])
+            except Exception as e:
+                log.warning("Cache invalidation listener error", error=str(e))
+                await asyncio.sleep(self.retry_interval)
+
+    def open(self) -> None:
+        if self.channel is None or local_cache is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+invalidation_listener = InvalidationListener(settings.cache.invalidation_channel)
+
+if local_cache is not None:
+    _local = local_cache
+    CACHE_REQUESTS.set_function(lambda: _local.hits, cache="local", result="hit")
+    CACHE_REQUESTS.set_function(lambda: _local.misses, cache="local", result="miss")
+
+
 async def close_redis_client():
-    await redis_client.close()
+    global _client, _batcher, _loop
+    if _client is None:
+        return
+    try:
+        await _client.aclose()
+    except Exception as e:
+        log.error(f"Redis operation error: {e}")
+    _client = _batcher = _loop = None
+    log.debug("Redis connection pool closed")
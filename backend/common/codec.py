@@ -0,0 +1,164 @@
+"""Compact, versioned encoding of cache values.
+
+Every stored value starts with a header byte holding the format version
+(high nibble), the serializer and the compression (two bits each). Strings
+are stored as UTF-8, other values as JSON (with orjson) or msgpack, and
+payloads above a size threshold are compressed with zstd or zlib. Decoding reads the header, so
+values written with another configuration still decode, and values of an
+unknown version are treated as cache misses: the format can change without
+flushing Redis.
+"""
+
+import json
+import typing as tp
+import zlib
+from time import perf_counter
+
+from backend.common.logging import log
+from backend.common.metrics import (
+    CACHE_CODEC_BYTES,
+    CACHE_CODEC_DURATION,
+    CACHE_VALUE_BYTES,
+)
+
+# orjson and zstandard are dependencies; the fallbacks only cover development
+# environments where they are missing
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import msgpack  # ty: ignore[unresolved-import]
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+VERSION = 1
+
+TEXT, JSON, MSGPACK = 0, 1, 2
+SERIALIZERS = {"json": JSON, "msgpack": MSGPACK}
+
+NONE, ZLIB, ZSTD = 0, 1, 2
+COMPRESSIONS = {"none": NONE, "zlib": ZLIB, "zstd": ZSTD}
+COMPRESSION_NAMES = {code: name for name, code in COMPRESSIONS.items()}
+
+
+class CodecError(ValueError):
+    """Raised when a stored value cannot be decoded."""
+
+
+def _dumps_json(value: tp.Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _loads_json(data: bytes) -> tp.Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Codec:
+    """Encode values as header byte + (possibly compressed) payload."""
+
+    def __init__(
+        self,
+        serializer: tp.Literal["auto", "json", "msgpack"] = "auto",
+        compression: tp.Literal["auto", "zstd", "zlib", "none"] = "auto",
+        compress_threshold: int = 1024,
+    ):
+        if serializer == "msgpack" and msgpack is None:
+            log.warning("msgpack is not installed, cache values are stored as JSON")
+            serializer = "json"
+        if compression == "zstd" and zstandard is None:
+            log.warning("zstandard is not installed, cache values are compressed with zlib")
+            compression = "zlib"
+        if serializer == "auto":
+            serializer = "json"
+        if compression == "auto":
+            compression = "zstd" if zstandard is not None else "zlib"
+        self.serializer = SERIALIZERS[serializer]
+        self.compression = COMPRESSIONS[compression]
+        self.compress_threshold = compress_threshold
+        if zstandard is not None:
+            self._zstd_compressor = zstandard.ZstdCompressor(level=3)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def _serialize(self, value: tp.Any) -> tuple[int, bytes]:
+        if isinstance(value, str):
+            return TEXT, value.encode()
+        if self.serializer == MSGPACK and msgpack is not None:
+            return MSGPACK, msgpack.packb(value)
+        return JSON, _dumps_json(value)
+
+    def _compress(self, payload: bytes) -> tuple[int, bytes]:
+        if self.compression == NONE or len(payload) < self.compress_threshold:
+            return NONE, payload
+        if self.compression == ZSTD:
+            compressed = self._zstd_compressor.compress(payload)
+        else:
+            compressed = zlib.compress(payload, 3)
+        if len(compressed) >= len(payload):
+            return NONE, payload
+        return self.compression, compressed
+
+    def encode(self, value: tp.Any) -> bytes:
+        start = perf_counter()
+        serializer, payload = self._serialize(value)
+        compression, stored = self._compress(payload)
+        data = bytes([VERSION << 4 | serializer << 2 | compression]) + stored
+        CACHE_CODEC_DURATION.observe(perf_counter() - start, operation="encode")
+        CACHE_VALUE_BYTES.observe(len(data), compression=COMPRESSION_NAMES[compression])
+        CACHE_CODEC_BYTES.inc(len(payload), kind="raw")
+        CACHE_CODEC_BYTES.inc(len(data), kind="stored")
+        return data
+
+    def _decompress(self, compression: int, payload: bytes) -> bytes:
+        if compression == NONE:
+            return payload
+        if compression == ZLIB:
+            return zlib.decompress(payload)
+        if compression == ZSTD and zstandard is not None:
+            return self._zstd_decompressor.decompress(payload)
+        raise CodecError(f"Unsupported compression: {compression}")
+
+    def decode(self, data: bytes) -> tp.Any:
+        if not data:
+            raise CodecError("Empty value")
+        start = perf_counter()
+        header = data[0]
+        if header >> 4 != VERSION:
+            raise CodecError(f"Unknown format version: {header >> 4}")
+        serializer, compression = header >> 2 & 0b11, header & 0b11
+        try:
+            payload = self._decompress(compression, data[1:])
+            if serializer == TEXT:
+                value = payload.decode()
+            elif serializer == JSON:
+                value = _loads_json(payload)
+            elif serializer == MSGPACK and msgpack is not None:
+                value = msgpack.unpackb(payload)
+            else:
+                raise CodecError(f"Unsupported serializer: {serializer}")
+        except CodecError:
+            raise
+        except Exception as e:
+            raise CodecError(f"Corrupt value: {e}") from e
+        CACHE_CODEC_DURATION.observe(perf_counter() - start, operation="decode")
+        return value
+
+    def decode_or_none(self, data: bytes | None) -> tp.Any:
+        """Decode a stored value, treating missing and undecodable values as misses."""
+        if data is None:
+            return None
+        try:
+            return self.decode(data)
+        except CodecError as e:
+            log.debug("Ignoring undecodable cache value", error=str(e))
+            return None
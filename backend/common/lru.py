@@ -0,0 +1,95 @@
+import time
+import typing as tp
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-process least-recently-used cache bounded by entry count and/or value size.
+
+    Entries can also expire: after `ttl` seconds by default, or after the TTL
+    given when setting them. Expired entries count as misses.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int | None = None,
+        max_entries: int | None = None,
+        sizeof: tp.Callable[[tp.Any], int] = len,
+        ttl: float | None = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        self.ttl = ttl
+        # Per key: value, size and expiry time (monotonic), if any
+        self._data: OrderedDict[str, tuple[tp.Any, int, float | None]] = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def keys(self) -> list[str]:
+        return list(self._data)
+
+    def get(self, key: str, default: tp.Any = None) -> tp.Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            self.pop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def _is_full(self) -> bool:
+        if self.max_bytes is not None and self.current_bytes > self.max_bytes:
+            return True
+        return self.max_entries is not None and len(self._data) > self.max_entries
+
+    def set(self, key: str, value: tp.Any, ttl: float | None = None) -> None:
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        ttl = ttl if ttl is not None else self.ttl
+        self.pop(key)
+        self._data[key] = (value, size, time.monotonic() + ttl if ttl is not None else None)
+        self.current_bytes += size
+        while self._is_full():
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def pop(self, key: str) -> tp.Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        self.current_bytes -= entry[1]
+        return entry[0]
+
+    def clear(self) -> int:
+        count = len(self._data)
+        self._data.clear()
+        self.current_bytes = 0
+        return count
+
+    def stats(self) -> dict[str, int | None]:
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
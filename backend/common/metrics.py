@@ -0,0 +1,294 @@
+"""Minimal in-process metrics, exposed in the Prometheus text format.
+
+Counters, gauges and histograms are kept per process: with several workers,
+each one exposes its own values (labelled with the worker's pid by the
+`/metrics` route). Metrics mirroring state tracked elsewhere
+(queue lengths, cache counters) read it through `set_function` when
+rendered, instead of being updated on every change.
+"""
+
+import abc
+import math
+import threading
+import typing as tp
+from contextlib import contextmanager
+from time import perf_counter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: tp.Sequence[str], values: tp.Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True))
+    return "{" + pairs + "}"
+
+
+class Registry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> "Metric":
+        return self._metrics[name]
+
+    def render(self, labels: dict[str, str] | None = None) -> str:
+        """Render every metric, adding the constant `labels` to each sample."""
+        labels = labels or {}
+        const_names, const_values = tuple(labels), tuple(labels.values())
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, names, values, value in metric.samples():
+                sample_labels = _format_labels((*const_names, *names), (*const_values, *values))
+                lines.append(f"{metric.name}{suffix}{sample_labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Metric(abc.ABC):
+    type: tp.ClassVar[str]
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tp.Sequence[str] = (),
+        registry: Registry | None = registry,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: dict[str, tp.Any]) -> LabelValues:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> tp.Iterator[tuple[str, LabelValues, LabelValues, float]]:
+        """Yield (name suffix, label names, label values, value) tuples."""
+
+
+class _ValueMetric(Metric):
+    def __init__(self, *args: tp.Any, **kwargs: tp.Any):
+        super().__init__(*args, **kwargs)
+        self._values: dict[LabelValues, float] = {}
+        self._functions: dict[LabelValues, tp.Callable[[], float]] = {}
+
+    def set_function(self, func: tp.Callable[[], float], **labels: tp.Any) -> None:
+        """Read this label set's value from `func` whenever the metric is rendered."""
+        self._functions[self._key(labels)] = func
+
+    def value(self, **labels: tp.Any) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self._values.get(key, 0.0)
+
+    def samples(self) -> tp.Iterator[tuple[str, LabelValues, LabelValues, float]]:
+        with self._lock:
+            values = dict(self._values)
+        for key, func in self._functions.items():
+            values[key] = func()
+        for key, value in values.items():
+            yield "", self.labelnames, key, value
+
+
+class Counter(_ValueMetric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: tp.Any) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    type = "gauge"
+
+    def set(self, value: float, **labels: tp.Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: tp.Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: tp.Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Cumulative histogram of observed values.
+
+    When the histogram has an `outcome` label, `time()` fills it with
+    `success` or `error`, so failures of a stage are counted alongside its
+    durations.
+    """
+
+    type = "histogram"
+
+    def __init__(self, *args: tp.Any, buckets: tp.Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (the last one is +Inf), and the sum
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: tp.Any) -> None:
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), -1)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: tp.Any) -> tp.Iterator[None]:
+        start = perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        finally:
+            if "outcome" in self.labelnames:
+                labels["outcome"] = outcome
+            self.observe(perf_counter() - start, **labels)
+
+    def count(self, **labels: tp.Any) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> tp.Iterator[tuple[str, LabelValues, LabelValues, float]]:
+        with self._lock:
+            snapshot = [
+                (key, list(counts), self._sums[key]) for key, counts in self._counts.items()
+            ]
+        bucket_names = (*self.labelnames, "le")
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                yield "_bucket", bucket_names, (*key, _format_value(bound)), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, cumulative
+
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "filtergenie_http_requests_total",
+    "HTTP requests handled, by route and status code",
+    labels=("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "filtergenie_http_request_duration_seconds",
+    "Time to fully handle an HTTP request, including streamed bodies",
+    labels=("method", "route"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "filtergenie_http_requests_in_flight",
+    "HTTP requests being handled",
+)
+
+# Pipeline stages
+STAGE_DURATION = Histogram(
+    "filtergenie_stage_duration_seconds",
+    "Duration of an analysis pipeline stage",
+    labels=("stage", "outcome"),
+)
+PARSE_DURATION = Histogram(
+    "filtergenie_parse_duration_seconds",
+    "Time to parse an item page, including the parse executor queue",
+    labels=("platform", "outcome"),
+)
+LLM_CALL_DURATION = Histogram(
+    "filtergenie_llm_call_duration_seconds",
+    "Duration of a single model call attempt, once admitted by the rate scheduler",
+    labels=("model", "outcome"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+LLM_TOKENS = Counter(
+    "filtergenie_llm_tokens_total",
+    "Tokens used by model calls, as reported by the provider",
+    labels=("model",),
+)
+LLM_CALLS_IN_FLIGHT = Gauge(
+    "filtergenie_llm_calls_in_flight",
+    "Model calls admitted by the rate scheduler and not yet finished",
+)
+QUEUE_DEPTH = Gauge(
+    "filtergenie_queue_depth",
+    "Work waiting in each internal queue",
+    labels=("queue",),
+)
+
+# Caches
+CACHE_REQUESTS = Counter(
+    "filtergenie_cache_requests_total",
+    "Cache lookups by cache and result; analysis lookups count one per filter",
+    labels=("cache", "result"),
+)
+CACHE_VALUE_BYTES = Histogram(
+    "filtergenie_cache_value_bytes",
+    "Size of encoded cache values written to Redis",
+    labels=("compression",),
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+CACHE_CODEC_BYTES = Counter(
+    "filtergenie_cache_codec_bytes_total",
+    "Bytes of cache values before (raw) and after (stored) encoding and compression",
+    labels=("kind",),
+)
+CACHE_CODEC_DURATION = Histogram(
+    "filtergenie_cache_codec_duration_seconds",
+    "Time to encode or decode a cache value",
+    labels=("operation",),
+    buckets=(1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 0.001, 0.005, 0.01),
+)
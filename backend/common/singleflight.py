@@ -0,0 +1,114 @@
+import asyncio
+import time
+import typing as tp
+import uuid
+
+from backend.common.cache import acquire_lock, release_lock
+from backend.common.logging import log
+
+T = tp.TypeVar("T")
+
+
+class SingleFlight:
+    """Deduplicate concurrent computations of the same key.
+
+    Within a process, callers arriving while a computation is in flight await
+    the same task, which keeps running if the caller that started it is
+    cancelled. Across workers and replicas, a Redis lease lock elects a
+    leader; followers poll `lookup` until the leader's result is cached, and
+    compute it themselves only if the leader disappears or takes too long.
+    """
+
+    def __init__(self, name: str, lock_ttl: float, wait_timeout: float, poll_interval: float):
+        self.name = name
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    async def run(
+        self,
+        key: str,
+        func: tp.Callable[[], tp.Awaitable[T]],
+        lookup: tp.Callable[[], tp.Awaitable[T | None]],
+    ) -> T:
+        task = self._inflight.get(key)
+        if task is not None:
+            log.debug("Joining in-flight computation", name=self.name, key=key)
+        else:
+            # Runs in its own task, so that a caller being cancelled (e.g. a client
+            # disconnecting) does not cancel the computation for the others
+            task = asyncio.create_task(self._run_distributed(key, func, lookup))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every caller was cancelled
+
+    async def _run_distributed(
+        self,
+        key: str,
+        func: tp.Callable[[], tp.Awaitable[T]],
+        lookup: tp.Callable[[], tp.Awaitable[T | None]],
+    ) -> T:
+        lock_name = f"{self.name}:{key}"
+        token = uuid.uuid4().hex
+        acquired = await acquire_lock(lock_name, token, self.lock_ttl)
+        if acquired is None:
+            # Redis disabled or unavailable: in-process deduplication only
+            return await func()
+
+        deadline = time.monotonic() + self.wait_timeout
+        if not acquired:
+            log.debug("Waiting for another worker's computation", name=self.name, key=key)
+        while not acquired and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await lookup()
+            if result is not None:
+                return result
+            # Take over if the leader released its lease without caching a result
+            acquired = await acquire_lock(lock_name, token, self.lock_ttl)
+
+        if not acquired:
+            log.warning("Timed out waiting for another worker", name=self.name, key=key)
+            return await func()
+        try:
+            return await func()
+        finally:
+            await release_lock(lock_name, token)
+
+    def refresh(self, key: str, func: tp.Callable[[], tp.Awaitable[tp.Any]]) -> bool:
+        """Recompute `key` in the background, unless it is already being computed.
+
+        Used to refresh stale cache entries while they are still served: when
+        the lease lock is held elsewhere, another worker is already on it and
+        the refresh is skipped rather than waited for. Returns whether a
+        refresh was started.
+        """
+        if key in self._refreshing or key in self._inflight:
+            return False
+        task = asyncio.create_task(self._refresh(key, func))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return True
+
+    async def _refresh(self, key: str, func: tp.Callable[[], tp.Awaitable[tp.Any]]) -> None:
+        lock_name = f"{self.name}:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await acquire_lock(lock_name, token, self.lock_ttl)
+            if acquired is False:
+                log.debug("Refresh already running elsewhere", name=self.name, key=key)
+                return
+            try:
+                await func()
+            finally:
+                if acquired:
+                    await release_lock(lock_name, token)
+        except Exception as e:
+            log.warning("Background refresh failed", name=self.name, key=key, error=str(e))
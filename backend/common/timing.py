@@ -0,0 +1,85 @@
+"""Per-request breakdown of where analysis time goes.
+
+A `RequestTimings` is bound to the current request through a context
+variable, so pipeline code records stages without having it passed around.
+Outside of a timed request, recording is a no-op. Concurrent work within a
+request (e.g. encoding several images) adds up under the same stage.
+"""
+
+import contextvars
+import typing as tp
+from contextlib import contextmanager
+from time import perf_counter
+
+_current: contextvars.ContextVar["RequestTimings | None"] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = perf_counter()
+        self.stages: dict[str, float] = {}
+        self.cache: dict[str, str] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def total(self) -> float:
+        return perf_counter() - self.started
+
+    def as_dict(self) -> dict[str, tp.Any]:
+        """Stage durations and the total in milliseconds, with cache results."""
+        return {
+            "stages": {stage: round(s * 1000, 2) for stage, s in self.stages.items()},
+            "total": round(self.total() * 1000, 2),
+            "cache": dict(self.cache),
+        }
+
+    def server_timing(self) -> str:
+        """Format as a `Server-Timing` header value, with cache results as descriptions."""
+        entries = []
+        for stage, seconds in self.stages.items():
+            entry = f"{stage};dur={seconds * 1000:.2f}"
+            if stage in self.cache:
+                entry += f';desc="{self.cache[stage]}"'
+            entries.append(entry)
+        entries.extend(
+            f'{stage};desc="{result}"'
+            for stage, result in self.cache.items()
+            if stage not in self.stages
+        )
+        entries.append(f"total;dur={self.total() * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def start_timings() -> RequestTimings:
+    """Start timing the current request."""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current_timings() -> RequestTimings | None:
+    return _current.get()
+
+
+@contextmanager
+def timed(stage: str) -> tp.Iterator[None]:
+    """Add the duration of the block to `stage` of the current request, if timed."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, perf_counter() - start)
+
+
+def record_cache(stage: str, result: str) -> None:
+    """Note the outcome (e.g. `hit` or `miss`) of a cache lookup in the current request."""
+    timings = _current.get()
+    if timings is not None:
+        timings.cache[stage] = result
@@ -1,9 +1,13 @@
 import base64
 import io
+import math
+import os
 import re
+import typing as tp
+from pathlib import Path
 
-import requests
-from PIL import Image
+if tp.TYPE_CHECKING:
+    from PIL import Image
 
 
 def sanitize_text(text: str) -> str:
@@ -11,23 +15,54 @@ def sanitize_text(text: str) -> str:
     return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
 
 
-def resize_img(img: Image.Image, max_size: int = 256) -> Image.Image:
+def cgroup_cpu_quota(root: Path = Path("/sys/fs/cgroup")) -> float | None:
+    """Read the cgroup CPU quota, in CPUs, or None when the cgroup sets no limit."""
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>"
+        quota, period = (root / "cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means no limit
+        quota = (root / "cpu" / "cpu.cfs_quota_us").read_text().strip()
+        period = (root / "cpu" / "cpu.cfs_period_us").read_text().strip()
+        return None if int(quota) <= 0 else int(quota) / int(period)
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """Count the CPUs this process may run on, within its affinity mask and cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS and Windows
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def resize_img(img: "Image.Image", max_size: int = 256) -> "Image.Image":
     """Resize an image while maintaining aspect ratio."""
     if img.width > max_size or img.height > max_size:
         img.thumbnail((max_size, max_size))
     return img
 
 
-def url_to_pil(url: str) -> Image.Image:
-    """Load an image from a URL and resize it."""
-    response = requests.get(url, stream=True, timeout=5)
-    response.raise_for_status()
-    img = Image.open(io.BytesIO(response.content))
-    img = resize_img(img)
+def bytes_to_pil(content: bytes, max_size: int = 256) -> "Image.Image":
+    """Load an image from raw bytes and resize it."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(content))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img = resize_img(img, max_size=max_size)
     return img
 
 
-def pil_to_base64(img: Image.Image) -> str:
+def pil_to_base64(img: "Image.Image") -> str:
     """Convert an image to base64 encoding with lower quality to save RAM."""
     buffer = io.BytesIO()
     img.save(buffer, format="JPEG", quality=85, optimize=True)
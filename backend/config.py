@@ -1,7 +1,13 @@
-from pydantic import BaseModel, Field, computed_field, field_serializer, field_validator
-from pydantic_settings import BaseSettings, SettingsConfigDict
+import typing as tp
+from urllib.parse import urlsplit, urlunsplit
 
-from backend.common.logging import log
+from pydantic import (
+    BaseModel,
+    Field,
+    computed_field,
+    field_serializer,
+)
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class ApiConfig(BaseModel):
@@ -12,8 +18,58 @@ class ApiConfig(BaseModel):
         description="API key for authentication",
     )
     profile: bool = Field(
-        default=True,
-        description="Enable request profiling middleware",
+        default=False,
+        description="Enable sampled request profiling, browsable at /debug/profiles",
+    )
+    profile_sample_rate: float = Field(
+        default=0.01,
+        ge=0,
+        le=1,
+        description="Share of requests profiled when profiling is enabled",
+    )
+    profile_slow_threshold: float | None = Field(
+        default=None,
+        gt=0,
+        description="If set, profile every request and also keep those slower than this (s)",
+    )
+    profile_interval: float = Field(
+        default=0.01,
+        gt=0,
+        description="Profiler sampling interval in seconds",
+    )
+    profile_max_entries: int = Field(
+        default=50,
+        gt=0,
+        description="Number of most recent profiles kept in memory",
+    )
+    batch_concurrency: int = Field(
+        default=8,
+        gt=0,
+        description="Maximum number of items analyzed concurrently in a batch request",
+    )
+    batch_max_items: int = Field(
+        default=100,
+        gt=0,
+        description="Maximum number of items accepted in a batch request",
+    )
+    max_body_size: int = Field(
+        default=16 * 1024 * 1024,
+        gt=0,
+        description="Maximum size in bytes of a compressed request body, before and after decoding",
+    )
+    fast_startup: bool = Field(
+        default=False,
+        description="Serve before the analyzer is built, building it in the background instead",
+    )
+    capture_path: str | None = Field(
+        default=None,
+        description="Record analyze requests to this gzip JSONL file, for load-test replay",
+    )
+    capture_sample_rate: float = Field(
+        default=1.0,
+        ge=0,
+        le=1,
+        description="Share of analyze requests recorded when capturing",
     )
 
     @computed_field
@@ -29,7 +85,55 @@ class ApiConfig(BaseModel):
         return "*" * len(value)
 
 
-class GroqConfig(BaseModel):
+class ProviderConfig(BaseModel):
+    """Model and call scheduling of a model provider (one section per inference backend)."""
+
+    model_name: str = Field(description="Model answering the analysis requests")
+    requests_per_minute: float = Field(
+        default=30,
+        gt=0,
+        description="Initial request rate limit, lowered by the provider's rate-limit headers",
+    )
+    tokens_per_minute: float = Field(
+        default=30_000,
+        gt=0,
+        description="Initial token rate limit, replaced by the provider's rate-limit headers",
+    )
+    rate_headroom: float = Field(
+        default=0.9,
+        gt=0,
+        le=1,
+        description="Fraction of the provider's rate limits actually used",
+    )
+    rate_share: float = Field(
+        default=1.0,
+        gt=0,
+        le=1,
+        description="Share of the rate limits used by this process (set per worker by the server)",
+    )
+    max_concurrency: int = Field(
+        default=16,
+        gt=0,
+        description="Maximum number of concurrent model calls",
+    )
+    max_queue: int = Field(
+        default=256,
+        gt=0,
+        description="Maximum number of model calls waiting for admission before rejecting new ones",
+    )
+    queue_timeout: float = Field(
+        default=30.0,
+        gt=0,
+        description="Maximum time in seconds a model call waits for admission",
+    )
+    image_tokens: int = Field(
+        default=1_000,
+        ge=0,
+        description="Estimated prompt tokens per image, used to reserve token budget",
+    )
+
+
+class GroqConfig(ProviderConfig):
     api_key: str = Field(default="")
     model_name: str = Field(default="meta-llama/llama-4-scout-17b-16e-instruct")
 
@@ -38,6 +142,409 @@ class GroqConfig(BaseModel):
         return "*" * len(value)
 
 
+class OpenAIConfig(ProviderConfig):
+    """OpenAI-compatible provider, reached at `INFERENCE_BASE_URL` with `INFERENCE_API_KEY`."""
+
+    model_name: str = Field(default="gpt-4o-mini")
+
+
+class FakeConfig(ProviderConfig):
+    """Bundled fake provider (backend.analyzer.fake_server)."""
+
+    model_name: str = Field(default="fake-model")
+
+
+class InferenceConfig(BaseModel):
+    """Model provider selection."""
+
+    backend: tp.Literal["groq", "openai", "fake"] = Field(
+        default="groq",
+        description=(
+            "Model provider: Groq, any OpenAI-compatible API at `base_url`, "
+            "or the bundled fake server (backend.analyzer.fake_server)"
+        ),
+    )
+    base_url: str | None = Field(
+        default=None,
+        description="Base URL of the provider API (defaults to the provider's own)",
+    )
+    api_key: str = Field(
+        default="",
+        description="API key of the OpenAI-compatible provider (Groq uses GROQ_API_KEY)",
+    )
+
+    @field_serializer("api_key")
+    def serialize_key(self, value: str) -> str:
+        return "*" * len(value)
+
+
+class ImagesConfig(BaseModel):
+    """Image download settings."""
+
+    timeout: float = Field(
+        default=5.0,
+        gt=0,
+        description="Timeout in seconds for a single image download",
+    )
+    max_connections: int = Field(
+        default=100,
+        gt=0,
+        description="Maximum number of pooled connections to image hosts",
+    )
+    max_per_host: int = Field(
+        default=8,
+        gt=0,
+        description="Maximum number of concurrent downloads from a single host",
+    )
+    max_size: int = Field(
+        default=256,
+        gt=0,
+        description="Maximum width/height of images sent to the model",
+    )
+    cache_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        ge=0,
+        description="Size budget in bytes of the in-process encoded image cache",
+    )
+    cache_ttl: int = Field(
+        default=24 * 3600,
+        gt=0,
+        description="TTL in seconds of encoded images stored in Redis",
+    )
+
+
+class ScraperConfig(BaseModel):
+    """HTML parsing settings."""
+
+    mode: tp.Literal["inline", "thread", "process", "auto"] = Field(
+        default="inline",
+        description=(
+            "Where HTML is parsed: on the event loop, in a thread pool, in a process pool, "
+            "or auto (threads on free-threaded builds, processes otherwise)"
+        ),
+    )
+    workers: int | None = Field(
+        default=None,
+        gt=0,
+        description="Number of parsing workers (defaults to the usable CPUs)",
+    )
+    max_pending: int = Field(
+        default=64,
+        gt=0,
+        description="Maximum number of parses queued or running before rejecting new ones",
+    )
+    timeout: float = Field(
+        default=10.0,
+        gt=0,
+        description="Maximum time in seconds to wait for a single parse",
+    )
+    parser: tp.Literal["auto", "selectolax", "lxml", "html.parser"] = Field(
+        default="auto",
+        description="HTML parser backend (auto picks the fastest one installed)",
+    )
+    prune_html: bool = Field(
+        default=True,
+        description="Drop scripts, styles, SVGs and comments from HTML before parsing",
+    )
+
+
+class RedisConfig(BaseModel):
+    """Redis connection settings."""
+
+    url: str = Field(
+        default="redis://localhost:6379/0",
+        description="Redis URL, with credentials and database (rediss:// enables TLS)",
+    )
+    max_connections: int = Field(
+        default=50,
+        gt=0,
+        description="Maximum number of pooled connections",
+    )
+    pool_timeout: float = Field(
+        default=5.0,
+        gt=0,
+        description="Maximum time in seconds to wait for a free pooled connection",
+    )
+    socket_timeout: float = Field(
+        default=2.0,
+        gt=0,
+        description="Timeout in seconds of a single Redis command",
+    )
+    socket_connect_timeout: float = Field(
+        default=1.0,
+        gt=0,
+        description="Timeout in seconds to establish a connection",
+    )
+    health_check_interval: int = Field(
+        default=30,
+        ge=0,
+        description="Idle time in seconds after which a connection is checked before reuse",
+    )
+    tls_verify: bool = Field(
+        default=True,
+        description="Verify the server certificate of TLS connections",
+    )
+    tls_ca_certs: str | None = Field(
+        default=None,
+        description="Path to the CA bundle used to verify TLS connections",
+    )
+    probe_interval: float = Field(
+        default=15.0,
+        gt=0,
+        description="Interval in seconds between background checks that Redis is reachable",
+    )
+
+    @property
+    def is_tls(self) -> bool:
+        return urlsplit(self.url).scheme == "rediss"
+
+    def connection_kwargs(self) -> dict[str, tp.Any]:
+        """Keyword arguments of each connection, on top of what the URL specifies."""
+        kwargs = {
+            "socket_timeout": self.socket_timeout,
+            "socket_connect_timeout": self.socket_connect_timeout,
+            "health_check_interval": self.health_check_interval,
+        }
+        if self.is_tls:
+            kwargs["ssl_cert_reqs"] = "required" if self.tls_verify else "none"
+            kwargs["ssl_ca_certs"] = self.tls_ca_certs
+        return kwargs
+
+    @field_serializer("url")
+    def serialize_url(self, value: str) -> str:
+        parts = urlsplit(value)
+        if parts.password is None:
+            return value
+        netloc = parts.netloc.replace(f":{parts.password}@", ":***@", 1)
+        return urlunsplit(parts._replace(netloc=netloc))
+
+
+class TtlPolicy(BaseModel):
+    """Expiry of a cached entry: fresh for `fresh` seconds, then served stale for `stale` more."""
+
+    fresh: int = Field(gt=0, description="Seconds an entry is served without refreshing it")
+    stale: int = Field(
+        default=0,
+        ge=0,
+        description="Seconds after `fresh` an entry is still served while being refreshed",
+    )
+
+    @property
+    def hard(self) -> int:
+        """Seconds until the entry is removed from Redis."""
+        return self.fresh + self.stale
+
+
+class CacheConfig(BaseModel):
+    """Cache coordination settings."""
+
+    lock_ttl: float = Field(
+        default=60.0,
+        gt=0,
+        description="Lease duration in seconds of the lock held while computing an analysis",
+    )
+    lock_wait_timeout: float = Field(
+        default=60.0,
+        gt=0,
+        description="Maximum time in seconds to wait for another worker's analysis",
+    )
+    lock_poll_interval: float = Field(
+        default=0.2,
+        gt=0,
+        description="Interval in seconds between cache checks while waiting on another worker",
+    )
+    filter_sets_max_entries: int = Field(
+        default=1024,
+        gt=0,
+        description="Maximum number of compiled filter sets kept in memory",
+    )
+    filter_sets_ttl: int = Field(
+        default=7 * 24 * 3600,
+        gt=0,
+        description="TTL in seconds of registered filter sets stored in Redis",
+    )
+    serializer: tp.Literal["auto", "json", "msgpack"] = Field(
+        default="auto",
+        description="Encoding of cached values (auto: JSON, with orjson)",
+    )
+    compression: tp.Literal["auto", "zstd", "zlib", "none"] = Field(
+        default="auto",
+        description="Compression of large cached values (auto: zstd)",
+    )
+    compress_threshold: int = Field(
+        default=1024,
+        ge=0,
+        description="Minimum size in bytes of a cached value before it is compressed",
+    )
+    scraped_ttl: TtlPolicy = Field(
+        default=TtlPolicy(fresh=3600),
+        description="Expiry of scraped items (stale items are parsed again, not served)",
+    )
+    analysis_ttl: TtlPolicy = Field(
+        default=TtlPolicy(fresh=3600, stale=24 * 3600),
+        description="Expiry of filter analysis results",
+    )
+    platform_ttls: dict[str, dict[tp.Literal["scraped", "analysis"], TtlPolicy]] = Field(
+        default_factory=dict,
+        description='Per-platform expiry overrides, e.g. {"vinted": {"scraped": {...}}}',
+    )
+
+    local_enabled: bool = Field(
+        default=True,
+        description="Keep scraped items and analysis results in an in-process cache in front of Redis",
+    )
+    local_max_entries: int = Field(
+        default=10_000,
+        gt=0,
+        description="Maximum number of entries in the in-process cache",
+    )
+    local_ttl: float = Field(
+        default=60.0,
+        gt=0,
+        description="Seconds an entry read from or written to Redis is kept in process",
+    )
+    invalidation_channel: str | None = Field(
+        default="filtergenie:cache-invalidation",
+        description="Redis pub/sub channel evicting other workers' in-process entries (None: off)",
+    )
+    clear_batch_size: int = Field(
+        default=500,
+        gt=0,
+        description="Keys scanned and unlinked per batch when clearing the cache",
+    )
+    clear_max_rate: float | None = Field(
+        default=5000.0,
+        gt=0,
+        description="Maximum keys deleted per second when clearing the cache (None: unpaced)",
+    )
+
+    def ttl_policy(self, key_type: tp.Literal["scraped", "analysis"], platform: str) -> TtlPolicy:
+        override = self.platform_ttls.get(platform, {}).get(key_type)
+        if override is not None:
+            return override
+        return self.scraped_ttl if key_type == "scraped" else self.analysis_ttl
+
+
+class ResilienceConfig(BaseModel):
+    """Retry, hedging and circuit breaker settings for model calls."""
+
+    max_retries: int = Field(
+        default=3,
+        ge=0,
+        description="Maximum number of retries of a model call failing with a transient error",
+    )
+    backoff_base: float = Field(
+        default=0.5,
+        gt=0,
+        description="Base delay in seconds of the exponential retry backoff",
+    )
+    backoff_max: float = Field(
+        default=8.0,
+        gt=0,
+        description="Maximum delay in seconds between two retries",
+    )
+    attempt_timeout: float = Field(
+        default=30.0,
+        gt=0,
+        description="Maximum time in seconds of a single model call attempt",
+    )
+    hedge: bool = Field(
+        default=False,
+        description="Send a duplicate request when a model call exceeds the latency quantile",
+    )
+    hedge_quantile: float = Field(
+        default=0.95,
+        gt=0,
+        lt=1,
+        description="Latency quantile after which a model call is hedged",
+    )
+    hedge_min_samples: int = Field(
+        default=20,
+        gt=0,
+        description="Number of latency samples needed before hedging",
+    )
+    latency_window: int = Field(
+        default=200,
+        gt=0,
+        description="Number of recent model call latencies tracked",
+    )
+    breaker_failure_threshold: int = Field(
+        default=5,
+        gt=0,
+        description="Consecutive transient failures after which the circuit opens",
+    )
+    breaker_reset_timeout: float = Field(
+        default=30.0,
+        gt=0,
+        description="Time in seconds the circuit stays open before a probe call",
+    )
+
+
+class PackingConfig(BaseModel):
+    """Settings for packing several items into a single model call."""
+
+    enabled: bool = Field(
+        default=False,
+        description="Pack items analyzed concurrently with the same filters into one model call",
+    )
+    window: float = Field(
+        default=0.05,
+        ge=0,
+        description="Time in seconds to wait for more items before sending a packed call",
+    )
+    max_items: int = Field(
+        default=4,
+        gt=0,
+        description="Maximum number of items in a packed call",
+    )
+    max_images: int = Field(
+        default=5,
+        gt=0,
+        description="Maximum number of images in a packed call (Groq accepts 5 per request)",
+    )
+
+
+class ServerConfig(BaseModel):
+    """Production server settings, used by `python -m backend.server`."""
+
+    host: str = Field(default="0.0.0.0", description="Interface to bind")
+    port: int = Field(default=8000, gt=0, description="Port to bind")
+    workers: int | None = Field(
+        default=None,
+        gt=0,
+        description="Number of worker processes (defaults to the usable CPUs, up to max_workers)",
+    )
+    max_workers: int = Field(
+        default=8,
+        gt=0,
+        description="Upper bound of the default worker count",
+    )
+    limit_max_requests: int | None = Field(
+        default=10_000,
+        gt=0,
+        description="Requests after which a worker is gracefully replaced (multi-worker only)",
+    )
+    limit_max_requests_jitter: int = Field(
+        default=1000,
+        ge=0,
+        description="Random extra requests per worker, so that workers are not recycled together",
+    )
+    timeout_graceful_shutdown: int = Field(
+        default=30,
+        gt=0,
+        description="Seconds given to in-flight requests when a worker stops",
+    )
+    timeout_keep_alive: int = Field(
+        default=5,
+        gt=0,
+        description="Seconds an idle keep-alive connection is kept open",
+    )
+    warmup: bool = Field(
+        default=True,
+        description="Warm up each worker (pools, model client, schema build, parse) at startup",
+    )
+
+
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
@@ -51,23 +558,25 @@ class Settings(BaseSettings):
 
     api: ApiConfig = Field(default_factory=ApiConfig)
     groq: GroqConfig = Field(default_factory=GroqConfig)
-    cache_enabled: bool = Field(default=False)
-
-    @field_validator("cache_enabled", mode="after")
-    @classmethod
-    def check_redis_available(cls, v):
-        if not v:
-            return False
-        try:
-            import redis
+    openai: OpenAIConfig = Field(default_factory=OpenAIConfig)
+    fake: FakeConfig = Field(default_factory=FakeConfig)
+    inference: InferenceConfig = Field(default_factory=InferenceConfig)
+    images: ImagesConfig = Field(default_factory=ImagesConfig)
+    scraper: ScraperConfig = Field(default_factory=ScraperConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    resilience: ResilienceConfig = Field(default_factory=ResilienceConfig)
+    packing: PackingConfig = Field(default_factory=PackingConfig)
+    redis: RedisConfig = Field(default_factory=RedisConfig)
+    server: ServerConfig = Field(default_factory=ServerConfig)
+    cache_enabled: bool = Field(
+        default=False,
+        description="Use Redis; whether it is reachable is probed in the background at runtime",
+    )
 
-            r = redis.Redis(host="localhost", port=6379, socket_connect_timeout=1)
-            r.ping()
-            return True
-        except Exception:
-            log.warning("Redis is not available. Cache will be disabled.")
-            return False
+    @property
+    def provider(self) -> ProviderConfig:
+        """Settings section of the selected inference backend (GROQ_*, OPENAI_* or FAKE_*)."""
+        return {"groq": self.groq, "openai": self.openai, "fake": self.fake}[self.inference.backend]
 
 
 settings = Settings()
-log.info("Settings loaded", **settings.model_dump(exclude_none=True))
@@ -1,14 +1,22 @@
 import typing as tp
 
-from backend.analyzer import Analyzer
-from backend.common.cache import redis_client
+from backend.common.cache import get_redis_client
 
-_analyzer = Analyzer()
+if tp.TYPE_CHECKING:
+    from backend.analyzer import Analyzer
 
+_analyzer: "Analyzer | None" = None
 
-def get_analyzer() -> Analyzer:
+
+def get_analyzer() -> "Analyzer":
+    """Return the shared analyzer, building it (and loading the model SDKs) on first use."""
+    global _analyzer
+    if _analyzer is None:
+        from backend.analyzer import Analyzer
+
+        _analyzer = Analyzer()
     return _analyzer
 
 
 async def get_redis() -> tp.AsyncGenerator:
-    yield redis_client
+    yield get_redis_client()
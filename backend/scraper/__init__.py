@@ -4,7 +4,9 @@ import typing as tp
 
 from backend.analyzer.models import ItemModel
 from backend.common.logging import log
+from backend.common.metrics import PARSE_DURATION
 
+from .executor import parse_executor
 from .platforms.amazon import AmazonScraper
 from .platforms.ebay import EbayScraper
 from .platforms.leboncoin import LeboncoinScraper
@@ -34,4 +36,31 @@ def scrape_item(platform: str, url: str, html: str) -> ItemModel:
         raise
 
 
-__all__ = ["scrape_item", "PARSER_BY_PLATFORM"]
+def parse_html(platform: str, html: str) -> dict:
+    """Parse item data from HTML; runs in the parse executor's workers."""
+    return PARSER_BY_PLATFORM[platform](html)
+
+
+async def scrape_item_async(platform: str, url: str, html: str) -> ItemModel:
+    """Scrape an item like `scrape_item`, parsing through the configured executor."""
+    if platform not in PARSER_BY_PLATFORM:
+        log.error("No parser found for platform", platform=platform)
+        raise ValueError(f"No parser found for platform: {platform}")
+    try:
+        with PARSE_DURATION.time(platform=platform):
+            data = await parse_executor.run(parse_html, platform, html)
+        item = ItemModel(platform=platform, url=url, **data)
+        log.debug(
+            "Successfully scraped item",
+            platform=platform,
+            url=url,
+            title=item.title,
+            mode=parse_executor.mode,
+        )
+        return item
+    except Exception as e:
+        log.error("Error scraping item", platform=platform, url=url, error=str(e), exc_info=e)
+        raise
+
+
+__all__ = ["scrape_item", "scrape_item_async", "PARSER_BY_PLATFORM"]
@@ -1,43 +1,94 @@
-from abc import ABC, abstractmethod
-
-from bs4 import BeautifulSoup
+import re
+import typing as tp
+from abc import ABC
 
 from backend.common.logging import log
+from backend.config import settings
+
+from .selectors import (
+    FieldSpec,
+    SoupBackend,
+    extract_field,
+    extract_text,
+    extract_values,
+    get_backend,
+)
+
+if tp.TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+backend = get_backend(settings.scraper.parser)
+_soup_backend = SoupBackend("html.parser")
+
+# Written as unrolled loops rather than lazy `.*?`, which is several times slower
+# on pages made mostly of inline scripts; matches exactly what the lazy
+# `<(script|style|svg)\b[^>]*>.*?</\1\s*>|<!--.*?-->` (DOTALL) matches
+_PRUNE_PATTERN = re.compile(
+    r"<(?:"
+    r"(script|style|svg)\b[^>]*>[^<]*(?:<(?!/\1\s*>)[^<]*)*</\1\s*>"
+    r"|!--[^-]*(?:-(?!->)[^-]*)*-->"
+    r")",
+    flags=re.IGNORECASE,
+)
+
+
+def prune_html(html: str) -> str:
+    """Drop scripts, styles, inline SVGs and comments, which no scraper reads."""
+    return _PRUNE_PATTERN.sub("", html)
 
 
 class BaseScraper(ABC):
-    """Abstract base class for all platform scrapers."""
+    """Abstract base class for all platform scrapers.
+
+    Platform scrapers declare their fields as `FieldSpec`s: `title` and
+    `images` are required, and any other field is returned as an additional
+    item attribute.
+    """
+
+    fields: tp.ClassVar[dict[str, FieldSpec]]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = {"title", "images"} - cls.fields.keys()
+        if missing:
+            raise TypeError(f"{cls.__name__} is missing field specs: {sorted(missing)}")
+        cls.additional_fields = {
+            name: spec for name, spec in cls.fields.items() if name not in ("title", "images")
+        }
+        # Keep an extract_<name> accessor per additional field, as for title and images
+        for name in cls.additional_fields:
+            setattr(cls, f"extract_{name}", classmethod(_make_extractor(name)))
 
     @classmethod
-    @abstractmethod
-    def extract_title(cls, soup: BeautifulSoup) -> str:
-        pass
+    def extract_title(cls, soup: "BeautifulSoup") -> str:
+        return extract_text(_soup_backend, soup, cls.fields["title"])
 
     @classmethod
-    @abstractmethod
-    def extract_images(cls, soup: BeautifulSoup) -> list[str]:
-        pass
+    def extract_images(cls, soup: "BeautifulSoup") -> list[str]:
+        return extract_values(_soup_backend, soup, cls.fields["images"])
 
     @classmethod
-    def extract_additionals(cls, soup: BeautifulSoup) -> dict[str, str]:
-        """Utility to gather all extract_xxx methods (except title/images/extra) and merge their results."""
-        EXCLUDE = {"extract_title", "extract_images", "extract_additionals"}
-        extras = {}
-        for attr in dir(cls):
-            if attr.startswith("extract_") and attr not in EXCLUDE:
-                method = getattr(cls, attr)
-                if callable(method):
-                    result = method(soup)
-                    extras.update(result)
-        return extras
+    def extract_additionals(cls, soup: "BeautifulSoup") -> dict[str, str | list[str]]:
+        return {
+            name: extract_field(_soup_backend, soup, spec)
+            for name, spec in cls.additional_fields.items()
+        }
 
     @classmethod
     def parse_item(cls, html: str) -> dict:
-        soup = BeautifulSoup(html, "html.parser")
-        data = {
-            "title": cls.extract_title(soup),
-            "images": [{"url": url} for url in cls.extract_images(soup)],
+        if settings.scraper.prune_html:
+            html = prune_html(html)
+        root = backend.parse(html)
+        data: dict[str, tp.Any] = {
+            name: extract_field(backend, root, spec) for name, spec in cls.fields.items()
         }
-        data.update(cls.extract_additionals(soup))
-        log.debug("Parsed html", **data)
+        data["images"] = [{"url": url} for url in data["images"]]
+        log.debug("Parsed html", parser=backend.name, **data)
         return data
+
+
+def _make_extractor(name: str) -> tp.Callable:
+    def extractor(cls: type[BaseScraper], soup: "BeautifulSoup") -> dict[str, str | list[str]]:
+        return {name: extract_field(_soup_backend, soup, cls.fields[name])}
+
+    return extractor
@@ -0,0 +1,94 @@
+import asyncio
+import multiprocessing
+import sys
+import typing as tp
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from backend.common.logging import log
+from backend.common.metrics import QUEUE_DEPTH
+from backend.common.utils import available_cpus
+from backend.config import ScraperConfig, settings
+
+T = tp.TypeVar("T")
+
+
+class ScraperBusyError(RuntimeError):
+    """Raised when too many parses are already queued."""
+
+
+class ScraperTimeoutError(TimeoutError):
+    """Raised when a parse takes longer than the configured timeout."""
+
+
+def _is_free_threaded() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+class ParseExecutor:
+    """Run CPU-bound HTML parsing off the event loop, with backpressure and timeouts."""
+
+    def __init__(self, config: ScraperConfig):
+        self.config = config
+        self.workers = config.workers or available_cpus()
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    @property
+    def mode(self) -> str:
+        if self.config.mode == "auto":
+            return "thread" if _is_free_threaded() else "process"
+        return self.config.mode
+
+    def start(self) -> None:
+        if self._executor is not None or self.mode == "inline":
+            return
+        if self.mode == "process":
+            # forkserver avoids forking a process that already runs threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="parser"
+            )
+        log.info("Parse executor started", mode=self.mode, workers=self.workers)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            log.info("Parse executor stopped")
+
+    async def run(self, func: tp.Callable[..., T], *args: tp.Any) -> T:
+        """Run a picklable parsing function according to the configured mode."""
+        if self.mode == "inline":
+            return func(*args)
+        if self.pending >= self.config.max_pending:
+            raise ScraperBusyError(f"Too many pending parses ({self.pending})")
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)  # ty: ignore[unresolved-attribute]
+        # A timed-out parse keeps its worker busy: it stays pending until it finishes
+        self.pending += 1
+        future.add_done_callback(lambda _: self._release(loop))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.config.timeout)
+        except TimeoutError as e:
+            raise ScraperTimeoutError(f"Parsing timed out after {self.config.timeout}s") from e
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called from the executor's thread when the parse finishes
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:  # the event loop is closed
+            self._decrement()
+
+    def _decrement(self) -> None:
+        self.pending -= 1
+
+
+parse_executor = ParseExecutor(settings.scraper)
+QUEUE_DEPTH.set_function(lambda: parse_executor.pending, queue="parse")
@@ -0,0 +1,146 @@
+import functools
+import importlib.util
+import typing as tp
+
+from pydantic import BaseModel
+
+
+class FieldSpec(BaseModel):
+    """Declarative description of a field extracted from an item page.
+
+    `selector` is a CSS selector evaluated inside the first match of `scope`
+    (or the whole document). The value is the stripped text of the match, or
+    its first non-empty attribute among `attrs`; `many` collects every match.
+    """
+
+    selector: str
+    scope: str | None = None
+    attrs: tuple[str, ...] = ()
+    many: bool = False
+    unique: bool = False
+    process: tp.Callable[[str], str] | None = None
+
+
+@functools.cache
+def _compile(selector: str) -> tp.Any:
+    # Selectors are compiled once, on first use: soupsieve (and bs4) are only
+    # imported when a BeautifulSoup backend is actually used
+    import soupsieve
+
+    return soupsieve.compile(selector)
+
+
+class SoupBackend:
+    """BeautifulSoup tree built with the given parser (`lxml` or `html.parser`)."""
+
+    def __init__(self, features: str):
+        self.name = features
+
+    def parse(self, html: str) -> tp.Any:
+        from bs4 import BeautifulSoup
+
+        return BeautifulSoup(html, self.name)
+
+    @staticmethod
+    def scope(root: tp.Any, spec: FieldSpec) -> tp.Any:
+        if spec.scope is None:
+            return root
+        return _compile(spec.scope).select_one(root)
+
+    @staticmethod
+    def select(node: tp.Any, spec: FieldSpec) -> list:
+        return _compile(spec.selector).select(node, limit=0 if spec.many else 1)
+
+    @staticmethod
+    def text(node: tp.Any) -> str:
+        return node.get_text()
+
+    @staticmethod
+    def attr(node: tp.Any, name: str) -> str | None:
+        value = node.get(name)
+        return " ".join(value) if isinstance(value, list) else value
+
+
+class SelectolaxBackend:
+    """Lexbor tree from selectolax, parsed and queried entirely in C."""
+
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser = LexborHTMLParser
+
+    def parse(self, html: str) -> tp.Any:
+        return self._parser(html)
+
+    @staticmethod
+    def scope(root: tp.Any, spec: FieldSpec) -> tp.Any:
+        if spec.scope is None:
+            return root
+        return root.css_first(spec.scope)
+
+    @staticmethod
+    def select(node: tp.Any, spec: FieldSpec) -> list:
+        if spec.many:
+            return node.css(spec.selector)
+        first = node.css_first(spec.selector)
+        return [] if first is None else [first]
+
+    @staticmethod
+    def text(node: tp.Any) -> str:
+        return node.text(deep=True)
+
+    @staticmethod
+    def attr(node: tp.Any, name: str) -> str | None:
+        return node.attributes.get(name)
+
+
+ParserBackend = SoupBackend | SelectolaxBackend
+
+
+def get_backend(parser: str) -> ParserBackend:
+    """Return the requested parser backend, or the fastest installed one for `auto`."""
+    if parser == "auto":
+        if importlib.util.find_spec("selectolax") is not None:
+            parser = "selectolax"
+        elif importlib.util.find_spec("lxml") is not None:
+            parser = "lxml"
+        else:
+            parser = "html.parser"
+    if parser == "selectolax":
+        return SelectolaxBackend()
+    return SoupBackend(parser)
+
+
+def extract_values(backend: ParserBackend, root: tp.Any, spec: FieldSpec) -> list[str]:
+    """Evaluate a field spec against a parsed document, returning every value found."""
+    values: list[str] = []
+    scope = backend.scope(root, spec)
+    if scope is not None:
+        for node in backend.select(scope, spec):
+            if spec.attrs:
+                value = next((v for a in spec.attrs if (v := backend.attr(node, a))), None)
+            else:
+                value = backend.text(node).strip()
+            if not value:
+                continue
+            if spec.process is not None:
+                value = spec.process(value)
+            if spec.unique and value in values:
+                continue
+            values.append(value)
+    return values
+
+
+def extract_text(backend: ParserBackend, root: tp.Any, spec: FieldSpec) -> str:
+    """Evaluate a single-valued field spec, returning an empty string when nothing matches."""
+    values = extract_values(backend, root, spec)
+    return values[0] if values else ""
+
+
+def extract_field(backend: ParserBackend, root: tp.Any, spec: FieldSpec) -> str | list[str]:
+    """Evaluate a field spec against a parsed document."""
+    if spec.many:
+        return extract_values(backend, root, spec)
+    return extract_text(backend, root, spec)
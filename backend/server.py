@@ -0,0 +1,81 @@
+"""Production launcher: several uvicorn worker processes, recycled gracefully.
+
+    python -m backend.server
+    SERVER_WORKERS=4 python -m backend.server --port 8080
+
+Each worker runs its own event loop, pools and in-process caches, and warms
+them up in the app lifespan before serving. With several workers, a worker is
+replaced after `SERVER_LIMIT_MAX_REQUESTS` requests (plus a random jitter, so
+that workers are not all recycled at once), finishing its in-flight requests
+first. The parse executor's default worker count and the model provider's
+rate limits are divided among the server workers, so that the processes
+together match the CPU count and stay within the provider's limits. The CPU
+count is the number of CPUs the process may use: its affinity mask, capped by
+the container's cgroup CPU quota.
+
+State kept in process is not shared between workers: each request is answered
+by whichever worker accepted the connection, so captured profiles, `/metrics`
+(labelled with the worker's `worker` pid) and `/cache/stats` describe that
+worker only.
+"""
+
+import argparse
+import os
+import sys
+import typing as tp
+
+import uvicorn
+
+from backend.common.logging import log
+from backend.common.utils import available_cpus
+from backend.config import ServerConfig, settings
+
+
+def worker_count(config: ServerConfig, cpu_count: int | None = None) -> int:
+    if config.workers is not None:
+        return config.workers
+    return max(1, min(cpu_count or available_cpus(), config.max_workers))
+
+
+def uvicorn_options(config: ServerConfig, cpu_count: int | None = None) -> dict[str, tp.Any]:
+    workers = worker_count(config, cpu_count)
+    options: dict[str, tp.Any] = {
+        "host": config.host,
+        "port": config.port,
+        "workers": workers,
+        "timeout_graceful_shutdown": config.timeout_graceful_shutdown,
+        "timeout_keep_alive": config.timeout_keep_alive,
+    }
+    # A single worker runs without a supervisor: reaching the limit would stop the server
+    if workers > 1 and config.limit_max_requests is not None:
+        options["limit_max_requests"] = config.limit_max_requests
+        options["limit_max_requests_jitter"] = config.limit_max_requests_jitter
+    return options
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes.")
+    parser.add_argument("--host", help="Interface to bind (default: SERVER_HOST)")
+    parser.add_argument("--port", type=int, help="Port to bind (default: SERVER_PORT)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: SERVER_WORKERS)")
+    args = parser.parse_args(argv)
+
+    overrides = {name: value for name, value in vars(args).items() if value is not None}
+    config = settings.server.model_copy(update=overrides)
+    options = uvicorn_options(config)
+
+    if settings.scraper.workers is None and settings.scraper.mode != "inline":
+        # Read by the workers' settings, which are loaded from the environment
+        parse_workers = max(1, available_cpus() // options["workers"])
+        os.environ["SCRAPER_WORKERS"] = str(parse_workers)
+    if "rate_share" not in settings.provider.model_fields_set:
+        # Each worker schedules its own model calls against the provider's limits
+        os.environ[f"{settings.inference.backend.upper()}_RATE_SHARE"] = str(1 / options["workers"])
+
+    log.info("Starting server", **options)
+    uvicorn.run("backend.app:app", **options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+"""Run the benchmarks: `python -m backend.tests.benchmarks --help`."""
+
+import os
+import sys
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from backend.common.logging import setup_logging
+
+
+def run() -> int:
+    setup_logging()
+    # Imported once logging is configured; importing the suite registers the benchmarks
+    from . import suite  # noqa: F401
+    from .runner import main
+
+    return main()
+
+
+sys.exit(run())
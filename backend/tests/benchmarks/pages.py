@@ -0,0 +1,104 @@
+"""Synthetic item pages shaped like the real listings the scrapers target.
+
+Real pages are mostly scripts, styles, icons and navigation around a small
+item block, so each page wraps the platform's item markup in that much
+boilerplate (a few hundred kilobytes), generated deterministically.
+"""
+
+import random
+
+IMAGE_COUNT = 8
+
+
+def _numbers(rng: random.Random) -> str:
+    return ", ".join(str(rng.random()) for _ in range(20))
+
+
+def _boilerplate(rng: random.Random) -> tuple[str, str, str]:
+    """Return head, header and footer filler: inline scripts, styles, SVG icons and links."""
+    script = "".join(
+        f"window.__state_{i} = {{id: {rng.randrange(10**9)}, items: [{_numbers(rng)}]}};\n"
+        for i in range(400)
+    )
+    style = "".join(
+        f".c{i} {{ margin: {rng.randrange(40)}px; color: #{rng.randrange(16**6):06x}; }}\n"
+        for i in range(1500)
+    )
+    head = (
+        "<head><meta charset='utf-8'><title>Listing</title>"
+        f"<style>{style}</style>"
+        + "".join(f"<script>{script[i::8]}</script>" for i in range(8))
+        + "</head>"
+    )
+    icon = "<svg viewBox='0 0 24 24'>" + "<path d='M0 0h24v24H0z'/>" * 10 + "</svg>"
+    nav = "".join(
+        f"<li class='nav-item c{i}'><a href='/category/{i}'>{icon}<span>Category {i}</span></a>"
+        "<!-- tracking pixel --></li>"
+        for i in range(300)
+    )
+    footer = "".join(
+        f"<div class='footer-col c{i}'><p>Legal notice {i}</p><a href='/p/{i}'>Link</a></div>"
+        for i in range(200)
+    )
+    return head, f"<header><ul>{nav}</ul></header>", f"<footer>{footer}</footer>"
+
+
+def _images(platform: str) -> list[str]:
+    return [f"https://img.{platform}.example/{i}.jpg" for i in range(IMAGE_COUNT)]
+
+
+def _item_markup(platform: str) -> str:
+    images = _images(platform)
+    if platform == "amazon":
+        imgs = "".join(f"<li><img src='{url}' alt=''></li>" for url in images)
+        return (
+            "<div id='centerCol'><span class='a-size-large product-title-word-break'>"
+            "  Wireless Headphones, Red  </span></div>"
+            f"<div class='a-fixed-left-grid'><div class='a-fixed-left-grid-inner'><ul>{imgs}</ul>"
+            "</div></div>"
+        )
+    if platform == "ebay":
+        imgs = "".join(
+            f"<div class='ux-image-grid-item'><img data-src='{url}'></div>" for url in images
+        )
+        return (
+            "<h1 class='x-item-title__mainTitle'><span class='ux-textspans ux-textspans--BOLD'>"
+            "Vintage Camera</span></h1>"
+            f"<div class='ux-image-grid no-scrollbar'>{imgs}</div>"
+        )
+    if platform == "leboncoin":
+        slides = "".join(
+            f"<div class='slick-slide{' slick-active slick-current' if i == 0 else ''}'>"
+            f"<picture><source srcset='{url}'><img src='{url}' alt=''></picture></div>"
+            for i, url in enumerate(images)
+        )
+        return (
+            "<h1 class='text-headline-1-expanded' data-qa-id='adview_title'>Canapé en cuir</h1>"
+            f"<div class='slick-list'><div class='slick-track'>{slides}</div></div>"
+            "<div data-qa-id='adview_description_container'><p>Très bon état, "
+            + "peu servi. " * 40
+            + "</p></div>"
+        )
+    if platform == "vinted":
+        imgs = "".join(
+            f"<figure class='item-photo'><img src='{url}' alt=''></figure>" for url in images
+        )
+        return (
+            "<span class='web_ui__Text__text web_ui__Text__title'>Robe d'été</span>"
+            f"<div class='item-photos'>{imgs}</div>"
+            "<div itemprop='description'><span class='web_ui__Text__text'>Portée une fois. "
+            + "Taille M. " * 40
+            + "</span></div>"
+        )
+    raise ValueError(f"Unknown platform: {platform}")
+
+
+def item_page(platform: str) -> str:
+    rng = random.Random(platform)
+    head, header, footer = _boilerplate(rng)
+    item = _item_markup(platform)
+    return f"<!DOCTYPE html><html>{head}<body>{header}{item}{footer}</body></html>"
+
+
+def expected_images(platform: str) -> list[str]:
+    return _images(platform)
@@ -0,0 +1,295 @@
+"""Replay captured analyze traffic against a running API.
+
+Record traffic with `API_CAPTURE_PATH=capture.jsonl.gz`, start the API against
+the fake provider (`INFERENCE_BACKEND=fake`, see `backend.analyzer.fake_server`)
+and replay it:
+
+    python -m backend.tests.benchmarks.replay capture.jsonl.gz --concurrency 16
+    python -m backend.tests.benchmarks.replay capture.jsonl.gz --rate 20 --count 1000
+    python -m backend.tests.benchmarks.replay capture.jsonl.gz --speed 1
+
+Requests are sent by a fixed number of workers (closed loop), at a Poisson
+arrival rate, or at their recorded arrival times scaled by `--speed`. The
+report covers throughput, latency percentiles, status codes and the cache hit
+ratios over the run: scraped items and analysis results from the cache request
+counters of `/metrics` (stale entries served count as hits), images and filter
+sets from `/cache/stats`. These counters are kept per worker process, so the
+ratios are only reported when the snapshots before and after the run come from
+the same worker (always the case with `SERVER_WORKERS=1`).
+"""
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import random
+import re
+import sys
+import time
+import typing as tp
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import httpx
+
+_IMAGE_URL_PATTERN = re.compile(r"""((?:src|data-src)=["'])https?://([^/"']+)/""")
+_CACHE_REQUESTS_PATTERN = re.compile(
+    r'^filtergenie_cache_requests_total\{(?:worker="[^"]*",)?cache="([^"]*)",result="([^"]*)"\} '
+    r"(\S+)$",
+    re.MULTILINE,
+)
+_WORKER_LABEL_PATTERN = re.compile(r'^\w+\{worker="([^"]*)"', re.MULTILINE)
+
+
+@dataclass
+class Outcome:
+    status: int | None
+    latency: float
+    error: str | None = None
+
+
+def load_capture(path: Path) -> list[dict[str, tp.Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def prepare_body(body: str, image_base: str | None, url_suffix: str | None) -> str:
+    """Point item images at the stand-in image server, and optionally make item URLs unique."""
+    if image_base is None and url_suffix is None:
+        return body
+    payload = json.loads(body)
+    items = [payload["item"]] if "item" in payload else payload["items"]
+    for item in items:
+        if image_base is not None:
+            item["html"] = _IMAGE_URL_PATTERN.sub(rf"\1{image_base}/images/\2/", item["html"])
+        if url_suffix is not None:
+            item["url"] = f"{item['url']}#{url_suffix}"
+    return json.dumps(payload)
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def _hit_ratio(hits: float, misses: float) -> float | None:
+    return hits / (hits + misses) if hits + misses else None
+
+
+def cache_requests(metrics: str) -> dict[tuple[str, str], float]:
+    """Read the (cache, result) lookup counters from a `/metrics` page."""
+    return {
+        (cache, result): float(value)
+        for cache, result, value in _CACHE_REQUESTS_PATTERN.findall(metrics)
+    }
+
+
+def metrics_worker(metrics: str) -> str | None:
+    """Read the worker label of a `/metrics` page, which a single worker process renders."""
+    match = _WORKER_LABEL_PATTERN.search(metrics)
+    return match.group(1) if match else None
+
+
+def cache_hit_ratios(
+    before: dict[str, tp.Any],
+    after: dict[str, tp.Any],
+    requests_before: dict[tuple[str, str], float],
+    requests_after: dict[tuple[str, str], float],
+) -> dict[str, tp.Any]:
+    def delta(section: str, key: str) -> float:
+        return after[section][key] - before[section][key]
+
+    def requests_delta(cache: str, *results: str) -> float:
+        return sum(
+            requests_after.get((cache, r), 0.0) - requests_before.get((cache, r), 0.0)
+            for r in results
+        )
+
+    image_hits = sum(delta("images", k) for k in ("local_hits", "redis_hits", "content_hits"))
+    return {
+        "scraped": _hit_ratio(
+            requests_delta("scraped", "hit", "stale"), requests_delta("scraped", "miss")
+        ),
+        "analysis": _hit_ratio(
+            requests_delta("analysis", "hit", "stale"), requests_delta("analysis", "miss")
+        ),
+        "images": _hit_ratio(image_hits, delta("images", "misses")),
+        "filter_sets": _hit_ratio(delta("filter_sets", "hits"), delta("filter_sets", "misses")),
+    }
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, requests: list[dict[str, tp.Any]]):
+        self.client = client
+        self.requests = requests
+        self.outcomes: list[Outcome] = []
+
+    async def send(self, request: dict[str, tp.Any]) -> None:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(
+                request["method"],
+                request["path"],
+                content=request["body"],
+                headers=request["headers"],
+            )
+            await response.aread()
+            outcome = Outcome(response.status_code, time.perf_counter() - start)
+        except httpx.HTTPError as e:
+            outcome = Outcome(None, time.perf_counter() - start, error=type(e).__name__)
+        self.outcomes.append(outcome)
+
+    async def closed_loop(self, concurrency: int) -> None:
+        pending = iter(self.requests)
+
+        async def worker():
+            for request in pending:
+                await self.send(request)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def open_loop(self, delays: tp.Iterable[float], concurrency: int) -> None:
+        """Start requests after the given delays from the run start, capped at `concurrency`."""
+        limit = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+
+        async def send_limited(request: dict[str, tp.Any]) -> None:
+            async with limit:
+                await self.send(request)
+
+        tasks = []
+        for request, delay in zip(self.requests, delays):
+            await asyncio.sleep(max(0.0, start + delay - time.perf_counter()))
+            tasks.append(asyncio.create_task(send_limited(request)))
+        await asyncio.gather(*tasks)
+
+
+def poisson_delays(rate: float, seed: int | None = None) -> tp.Iterator[float]:
+    rng = random.Random(seed)
+    t = 0.0
+    while True:
+        yield t
+        t += rng.expovariate(rate)
+
+
+def recorded_delays(requests: list[dict[str, tp.Any]], speed: float) -> list[float]:
+    t0 = requests[0]["time"]
+    return [(r["time"] - t0) / speed for r in requests]
+
+
+def summarize(outcomes: list[Outcome], duration: float) -> dict[str, tp.Any]:
+    latencies = [o.latency for o in outcomes]
+    statuses: dict[str, int] = {}
+    for o in outcomes:
+        key = str(o.status) if o.status is not None else o.error
+        statuses[key] = statuses.get(key, 0) + 1
+    errors = sum(1 for o in outcomes if o.status is None or o.status >= 400)
+    return {
+        "requests": len(outcomes),
+        "duration": round(duration, 3),
+        "throughput": round(len(outcomes) / duration, 3) if duration else None,
+        "error_rate": errors / len(outcomes) if outcomes else None,
+        "statuses": statuses,
+        "latency": {
+            name: None if value is None else round(value, 4)
+            for name, value in {
+                "mean": sum(latencies) / len(latencies) if latencies else None,
+                "p50": percentile(latencies, 0.5),
+                "p90": percentile(latencies, 0.9),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": max(latencies, default=None),
+            }.items()
+        },
+    }
+
+
+async def replay(args: argparse.Namespace) -> dict[str, tp.Any]:
+    captured = load_capture(args.capture)
+    if not captured:
+        raise SystemExit(f"No requests in {args.capture}")
+    count = args.count or len(captured)
+    url_suffix = f"replay-{uuid.uuid4().hex[:8]}" if args.unique_urls else None
+    requests = [
+        {**r, "body": prepare_body(r["body"], args.image_base, url_suffix)}
+        for r in itertools.islice(itertools.cycle(captured), count)
+    ]
+
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, headers=headers, timeout=args.timeout, limits=limits
+    ) as client:
+        stats_before = (await client.get("/cache/stats")).json()
+        metrics_before = (await client.get("/metrics")).text
+        replayer = Replayer(client, requests)
+        start = time.perf_counter()
+        if args.speed is not None:
+            delays = recorded_delays(requests[: len(captured)], args.speed)
+            if count > len(captured):
+                raise SystemExit("--count cannot exceed the capture size with --speed")
+            await replayer.open_loop(delays, args.concurrency)
+        elif args.rate is not None:
+            await replayer.open_loop(poisson_delays(args.rate, args.seed), args.concurrency)
+        else:
+            await replayer.closed_loop(args.concurrency)
+        duration = time.perf_counter() - start
+        stats_after = (await client.get("/cache/stats")).json()
+        metrics_after = (await client.get("/metrics")).text
+
+    report = summarize(replayer.outcomes, duration)
+    workers = {
+        str(stats_before.get("worker")),
+        str(stats_after.get("worker")),
+        str(metrics_worker(metrics_before)),
+        str(metrics_worker(metrics_after)),
+    }
+    if len(workers) == 1:
+        report["cache_hit_ratio"] = cache_hit_ratios(
+            stats_before, stats_after, cache_requests(metrics_before), cache_requests(metrics_after)
+        )
+    else:
+        # Counters of different worker processes cannot be subtracted from each other
+        report["cache_hit_ratio"] = None
+        report["cache_stats_workers"] = sorted(workers)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured analyze traffic.")
+    parser.add_argument("capture", type=Path, help="Capture file written by API_CAPTURE_PATH")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--api-key", help="API key, when the API requires one")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, help="Poisson arrival rate in requests per second")
+    mode.add_argument("--speed", type=float, help="Replay recorded arrival times at this speed")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Workers, or maximum requests in flight"
+    )
+    parser.add_argument("--count", type=int, help="Number of requests (cycles the capture)")
+    parser.add_argument(
+        "--image-base",
+        help="Serve item images from this stand-in server (e.g. http://127.0.0.1:8001)",
+    )
+    parser.add_argument(
+        "--unique-urls", action="store_true", help="Make item URLs unique to bypass result caches"
+    )
+    parser.add_argument("--timeout", type=float, default=120.0, help="Request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Random seed of the Poisson arrivals")
+    parser.add_argument("--output", type=Path, help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(replay(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output is not None:
+        args.output.write_text(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Standalone micro-benchmark runner.
+
+Benchmarks are registered with `@benchmark(name)` on a setup function that
+returns the callable to time, or yields it when it needs a teardown. Results
+are written as JSON, and a previous results file can be used as a baseline:
+the run fails when any benchmark's median got slower than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing as tp
+from datetime import datetime, timezone
+from pathlib import Path
+
+Setup = tp.Callable[[], tp.Callable[[], object] | tp.Iterator[tp.Callable[[], object]]]
+
+BENCHMARKS: dict[str, Setup] = {}
+
+
+def benchmark(name: str) -> tp.Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        if name in BENCHMARKS:
+            raise ValueError(f"Duplicate benchmark: {name}")
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _time_loops(func: tp.Callable[[], object], loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+
+def measure(func: tp.Callable[[], object], min_time: float, rounds: int) -> dict[str, float]:
+    """Time `func` over `rounds` rounds of a calibrated number of loops, in seconds per call."""
+    func()  # warm up caches and lazy imports
+    target = min_time / rounds
+    loops = 1
+    while (elapsed := _time_loops(func, loops)) < target and loops < 1_000_000:
+        loops = max(loops * 2, int(loops * target / max(elapsed, 1e-9)))
+    timings = [_time_loops(func, loops) / loops for _ in range(rounds)]
+    return {
+        "rounds": rounds,
+        "loops": loops,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if rounds > 1 else 0.0,
+    }
+
+
+def run_benchmark(setup: Setup, min_time: float, rounds: int) -> dict[str, float]:
+    prepared = setup()
+    if isinstance(prepared, tp.Iterator):
+        func = next(prepared)
+        try:
+            return measure(func, min_time, rounds)
+        finally:
+            prepared.close()
+    return measure(prepared, min_time, rounds)
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run(
+    names: list[str] | None = None, min_time: float = 1.0, rounds: int = 5
+) -> dict[str, tp.Any]:
+    selected = [name for name in BENCHMARKS if not names or any(n in name for n in names)]
+    results = {}
+    for name in selected:
+        results[name] = run_benchmark(BENCHMARKS[name], min_time, rounds)
+        print(f"{name:<40} {results[name]['median'] * 1e6:>12.1f} us", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(
+    baseline: dict[str, tp.Any], current: dict[str, tp.Any], threshold: float
+) -> list[dict[str, tp.Any]]:
+    """List benchmarks whose median is more than `threshold` slower than the baseline's."""
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        ratio = result["median"] / base["median"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                {
+                    "name": name,
+                    "baseline": base["median"],
+                    "current": result["median"],
+                    "ratio": ratio,
+                }
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the backend micro-benchmarks.")
+    parser.add_argument("names", nargs="*", help="Only run benchmarks whose name contains these")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Baseline results JSON file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed slowdown ratio (default: 0.2)"
+    )
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds per benchmark")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed rounds per benchmark")
+    parser.add_argument("--list", action="store_true", help="List benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    results = run(args.names, min_time=args.min_time, rounds=args.rounds)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare is None:
+        return 0
+
+    regressions = compare(json.loads(args.compare.read_text()), results, args.threshold)
+    for r in regressions:
+        print(
+            f"REGRESSION {r['name']}: {r['baseline'] * 1e6:.1f} us -> "
+            f"{r['current'] * 1e6:.1f} us (x{r['ratio']:.2f})",
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
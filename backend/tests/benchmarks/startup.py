@@ -0,0 +1,111 @@
+"""Report how long importing the API takes, and where the time goes.
+
+    python -m backend.tests.benchmarks.startup
+    python -m backend.tests.benchmarks.startup --runs 5 --budget 1500
+
+The import runs in fresh interpreters with `-X importtime`. The report gives
+the total import time (the fastest run), the packages taking the most time and
+any module that should only be loaded on demand, such as the model provider
+SDKs. With `--budget`, the exit status is non-zero when the import takes
+longer than the budget or a deferred module was loaded.
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import typing as tp
+from pathlib import Path
+
+# Loaded when first needed (the analyzer is built in the background, or on
+# the first analysis request; bs4 only with a BeautifulSoup parser backend),
+# never when the app is imported
+DEFERRED_MODULES = (
+    "openai",
+    "groq",
+    "instructor",
+    "PIL",
+    "pyinstrument",
+    "bs4",
+    "backend.analyzer.engine",
+)
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(output: str) -> list[dict[str, tp.Any]]:
+    """Parse `-X importtime` lines into (module, self, cumulative, depth) records."""
+    records = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        records.append(
+            {
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(indent) - 1) // 2,
+            }
+        )
+    return records
+
+
+def measure(module: str = "backend.app") -> list[dict[str, tp.Any]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).resolve().parents[3],
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def report(records: list[dict[str, tp.Any]], top: int = 10) -> dict[str, tp.Any]:
+    """Total import time, and the packages taking the most of it (by their own modules' time)."""
+    packages: dict[str, float] = {}
+    for r in records:
+        package = r["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + r["self_ms"]
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    loaded = {r["module"] for r in records}
+    return {
+        "total_ms": round(sum(r["cumulative_ms"] for r in records if r["depth"] == 0), 1),
+        "modules": len(records),
+        "slowest_packages": {package: round(ms, 1) for package, ms in slowest},
+        "deferred_loaded": [m for m in DEFERRED_MODULES if m in loaded],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Report the import time of the API.")
+    parser.add_argument("--module", default="backend.app", help="Module to import")
+    parser.add_argument("--runs", type=int, default=3, help="Imports measured; the fastest counts")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest packages listed")
+    parser.add_argument("--budget", type=float, help="Maximum import time in milliseconds")
+    parser.add_argument("--output", type=Path, help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    reports = [report(measure(args.module), top=args.top) for _ in range(args.runs)]
+    result = min(reports, key=lambda r: r["total_ms"])
+    result["budget_ms"] = args.budget
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output is not None:
+        args.output.write_text(text)
+
+    if args.budget is not None:
+        if result["total_ms"] > args.budget:
+            print(f"Import took {result['total_ms']} ms, over the {args.budget} ms budget")
+            return 1
+        if result["deferred_loaded"]:
+            print(f"Deferred modules loaded at import: {', '.join(result['deferred_loaded'])}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
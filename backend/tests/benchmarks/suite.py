@@ -0,0 +1,156 @@
+"""Benchmarks of the backend hot paths."""
+
+import io
+import typing as tp
+
+from PIL import Image
+
+from backend.analyzer.filters import (
+    create_filter_schema,
+    filter_registry,
+    normalize_filters,
+)
+from backend.analyzer.models import FilterModel
+from backend.common.cache import make_cache_key, make_filters_hash
+from backend.common.utils import bytes_to_pil, pil_to_base64, resize_img
+from backend.scraper import PARSER_BY_PLATFORM
+from backend.scraper.base import prune_html
+
+from .pages import item_page
+from .runner import benchmark
+
+FILTERS = [
+    "Red color",
+    "Good condition",
+    "Large size",
+    "Made of leather",
+    "Less than 5 years old",
+    "Sold with original box",
+]
+
+
+def _register_parse_item(platform: str) -> None:
+    @benchmark(f"parse_item[{platform}]")
+    def parse_item():
+        html = item_page(platform)
+        parse = PARSER_BY_PLATFORM[platform]
+        return lambda: parse(html)
+
+
+for _platform in PARSER_BY_PLATFORM:
+    _register_parse_item(_platform)
+
+
+@benchmark("prune_html")
+def prune():
+    html = item_page("amazon")
+    return lambda: prune_html(html)
+
+
+@benchmark("create_filter_schema")
+def filter_schema():
+    return lambda: create_filter_schema(normalize_filters(FILTERS))
+
+
+@benchmark("filter_registry.compile[cached]")
+def filter_compile_cached():
+    return lambda: filter_registry.compile(FILTERS)
+
+
+@benchmark("make_cache_key[analysis]")
+def cache_key():
+    filter_model = FilterModel(desc=FILTERS[0])
+    url = "https://www.vinted.fr/items/1234567890-robe-d-ete"
+    return lambda: make_cache_key("analysis", "vinted", url, 3, filter_model, "model")
+
+
+@benchmark("make_filters_hash")
+def filters_hash():
+    filters = [FilterModel(desc=desc) for desc in FILTERS]
+    return lambda: make_filters_hash(filters)
+
+
+def _photo_bytes() -> bytes:
+    img = Image.linear_gradient("L").resize((1200, 1600)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@benchmark("resize_img")
+def resize():
+    img = Image.open(io.BytesIO(_photo_bytes()))
+    img.load()
+    return lambda: resize_img(img.copy())
+
+
+@benchmark("pil_to_base64")
+def to_base64():
+    img = bytes_to_pil(_photo_bytes(), max_size=256)
+    return lambda: pil_to_base64(img)
+
+
+def _analyze_calls(cached: bool) -> tp.Iterator[tp.Callable[[], object]]:
+    import httpx
+    import instructor
+    from fastapi.testclient import TestClient
+    from openai import AsyncOpenAI
+
+    from backend.analyzer import Analyzer
+    from backend.analyzer.fake_server import FakeServerConfig, create_fake_app
+    from backend.app import app
+    from backend.common import cache
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    analyzer = Analyzer()
+    # Measure the stack, not the rate limits
+    analyzer.scheduler.requests.resize(1e9)
+    fake_app = create_fake_app(
+        FakeServerConfig(latency="fixed", latency_mean=0, tokens_per_minute=1e9, seed=0)
+    )
+    analyzer.client = instructor.from_openai(
+        AsyncOpenAI(
+            api_key="unused",
+            base_url="http://fake/v1",
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app)),
+            max_retries=0,
+        ),
+        mode=instructor.Mode.JSON,
+    )
+    settings.api.key = None
+    app.dependency_overrides[get_analyzer] = lambda: analyzer
+    local_cache = cache.local_cache
+    if not cached:
+        # Otherwise every call after the first is answered by the in-process cache
+        cache.local_cache = None
+    payload = {
+        "item": {"platform": "vinted", "url": "http://bench/item", "html": item_page("vinted")},
+        "filters": FILTERS,
+        "max_images": 0,
+    }
+    try:
+        with TestClient(app) as client:
+
+            def call():
+                response = client.post("/item/analyze", json=payload)
+                response.raise_for_status()
+
+            if cached:
+                call()
+            yield call
+    finally:
+        cache.local_cache = local_cache
+        app.dependency_overrides.clear()
+
+
+@benchmark("api[/item/analyze]")
+def item_analyze():
+    """Full request through the app, with a zero-latency fake model, no images and no cache."""
+    yield from _analyze_calls(cached=False)
+
+
+@benchmark("api[/item/analyze, cached]")
+def item_analyze_cached():
+    """Same request answered from the in-process cache of scraped items and results."""
+    yield from _analyze_calls(cached=True)
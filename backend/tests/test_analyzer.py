@@ -74,3 +74,413 @@ def test_analyze_item_with_images(predict_class, expected):
 
     result = asyncio.run(analyzer.analyze_item(item, filters))
     assert result[0].value is expected
+
+
+def test_analyze_item_prefetches_images(monkeypatch):
+    import asyncio
+    import io
+
+    from PIL import Image
+
+    from backend.analyzer.images import image_fetcher
+
+    buffer = io.BytesIO()
+    Image.new("RGBA", (512, 300), (255, 0, 0, 255)).save(buffer, format="PNG")
+
+    async def fake_fetch(url: str) -> bytes:
+        if "broken" in url:
+            raise ValueError("download failed")
+        return buffer.getvalue()
+
+    monkeypatch.setattr(image_fetcher, "fetch", fake_fetch)
+
+    received: list[ImageModel] = []
+
+    async def predict(model, prompt, images, schema):
+        received.extend(images)
+        return await DummyModel().predict(model, prompt, images, schema)
+
+    analyzer = Analyzer()
+    analyzer.predict = predict  # type: ignore[attr-defined]
+    item = ItemModel(
+        platform="test",
+        title="Test Item",
+        images=[
+            ImageModel(url="http://example.com/a.png"),
+            ImageModel(url="http://example.com/broken.png"),
+        ],
+        url="http://example.com/item3",
+    )
+    result = asyncio.run(analyzer.analyze_item(item, [FilterModel(desc="Red")]))
+    assert result[0].value is True
+    assert [image.url for image in received] == ["http://example.com/a.png"]
+    assert received[0].base64.startswith("data:image/jpeg;base64,")
+
+
+def test_image_host_limits_are_dropped_when_idle():
+    import asyncio
+
+    from backend.analyzer.images import ImageFetcher
+
+    fetcher = ImageFetcher()
+
+    async def download(url: str, seen: list[int]) -> None:
+        async with fetcher._host_limit(url):
+            await asyncio.sleep(0)
+            seen.append(len(fetcher._host_limits))
+
+    async def main() -> list[int]:
+        seen: list[int] = []
+        urls = [f"http://host{i % 3}.example/{i}.png" for i in range(9)]
+        await asyncio.gather(*(download(url, seen) for url in urls))
+        return seen
+
+    seen = asyncio.run(main())
+    assert max(seen) == 3
+    assert fetcher._host_limits == {}
+
+
+def test_scheduler_adapts_to_rate_limit_headers():
+    import asyncio
+    import time
+
+    import httpx
+
+    from backend.analyzer.scheduler import RateScheduler, parse_duration
+
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("250ms") == pytest.approx(0.25)
+    assert parse_duration("3") == 3
+
+    scheduler = RateScheduler(
+        requests_per_minute=600,
+        tokens_per_minute=6_000,
+        max_concurrency=2,
+        max_queue=4,
+        queue_timeout=1,
+        headroom=0.5,
+    )
+    assert scheduler.tokens.capacity == 3_000
+
+    response = httpx.Response(
+        200,
+        headers={
+            "x-ratelimit-limit-tokens": "12000",
+            "x-ratelimit-remaining-tokens": "100",
+            "x-ratelimit-remaining-requests": "50",
+        },
+    )
+    asyncio.run(scheduler.observe(response))
+    assert scheduler.tokens.capacity == 6_000
+    assert scheduler.tokens.level <= 101
+    # The remaining requests are a daily count, not synced into the per-minute bucket
+    assert scheduler.requests.level > 51
+    daily_limit = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m"}
+    asyncio.run(scheduler.observe(httpx.Response(200, headers=daily_limit)))
+    assert scheduler._resume_at - time.monotonic() > 55
+    scheduler._resume_at = 0.0
+
+    asyncio.run(scheduler.observe(httpx.Response(429, headers={"retry-after": "0.2"})))
+    assert scheduler.throttled == 1
+
+    async def call():
+        async with scheduler.slot(tokens=50):
+            return time.monotonic()
+
+    start = time.monotonic()
+    admitted_at = asyncio.run(call())
+    # Admission waits for the provider's retry-after delay
+    assert admitted_at - start >= 0.15
+
+
+def test_scheduler_backpressure():
+    import asyncio
+
+    from backend.analyzer.scheduler import RateScheduler, SchedulerBusyError
+
+    scheduler = RateScheduler(
+        requests_per_minute=6_000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=1,
+        max_queue=2,
+        queue_timeout=0.2,
+    )
+
+    async def call(delay: float):
+        async with scheduler.slot(tokens=10):
+            await asyncio.sleep(delay)
+
+    async def run():
+        return await asyncio.gather(call(0.5), call(0), call(0), call(0), return_exceptions=True)
+
+    results = asyncio.run(run())
+    busy = [r for r in results if isinstance(r, SchedulerBusyError)]
+    # One call runs, two wait and time out, the fourth is rejected outright
+    assert results[0] is None
+    assert len(busy) == 3
+    assert scheduler.rejected == 3
+    assert scheduler.running == 0
+
+
+def test_resilience_retries_and_circuit_breaker():
+    import asyncio
+    import time
+
+    import groq
+    import httpx
+
+    from backend.analyzer.resilience import CircuitOpenError, Resilience
+    from backend.config import ResilienceConfig
+
+    resilience = Resilience(
+        ResilienceConfig(
+            max_retries=2,
+            backoff_base=0.01,
+            breaker_failure_threshold=3,
+            breaker_reset_timeout=0.2,
+        )
+    )
+    request = httpx.Request("POST", "http://groq.test")
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise groq.APIConnectionError(request=request)
+        return "ok"
+
+    assert asyncio.run(resilience.call(flaky)) == "ok"
+    assert resilience.retries == 2
+    assert resilience.breaker.state == "closed"
+
+    async def bad_request():
+        raise groq.BadRequestError("bad", response=httpx.Response(400, request=request), body=None)
+
+    with pytest.raises(groq.BadRequestError):
+        asyncio.run(resilience.call(bad_request))
+    assert resilience.retries == 2
+
+    async def down():
+        raise groq.APIConnectionError(request=request)
+
+    with pytest.raises(groq.APIConnectionError):
+        asyncio.run(resilience.call(down))
+    assert resilience.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(resilience.call(flaky))
+
+    time.sleep(0.25)
+    assert resilience.breaker.state == "half_open"
+    assert asyncio.run(resilience.call(flaky)) == "ok"
+    assert resilience.breaker.stats() == {"state": "closed", "failures": 0, "times_opened": 1}
+
+
+def test_circuit_probe_without_outcome_is_released():
+    import asyncio
+    import time
+
+    import groq
+    import httpx
+
+    from backend.analyzer.resilience import Resilience
+    from backend.analyzer.scheduler import SchedulerBusyError
+    from backend.config import ResilienceConfig
+
+    resilience = Resilience(
+        ResilienceConfig(max_retries=0, breaker_failure_threshold=1, breaker_reset_timeout=0.05)
+    )
+    request = httpx.Request("POST", "http://groq.test")
+
+    async def down():
+        raise groq.APIConnectionError(request=request)
+
+    async def busy():
+        raise SchedulerBusyError("busy")
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "ok"
+
+    async def ok():
+        return "ok"
+
+    async def cancelled_probe():
+        task = asyncio.create_task(resilience.call(slow))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with pytest.raises(groq.APIConnectionError):
+        asyncio.run(resilience.call(down))
+    time.sleep(0.06)
+    asyncio.run(cancelled_probe())
+    # A busy scheduler never reached the provider: it neither closes nor reopens the circuit
+    with pytest.raises(SchedulerBusyError):
+        asyncio.run(resilience.call(busy))
+    assert resilience.breaker.state == "half_open"
+    assert asyncio.run(resilience.call(ok)) == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_saturated_scheduler_keeps_circuit_closed():
+    import asyncio
+
+    from backend.analyzer.resilience import Resilience
+    from backend.analyzer.scheduler import RateScheduler, SchedulerBusyError
+    from backend.config import ResilienceConfig
+
+    scheduler = RateScheduler(
+        requests_per_minute=6_000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=1,
+        max_queue=8,
+        queue_timeout=0.2,
+    )
+    resilience = Resilience(
+        ResilienceConfig(max_retries=2, breaker_failure_threshold=1, attempt_timeout=0.05)
+    )
+    sent = 0
+
+    async def send():
+        nonlocal sent
+        sent += 1
+        return "ok"
+
+    def call():
+        return resilience.call(send, admit=lambda: scheduler.slot(1))
+
+    async def run():
+        async with scheduler.slot(1):
+            # Queued past the attempt timeout, then admitted: not a provider timeout
+            waiting = asyncio.create_task(call())
+            await asyncio.sleep(0.1)
+        assert await waiting == "ok"
+        async with scheduler.slot(1):
+            # Never admitted: rejected without retrying or counting a failure
+            for _ in range(4):
+                with pytest.raises(SchedulerBusyError):
+                    await call()
+
+    asyncio.run(run())
+    assert sent == 1
+    assert resilience.retries == 0
+    assert resilience.breaker.state == "closed"
+    assert max(resilience.latency.samples) < 0.05
+
+
+def test_resilience_hedges_slow_calls():
+    import asyncio
+
+    from backend.analyzer.resilience import Resilience
+    from backend.config import ResilienceConfig
+
+    resilience = Resilience(ResilienceConfig(hedge=True, hedge_min_samples=5))
+    for _ in range(5):
+        resilience.latency.add(0.01)
+    delays = iter([1.0, 0.0])
+
+    async def call():
+        delay = next(delays)
+        await asyncio.sleep(delay)
+        return delay
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        result = await resilience.call(call)
+        return result, asyncio.get_running_loop().time() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result == 0.0
+    assert elapsed < 0.5
+    assert resilience.hedges == 1
+    assert resilience.hedge_wins == 1
+
+
+def test_packer_packs_concurrent_items_and_splits_on_failure():
+    import asyncio
+
+    from backend.analyzer.filters import filter_registry
+    from backend.analyzer.packing import ItemPacker
+    from backend.config import PackingConfig
+
+    analyzer = Analyzer()
+    packer = ItemPacker(analyzer, PackingConfig(enabled=True, window=0.05, max_items=4))
+    compiled = filter_registry.compile(["Red color"])
+    calls = []
+
+    async def complete(model, content, schema):
+        keys = list(schema.model_fields)
+        calls.append(len(keys))
+        if len(keys) == 4:
+            raise ValueError("packed response did not validate")
+        # Every item's title is in its own text block, in key order
+        titles = [part["text"] for part in content if "Title" in part.get("text", "")]
+        return schema(**{key: {"red_color": "Red" in title} for key, title in zip(keys, titles)})
+
+    async def predict(model, prompt, images, schema):
+        calls.append(1)
+        return schema(red_color="Red" in prompt)
+
+    analyzer.complete = complete  # type: ignore[method-assign]
+    analyzer.predict = predict  # type: ignore[method-assign]
+
+    async def run():
+        items = [
+            ItemModel(platform="test", title=title, images=[], url=f"http://example.com/{i}")
+            for i, title in enumerate(["Red hat", "Blue hat", "Red shoe", "Green shoe", "Red bag"])
+        ]
+        return await asyncio.gather(*(packer.submit(item, [], compiled) for item in items))
+
+    results = asyncio.run(run())
+    assert [r.red_color for r in results] == [True, False, True, False, True]
+    # Four items packed together fail and are split in two pairs; the fifth is sent alone
+    assert sorted(calls) == [1, 2, 2, 4]
+    assert packer.stats() == {"pending": 0, "calls": 4, "packed_items": 8, "splits": 1}
+
+
+def test_analyzer_against_fake_server():
+    import asyncio
+
+    import httpx
+    import instructor
+    from openai import AsyncOpenAI
+
+    from backend.analyzer.fake_server import FakeServerConfig, create_fake_app
+    from backend.analyzer.filters import filter_registry
+
+    fake_app = create_fake_app(
+        FakeServerConfig(latency="fixed", latency_mean=0.01, error_rate=0.3, seed=0, true_ratio=1)
+    )
+    analyzer = Analyzer()
+    analyzer.resilience.config = analyzer.resilience.config.model_copy(
+        update={"backoff_base": 0.01, "max_retries": 10}
+    )
+    http_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=fake_app),
+        event_hooks={"response": [analyzer.scheduler.observe]},
+    )
+    analyzer.client = instructor.from_openai(
+        AsyncOpenAI(
+            api_key="unused", base_url="http://fake/v1", http_client=http_client, max_retries=0
+        ),
+        mode=instructor.Mode.JSON,
+    )
+    compiled = filter_registry.compile(["Red color", "Large size"])
+    item = ItemModel(platform="test", title="Red hat", images=[], url="http://example.com/item")
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                analyzer.predict(
+                    "fake", analyzer.build_prompt(item, []), [], compiled.response_model
+                )
+                for _ in range(10)
+            )
+        )
+
+    responses = asyncio.run(run())
+    assert all(r.red_color and r.large_size for r in responses)
+    # Some of the fake server's 500s were retried, and its rate-limit headers were adopted
+    assert analyzer.resilience.retries > 0
+    assert analyzer.scheduler.tokens.capacity == 300_000 * analyzer.scheduler.headroom
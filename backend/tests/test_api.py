@@ -1,5 +1,7 @@
+import json
 import os
 
+import pytest
 from fastapi.testclient import TestClient
 
 from backend.app import app
@@ -46,6 +48,44 @@ def test_cache_clear_requires_api_key(monkeypatch):
     assert response.status_code not in (401, 403)
 
 
+def test_cache_clear_runs_in_background(monkeypatch):
+    from backend.api import routes
+    from backend.config import settings
+
+    settings.api.key = "testkey"
+    cleared: list[list[str]] = []
+
+    async def fake_invalidate(patterns, batch_size, max_rate):
+        cleared.append(patterns)
+        return 3
+
+    monkeypatch.setattr(routes, "cache_active", lambda: True)
+    monkeypatch.setattr(routes, "invalidate", fake_invalidate)
+    response = client.post(
+        "/cache/clear",
+        json={"platform": "vinted", "key_types": ["scraped"]},
+        headers={"X-API-Key": "testkey"},
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "accepted"
+    assert data["job_id"]
+    # The test client runs background tasks before returning the response
+    assert cleared == [data["patterns"]]
+    assert all(pattern.startswith("scraped:vinted:") for pattern in data["patterns"])
+
+    # Only registered filter sets are known to every worker
+    async def unknown(filter_set_id):
+        return None
+
+    monkeypatch.setattr(routes.filter_registry, "resolve", unknown)
+    response = client.post(
+        "/cache/clear", json={"filter_set_id": "abc"}, headers={"X-API-Key": "testkey"}
+    )
+    assert response.status_code == 404
+    assert "/filters/compile" in response.json()["detail"]
+
+
 def test_items_analyze_requires_api_key(monkeypatch):
     os.environ["API_KEY"] = "testkey"
     from backend.config import settings
@@ -62,3 +102,456 @@ def test_items_analyze_requires_api_key(monkeypatch):
     assert response.status_code == 403
     response = client.post("/item/analyze", json=payload, headers={"X-API-Key": "testkey"})
     assert response.status_code not in (401, 403)
+
+
+class DummyAnalyzer:
+    class config:
+        model_name = "dummy-model"
+
+    async def analyze_item(self, item, filters):
+        for f in filters:
+            f.value = True
+        return filters
+
+
+def test_items_analyze_streams_ndjson():
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    settings.api.key = None
+    app.dependency_overrides[get_analyzer] = DummyAnalyzer
+    try:
+        payload = {
+            "items": [
+                {"platform": "vinted", "url": f"http://foo/{i}", "html": "<html></html>"}
+                for i in range(3)
+            ],
+            "filters": ["Red", "Large"],
+            "max_images": 1,
+        }
+        response = client.post("/items/analyze", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["index"] for r in results) == [0, 1, 2]
+    for r in results:
+        assert r["url"] == f"http://foo/{r['index']}"
+        assert r["filters"] == {"Large": True, "Red": True}
+        assert r["error"] is None
+
+
+def test_items_analyze_streams_sse_with_errors():
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    settings.api.key = None
+    app.dependency_overrides[get_analyzer] = DummyAnalyzer
+    try:
+        payload = {
+            "items": [
+                {"platform": "vinted", "url": "http://foo", "html": "<html></html>"},
+                {"platform": "unknown", "url": "http://bar", "html": "<html></html>"},
+            ],
+            "filters": ["Red"],
+            "max_images": 1,
+        }
+        response = client.post(
+            "/items/analyze", json=payload, headers={"Accept": "text/event-stream"}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        json.loads(line.removeprefix("data: "))
+        for line in response.text.splitlines()
+        if line.startswith("data: ") and line != "data: {}"
+    ]
+    by_index = {e["index"]: e for e in events}
+    assert by_index[0]["filters"] == {"Red": True}
+    assert by_index[1]["error"] is not None
+    assert response.text.rstrip().endswith("event: done\ndata: {}")
+
+
+def test_filters_compile_and_analyze_by_id():
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    settings.api.key = None
+    response = client.post("/filters/compile", json={"filters": ["Red ", "Large", "red"]})
+    assert response.status_code == 200
+    compiled = response.json()
+    assert compiled["filters"] == ["Large", "Red"]
+    assert set(compiled["json_schema"]["properties"]) == {"large", "red"}
+    again = client.post("/filters/compile", json={"filters": ["large", "Red"]})
+    assert again.json()["filter_set_id"] == compiled["filter_set_id"]
+
+    app.dependency_overrides[get_analyzer] = DummyAnalyzer
+    try:
+        payload = {
+            "item": {"platform": "vinted", "url": "http://foo", "html": "<html></html>"},
+            "filter_set_id": compiled["filter_set_id"],
+            "max_images": 1,
+        }
+        response = client.post("/item/analyze", json=payload)
+        assert response.status_code == 200
+        assert response.json() == {"filters": {"Large": True, "Red": True}}
+
+        # Raw filters are answered under the descriptions the client sent
+        del payload["filter_set_id"]
+        payload["filters"] = ["Red ", "large", "red"]
+        response = client.post("/item/analyze", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+    assert response.json() == {"filters": {"Red ": True, "large": True, "red": True}}
+
+
+def test_filters_invalid_selection():
+    from backend.config import settings
+
+    settings.api.key = None
+    item = {"platform": "vinted", "url": "http://foo", "html": "<html></html>"}
+    response = client.post(
+        "/item/analyze",
+        json={"item": item, "filters": ["Red"], "filter_set_id": "abc", "max_images": 1},
+    )
+    assert response.status_code == 422
+    response = client.post(
+        "/item/analyze", json={"item": item, "filter_set_id": "unknown", "max_images": 1}
+    )
+    assert response.status_code == 404
+    response = client.post("/filters/compile", json={"filters": ["Red!", "red?"]})
+    assert response.status_code == 422
+
+
+def test_compressed_request_body():
+    import gzip
+    import zlib
+
+    import zstandard
+
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    settings.api.key = None
+    payload = json.dumps(
+        {
+            "item": {"platform": "vinted", "url": "http://foo", "html": "<html></html>"},
+            "filters": ["Red"],
+            "max_images": 1,
+        }
+    ).encode()
+    headers = {"Content-Type": "application/json"}
+    app.dependency_overrides[get_analyzer] = DummyAnalyzer
+    try:
+        for encoding, body in (
+            ("gzip", gzip.compress(payload)),
+            ("deflate", zlib.compress(payload)),
+            ("zstd", zstandard.ZstdCompressor().compress(payload)),
+        ):
+            response = client.post(
+                "/item/analyze", content=body, headers={**headers, "Content-Encoding": encoding}
+            )
+            assert response.status_code == 200
+            assert response.json() == {"filters": {"Red": True}}
+    finally:
+        app.dependency_overrides.clear()
+
+    # Rejections still carry CORS headers, so the extension can read them
+    response = client.post(
+        "/item/analyze",
+        content=payload,
+        headers={**headers, "Content-Encoding": "br", "Origin": "chrome-extension://test"},
+    )
+    assert response.status_code == 415
+    assert "access-control-allow-origin" in response.headers
+    response = client.post(
+        "/item/analyze", content=b"not gzip", headers={**headers, "Content-Encoding": "gzip"}
+    )
+    assert response.status_code == 400
+
+
+def test_compressed_request_body_size_limit():
+    import gzip
+
+    from backend.api.middleware import (
+        BodyTooLargeError,
+        UnsupportedEncodingError,
+        decompress,
+    )
+
+    bomb = gzip.compress(b"\0" * 1_000_000)
+    assert len(bomb) < 10_000
+    assert decompress(bomb, "gzip", 1_000_000) == b"\0" * 1_000_000
+    with pytest.raises(BodyTooLargeError):
+        decompress(bomb, "gzip", 999_999)
+    with pytest.raises(UnsupportedEncodingError):
+        decompress(bomb, "br", 1_000_000)
+
+
+def test_analysis_errors_hide_internals():
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    class FailingAnalyzer(DummyAnalyzer):
+        async def analyze_item(self, item, filters):
+            raise RuntimeError("secret internals")
+
+    settings.api.key = None
+    app.dependency_overrides[get_analyzer] = FailingAnalyzer
+    try:
+        payload = {
+            "item": {"platform": "vinted", "url": "http://foo", "html": "<html></html>"},
+            "filters": ["Unique filter for failure"],
+            "max_images": 1,
+        }
+        response = client.post("/item/analyze", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Error during analysis."}
+
+    status = client.get("/analyzer/status").json()
+    assert status["circuit"]["state"] == "closed"
+    assert "waiting" in status["scheduler"]
+
+
+def test_capture_middleware(tmp_path):
+    from fastapi import FastAPI
+
+    from backend.api.middleware import CaptureMiddleware, CaptureWriter
+    from backend.tests.benchmarks.replay import load_capture
+
+    inner = FastAPI()
+
+    @inner.post("/item/analyze")
+    async def analyze(payload: dict):
+        return {"filters": {}}
+
+    @inner.post("/other")
+    async def other(payload: dict):
+        return {}
+
+    writer = CaptureWriter(tmp_path / "capture.jsonl.gz")
+    inner.add_middleware(CaptureMiddleware, writer=writer, paths=("/item/analyze",))
+    writer.open()
+    with TestClient(inner) as capture_client:
+        headers = {"X-API-Key": "secret"}
+        capture_client.post("/item/analyze", json={"item": 1}, headers=headers)
+        capture_client.post("/other", json={"item": 2}, headers=headers)
+    writer.close()
+
+    [entry] = load_capture(tmp_path / "capture.jsonl.gz")
+    assert entry["path"] == "/item/analyze"
+    assert json.loads(entry["body"]) == {"item": 1}
+    assert entry["status"] == 200
+    assert "x-api-key" not in entry["headers"]
+    assert entry["headers"]["content-type"] == "application/json"
+
+
+def test_metrics_endpoint():
+    from backend.common.metrics import HTTP_REQUESTS, PARSE_DURATION
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    settings.api.key = None
+    parses = PARSE_DURATION.count(platform="vinted", outcome="success")
+    requests = HTTP_REQUESTS.value(method="POST", route="/item/analyze", status="200")
+    payload = {
+        "item": {"platform": "vinted", "url": "http://metrics", "html": "<html></html>"},
+        "filters": ["Red"],
+        "max_images": 1,
+    }
+    app.dependency_overrides[get_analyzer] = DummyAnalyzer
+    try:
+        assert client.post("/item/analyze", json=payload).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+    assert PARSE_DURATION.count(platform="vinted", outcome="success") == parses + 1
+    assert HTTP_REQUESTS.value(method="POST", route="/item/analyze", status="200") == requests + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    # Every series carries the worker process that rendered it
+    worker = f'worker="{os.getpid()}"'
+    assert "# TYPE filtergenie_parse_duration_seconds histogram" in lines
+    assert any(
+        line.startswith(f'filtergenie_parse_duration_seconds_bucket{{{worker},platform="vinted",')
+        and 'le="+Inf"' in line
+        for line in lines
+    )
+    assert f'filtergenie_queue_depth{{{worker},queue="parse"}} 0' in lines
+
+
+def test_metrics_render():
+    from backend.common.metrics import Counter, Gauge, Histogram, Registry
+
+    registry = Registry()
+    counter = Counter("hits_total", "Hits", labels=("cache",), registry=registry)
+    gauge = Gauge("depth", "Depth", registry=registry)
+    histogram = Histogram(
+        "duration_seconds", "Duration", labels=("outcome",), buckets=(0.1, 1), registry=registry
+    )
+    counter.inc(cache='a"b')
+    counter.inc(2, cache='a"b')
+    gauge.set_function(lambda: 7)
+    histogram.observe(0.05, outcome="success")
+    histogram.observe(0.5, outcome="success")
+    with pytest.raises(RuntimeError), histogram.time():
+        raise RuntimeError
+    with pytest.raises(ValueError):
+        counter.inc(cache="a", extra="b")
+
+    lines = registry.render().splitlines()
+    assert 'hits_total{cache="a\\"b"} 3' in lines
+    assert "depth 7" in lines
+    assert 'duration_seconds_bucket{outcome="success",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{outcome="success",le="1"} 2' in lines
+    assert 'duration_seconds_bucket{outcome="success",le="+Inf"} 2' in lines
+    assert 'duration_seconds_count{outcome="success"} 2' in lines
+    assert 'duration_seconds_count{outcome="error"} 1' in lines
+    lines = registry.render({"worker": "7"}).splitlines()
+    assert 'hits_total{worker="7",cache="a\\"b"} 3' in lines
+    assert 'depth{worker="7"} 7' in lines
+    assert 'duration_seconds_bucket{worker="7",outcome="success",le="1"} 2' in lines
+
+
+def test_item_analyze_server_timing():
+    import contextvars
+
+    from backend.common.cache import local_cache
+    from backend.common.timing import record_cache, start_timings, timed
+    from backend.config import settings
+    from backend.dependencies import get_analyzer
+
+    settings.api.key = None
+    local_cache.clear()
+    payload = {
+        "item": {"platform": "vinted", "url": "http://timed", "html": "<html></html>"},
+        "filters": ["Red"],
+        "max_images": 1,
+    }
+    app.dependency_overrides[get_analyzer] = DummyAnalyzer
+    try:
+        response = client.post("/item/analyze", json=payload)
+        detailed = client.post("/item/analyze", json={**payload, "include_timings": True})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.json() == {"filters": {"Red": True}}
+    entries = [e.split(";")[0] for e in response.headers["Server-Timing"].split(", ")]
+    assert entries == ["scrape_cache", "scrape", "analysis_cache", "total"]
+    assert "scrape_cache;dur=" in response.headers["Server-Timing"]
+    # The second request is answered from the in-process cache
+    timings = detailed.json()["timings"]
+    assert set(timings["stages"]) == {"scrape_cache", "analysis_cache"}
+    assert timings["cache"] == {"scrape_cache": "hit", "analysis_cache": "hit"}
+    assert timings["total"] >= timings["stages"]["scrape_cache"]
+
+    # Outside of a timed request, recording is a no-op
+    with timed("predict"):
+        record_cache("scrape_cache", "hit")
+
+    def time_stages():
+        timings = start_timings()
+        with timed("analysis_cache"):
+            record_cache("analysis_cache", "partial")
+        record_cache("scrape_cache", "hit")
+        return timings.server_timing()
+
+    header = contextvars.copy_context().run(time_stages)
+    assert header.startswith("analysis_cache;dur=")
+    assert ';desc="partial", scrape_cache;desc="hit", total;dur=' in header
+
+
+def test_sampled_profiling():
+    from fastapi import FastAPI
+
+    from backend.api.profiling import SamplingProfilerMiddleware, profile_store
+    from backend.config import ApiConfig, settings
+
+    settings.api.key = None
+    profile_store.clear()
+    profiled = FastAPI()
+
+    @profiled.get("/work")
+    async def work():
+        return {"total": sum(range(100_000))}
+
+    def call(config: ApiConfig) -> None:
+        profiled.user_middleware.clear()
+        profiled.middleware_stack = None
+        profiled.add_middleware(SamplingProfilerMiddleware, store=profile_store, config=config)
+        response = TestClient(profiled).get("/work")
+        assert response.json() == {"total": sum(range(100_000))}
+
+    call(ApiConfig(profile_sample_rate=0))
+    call(ApiConfig(profile_sample_rate=0, profile_slow_threshold=60))
+    assert client.get("/debug/profiles").json()["profiles"] == []
+    call(ApiConfig(profile_sample_rate=1, profile_interval=0.001))
+    call(ApiConfig(profile_sample_rate=0, profile_slow_threshold=1e-9))
+
+    profiles = client.get("/debug/profiles").json()["profiles"]
+    assert [(p["path"], p["status"], p["reason"]) for p in profiles] == [
+        ("/work", 200, "slow"),
+        ("/work", 200, "sampled"),
+    ]
+    profile_id = profiles[0]["id"]
+    response = client.get(f"/debug/profiles/{profile_id}")
+    assert response.headers["content-type"].startswith("text/html")
+    response = client.get(f"/debug/profiles/{profile_id}", params={"format": "speedscope"})
+    assert "shared" in response.json()
+    assert client.get(f"/debug/profiles/{profile_id}", params={"format": "pdf"}).status_code == 422
+    response = client.get("/debug/profiles/unknown")
+    assert response.status_code == 404
+    assert f"this is worker {os.getpid()}" in response.json()["detail"]
+
+
+def test_server_options_and_warm_up(monkeypatch, tmp_path):
+    import asyncio
+
+    import uvicorn
+
+    from backend import app as app_module
+    from backend import server
+    from backend.common.utils import cgroup_cpu_quota
+    from backend.config import ServerConfig
+    from backend.server import uvicorn_options
+
+    options = uvicorn_options(ServerConfig(max_workers=4), cpu_count=16)
+    assert options["workers"] == 4
+    assert options["limit_max_requests"] == 10_000
+    # A single worker has no supervisor to replace it, so it is never recycled
+    options = uvicorn_options(ServerConfig(), cpu_count=1)
+    assert options["workers"] == 1
+    assert "limit_max_requests" not in options
+    assert uvicorn_options(ServerConfig(workers=3), cpu_count=1)["workers"] == 3
+
+    # The default worker count follows the cgroup CPU quota, rounded up
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert cgroup_cpu_quota(tmp_path) == 1.5
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cgroup_cpu_quota(tmp_path) is None
+    monkeypatch.setattr(server, "available_cpus", lambda: 2)
+    assert uvicorn_options(ServerConfig(max_workers=4))["workers"] == 2
+    # Every option is understood by the installed uvicorn
+    options = uvicorn_options(ServerConfig(max_workers=4), cpu_count=16)
+    assert uvicorn.Config(app_module.app, **options).limit_max_requests_jitter == 1000
+
+    # The model provider's rate limits are split among the workers
+    started = {}
+    for name in ("GROQ_RATE_SHARE", "SCRAPER_WORKERS"):
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+    monkeypatch.setattr(server.uvicorn, "run", lambda app, **options: started.update(options))
+    assert server.main(["--workers", "4"]) == 0
+    assert started["workers"] == 4
+    assert os.environ["GROQ_RATE_SHARE"] == "0.25"
+
+    monkeypatch.setattr(app_module.settings, "cache_enabled", False)
+    durations = asyncio.run(app_module.warm_up())
+    assert list(durations) == ["analyzer", "schema", "parse"]
+    assert all(d is not None for d in durations.values())
@@ -0,0 +1,148 @@
+import json
+
+from backend.tests.benchmarks import suite  # noqa: F401
+from backend.tests.benchmarks.runner import BENCHMARKS, compare, main, run
+
+
+def test_benchmarks_run():
+    results = run(min_time=0, rounds=2)
+    assert set(results["benchmarks"]) == set(BENCHMARKS)
+    for result in results["benchmarks"].values():
+        assert result["loops"] == 1
+        assert 0 < result["min"] <= result["median"]
+
+
+def test_benchmarks_compare(tmp_path):
+    baseline = {"benchmarks": {"a": {"median": 1.0}, "b": {"median": 1.0}}}
+    current = {"benchmarks": {"a": {"median": 1.1}, "b": {"median": 1.5}, "c": {"median": 9.0}}}
+    regressions = compare(baseline, current, threshold=0.2)
+    assert [r["name"] for r in regressions] == ["b"]
+
+    baseline_path = tmp_path / "baseline.json"
+    output_path = tmp_path / "results.json"
+    fast = {"benchmarks": {"make_cache_key[analysis]": {"median": 1e-12}}}
+    baseline_path.write_text(json.dumps(fast))
+    args = ["make_cache_key", "--min-time=0", "--rounds=2", f"--output={output_path}"]
+    assert main(args) == 0
+    assert main([*args, f"--compare={baseline_path}"]) == 1
+    assert list(json.loads(output_path.read_text())["benchmarks"]) == ["make_cache_key[analysis]"]
+
+
+def test_replay_helpers():
+    from backend.tests.benchmarks.replay import (
+        Outcome,
+        cache_hit_ratios,
+        cache_requests,
+        metrics_worker,
+        prepare_body,
+        summarize,
+    )
+
+    body = json.dumps(
+        {
+            "item": {"url": "http://foo", "html": "<img src='https://cdn.shop/a/1.jpg'>"},
+            "filters": ["Red"],
+        }
+    )
+    item = json.loads(prepare_body(body, "http://fake", "run"))["item"]
+    assert item == {
+        "url": "http://foo#run",
+        "html": "<img src='http://fake/images/cdn.shop/a/1.jpg'>",
+    }
+
+    report = summarize([Outcome(200, 0.1), Outcome(200, 0.3), Outcome(503, 0.2)], duration=1.5)
+    assert report["throughput"] == 2.0
+    assert report["statuses"] == {"200": 2, "503": 1}
+    assert report["error_rate"] == 1 / 3
+    assert report["latency"]["p50"] == 0.2
+    assert report["latency"]["max"] == 0.3
+
+    before = {
+        "images": {"local_hits": 0, "redis_hits": 0, "content_hits": 0, "misses": 2},
+        "filter_sets": {"hits": 1, "misses": 1},
+    }
+    after = {
+        "images": {"local_hits": 3, "redis_hits": 1, "content_hits": 0, "misses": 6},
+        "filter_sets": {"hits": 2, "misses": 1},
+    }
+    metrics = (
+        "# TYPE filtergenie_cache_requests_total counter\n"
+        'filtergenie_cache_requests_total{cache="scraped",result="hit"} 2\n'
+        'filtergenie_cache_requests_total{cache="analysis",result="miss"} 4\n'
+    )
+    requests_before = cache_requests(metrics)
+    assert requests_before == {("scraped", "hit"): 2.0, ("analysis", "miss"): 4.0}
+    requests_after = cache_requests(
+        metrics
+        + 'filtergenie_cache_requests_total{cache="scraped",result="miss"} 1\n'
+        + 'filtergenie_cache_requests_total{cache="analysis",result="hit"} 3\n'
+        + 'filtergenie_cache_requests_total{cache="analysis",result="stale"} 1\n'
+    )
+    requests_after[("scraped", "hit")] = 5.0
+    requests_after[("analysis", "miss")] = 8.0
+    assert cache_hit_ratios(before, after, requests_before, requests_after) == {
+        "scraped": 0.75,
+        "analysis": 0.5,
+        "images": 0.5,
+        "filter_sets": 1.0,
+    }
+
+    # Series rendered by a worker process carry its pid
+    labelled = 'filtergenie_cache_requests_total{worker="42",cache="scraped",result="hit"} 2\n'
+    assert cache_requests(labelled) == {("scraped", "hit"): 2.0}
+    assert metrics_worker(labelled) == "42"
+    assert metrics_worker(metrics) is None
+
+
+def test_replay_closed_loop():
+    import asyncio
+
+    import httpx
+    from fastapi import FastAPI
+
+    from backend.tests.benchmarks.replay import Replayer
+
+    target = FastAPI()
+
+    @target.post("/item/analyze")
+    async def analyze(payload: dict):
+        return {"filters": {}}
+
+    request = {
+        "method": "POST",
+        "path": "/item/analyze",
+        "headers": {"content-type": "application/json"},
+        "body": "{}",
+    }
+    transport = httpx.ASGITransport(app=target)
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            replayer = Replayer(client, [request] * 10)
+            await replayer.closed_loop(concurrency=3)
+        return replayer
+
+    replayer = asyncio.run(run())
+    assert [o.status for o in replayer.outcomes] == [200] * 10
+
+
+def test_startup_report(tmp_path):
+    from backend.tests.benchmarks.startup import main, parse_importtime, report
+
+    records = parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     groq._types\n"
+        "import time:       300 |        420 |   groq\n"
+        "import time:       500 |        920 | backend.app\n"
+        "import time:        80 |         80 | json\n"
+    )
+    assert [r["depth"] for r in records] == [2, 1, 0, 0]
+    summary = report(records, top=1)
+    assert summary["total_ms"] == 1.0
+    assert summary["slowest_packages"] == {"backend": 0.5}
+    assert summary["deferred_loaded"] == ["groq"]
+
+    # Importing the app loads none of the deferred modules
+    output_path = tmp_path / "startup.json"
+    assert main(["--runs=1", "--budget=60000", f"--output={output_path}"]) == 0
+    assert json.loads(output_path.read_text())["deferred_loaded"] == []
@@ -0,0 +1,561 @@
+import asyncio
+import fnmatch
+import io
+import json
+import time
+
+import pytest
+from fastapi import BackgroundTasks
+from PIL import Image
+
+from backend.analyzer.images import ImageFetcher
+from backend.analyzer.models import FilterModel, ItemModel
+from backend.api import services
+from backend.common import singleflight
+from backend.common.cache import CacheEntry, make_cache_key
+from backend.common.lru import LRUCache
+
+
+def _png_bytes(color: tuple[int, int, int]) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_lru_cache_evicts_by_size():
+    cache = LRUCache(max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    assert cache.get("a") == "12345"
+    cache.set("c", "123")
+    assert "b" not in cache
+    assert cache.get("a") == "12345"
+    assert cache.get("c") == "123"
+    assert cache.get("b") is None
+    cache.set("too-big", "x" * 11)
+    assert "too-big" not in cache
+    stats = cache.stats()
+    assert stats["bytes"] == 8
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_image_fetcher_caches_by_url_and_content(monkeypatch):
+    fetcher = ImageFetcher()
+    downloads: list[str] = []
+    red = _png_bytes((255, 0, 0))
+
+    async def fake_fetch(url: str) -> bytes:
+        downloads.append(url)
+        return red
+
+    monkeypatch.setattr(fetcher, "fetch", fake_fetch)
+
+    async def run():
+        first = await fetcher.fetch_base64("http://cdn/a.png")
+        again = await fetcher.fetch_base64("http://cdn/a.png")
+        mirror = await fetcher.fetch_base64("http://mirror/a.png")
+        return first, again, mirror
+
+    first, again, mirror = asyncio.run(run())
+    assert first.startswith("data:image/jpeg;base64,")
+    assert first == again == mirror
+    assert downloads == ["http://cdn/a.png", "http://mirror/a.png"]
+    stats = fetcher.cache.stats()
+    assert stats["local_hits"] == 1
+    assert stats["content_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_analysis_cache_key_is_per_canonical_filter():
+    def key(desc: str, model: str = "m") -> str:
+        return make_cache_key("analysis", "vinted", "http://foo", 2, FilterModel(desc=desc), model)
+
+    assert key("Red  color") == key(" red color")
+    assert key("Red color") != key("Blue color")
+    assert key("Red color") != key("Red color", model="other")
+    assert key("Red color").startswith("analysis:vinted:http://foo:")
+
+
+def test_get_or_analyze_filters_only_analyzes_missing(monkeypatch):
+    class RecordingAnalyzer:
+        class config:
+            model_name = "test-model"
+
+        def __init__(self):
+            self.analyzed: list[str] = []
+
+        async def analyze_item(self, item, filters):
+            self.analyzed.extend(f.desc for f in filters)
+            for f in filters:
+                f.value = True
+            return filters
+
+    async def fake_get_analysis_cache(platform, url, max_images, model, filters):
+        assert model == "test-model"
+        fresh_until = time.time() + 60
+        return {"Red": CacheEntry(False, fresh_until), "Large": CacheEntry(True, fresh_until)}
+
+    written: list[list[str]] = []
+
+    async def fake_set_analysis_cache(platform, url, max_images, model, filters):
+        written.append([f.desc for f in filters])
+
+    monkeypatch.setattr(services.settings, "cache_enabled", True)
+    monkeypatch.setattr(services, "get_analysis_cache", fake_get_analysis_cache)
+    monkeypatch.setattr(services, "set_analysis_cache", fake_set_analysis_cache)
+
+    analyzer = RecordingAnalyzer()
+    item = ItemModel(platform="vinted", title="Item", url="http://foo")
+    filters = [FilterModel(desc=desc) for desc in ["Large", "New", "Red"]]
+
+    result = asyncio.run(
+        services.get_or_analyze_filters(analyzer=analyzer, item=item, filters=filters, max_images=1)
+    )
+    assert {f.desc: f.value for f in result} == {"Large": True, "New": True, "Red": False}
+    assert analyzer.analyzed == ["New"]
+    assert written == [["New"]]
+
+
+def test_stale_analysis_is_served_and_refreshed_once(monkeypatch):
+    class RecordingAnalyzer:
+        class config:
+            model_name = "test-model"
+
+        def __init__(self):
+            self.analyzed: list[str] = []
+
+        async def analyze_item(self, item, filters):
+            self.analyzed.extend(f.desc for f in filters)
+            for f in filters:
+                f.value = True
+            return filters
+
+    async def fake_get_analysis_cache(platform, url, max_images, model, filters):
+        now = time.time()
+        return {"Red": CacheEntry(False, now - 1), "Large": CacheEntry(True, now + 60)}
+
+    written: list[dict[str, bool]] = []
+
+    async def fake_set_analysis_cache(platform, url, max_images, model, filters):
+        written.append({f.desc: f.value for f in filters})
+
+    async def no_redis_lock(*args):
+        return None
+
+    monkeypatch.setattr(services.settings, "cache_enabled", True)
+    monkeypatch.setattr(services, "get_analysis_cache", fake_get_analysis_cache)
+    monkeypatch.setattr(services, "set_analysis_cache", fake_set_analysis_cache)
+    monkeypatch.setattr(singleflight, "acquire_lock", no_redis_lock)
+
+    analyzer = RecordingAnalyzer()
+    item = ItemModel(platform="vinted", title="Item", url="http://foo")
+
+    async def run():
+        results = await asyncio.gather(
+            *(
+                services.get_or_analyze_filters(
+                    analyzer=analyzer,
+                    item=item,
+                    filters=[FilterModel(desc=desc) for desc in ["Large", "Red"]],
+                    max_images=1,
+                )
+                for _ in range(3)
+            )
+        )
+        served = [{f.desc: f.value for f in result} for result in results]
+        await asyncio.gather(*services.analysis_flight._refreshing.values())
+        return served
+
+    served = asyncio.run(run())
+    assert served == [{"Large": True, "Red": False}] * 3
+    assert analyzer.analyzed == ["Red"]
+    assert written == [{"Red": True}]
+
+
+def test_stale_scraped_item_is_parsed_again(monkeypatch):
+    now = time.time()
+    entries = {
+        "http://fresh": CacheEntry(
+            {"platform": "vinted", "title": "Cached", "url": "http://fresh"}, now + 60
+        ),
+        "http://stale": CacheEntry(
+            {"platform": "vinted", "title": "Cached", "url": "http://stale"}, now - 1
+        ),
+    }
+
+    async def fake_get_scraped_cache(platform, url, max_images):
+        return entries[url]
+
+    async def fake_scrape_item_async(platform, url, html):
+        return ItemModel(platform=platform, title="Parsed", url=url)
+
+    monkeypatch.setattr(services.settings, "cache_enabled", True)
+    monkeypatch.setattr(services, "get_scraped_cache", fake_get_scraped_cache)
+    monkeypatch.setattr(services, "scrape_item_async", fake_scrape_item_async)
+
+    def scrape(url):
+        tasks = BackgroundTasks()
+        item = asyncio.run(
+            services.get_or_scrape_item("vinted", url, "<html></html>", 1, background_tasks=tasks)
+        )
+        return item.title, len(tasks.tasks)
+
+    assert scrape("http://fresh") == ("Cached", 0)
+    assert scrape("http://stale") == ("Parsed", 1)
+
+
+def test_ttl_policy_per_platform():
+    from backend.config import CacheConfig, TtlPolicy
+
+    config = CacheConfig(
+        scraped_ttl=TtlPolicy(fresh=60, stale=600),
+        platform_ttls={"vinted": {"analysis": TtlPolicy(fresh=10)}},
+    )
+    assert config.ttl_policy("scraped", "vinted").hard == 660
+    assert config.ttl_policy("analysis", "vinted") == TtlPolicy(fresh=10, stale=0)
+    assert config.ttl_policy("analysis", "leboncoin") == config.analysis_ttl
+
+
+def test_single_flight_coalesces_in_process_callers():
+    flight = singleflight.SingleFlight("test", lock_ttl=1, wait_timeout=1, poll_interval=0.01)
+    calls = 0
+
+    async def compute() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def lookup() -> int | None:
+        return None
+
+    async def run():
+        return await asyncio.gather(*(flight.run("key", compute, lookup) for _ in range(5)))
+
+    assert asyncio.run(run()) == [42] * 5
+    assert calls == 1
+
+
+def test_single_flight_survives_leader_cancellation():
+    flight = singleflight.SingleFlight("test", lock_ttl=1, wait_timeout=1, poll_interval=0.01)
+
+    async def compute() -> int:
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def lookup() -> int | None:
+        return None
+
+    async def run():
+        leader = asyncio.create_task(flight.run("key", compute, lookup))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.run("key", compute, lookup)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(leader, *followers, return_exceptions=True)
+        return results, flight._inflight
+
+    results, inflight = asyncio.run(run())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == [42, 42]
+    assert inflight == {}
+
+
+def test_single_flight_follower_waits_for_leader_result(monkeypatch):
+    flight = singleflight.SingleFlight("test", lock_ttl=1, wait_timeout=1, poll_interval=0.01)
+    lookups = 0
+
+    async def lock_held_elsewhere(name, token, ttl):
+        return False
+
+    async def compute() -> int:
+        raise AssertionError("follower must not compute")
+
+    async def lookup() -> int | None:
+        nonlocal lookups
+        lookups += 1
+        return 7 if lookups >= 3 else None
+
+    monkeypatch.setattr(singleflight, "acquire_lock", lock_held_elsewhere)
+    assert asyncio.run(flight.run("key", compute, lookup)) == 7
+    assert lookups == 3
+
+
+class FakeRedis:
+    """Just enough of a pipelined Redis client to count round-trips."""
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.round_trips = 0
+        self.published: list[dict] = []
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def scan_iter(self, match: str, count: int):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def publish(self, channel: str, message: str) -> None:
+        self.published.append(json.loads(message))
+
+    async def unlink(self, *keys: str) -> int:
+        self.round_trips += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands: list[tuple] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+        self.commands.append(("set", key, value))
+
+    def mget(self, keys: list[str]) -> None:
+        self.commands.append(("mget", keys))
+
+    def publish(self, channel: str, message: str) -> None:
+        self.commands.append(("publish", message))
+
+    async def execute(self) -> list:
+        self.redis.round_trips += 1
+        results = []
+        for command, *args in self.commands:
+            if command == "set":
+                self.redis.data[args[0]] = args[1]
+                results.append(True)
+            elif command == "publish":
+                self.redis.published.append(json.loads(args[0]))
+                results.append(0)
+            else:
+                results.append([self.redis.data.get(key) for key in args[0]])
+        return results
+
+
+def test_cache_commands_are_pipelined(monkeypatch):
+    from backend.common import cache
+
+    redis = FakeRedis()
+    batcher = cache.CommandBatcher(redis)
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache, "get_batcher", lambda: batcher)
+    monkeypatch.setattr(cache, "local_cache", None)
+    monkeypatch.setattr(cache.settings.cache, "invalidation_channel", "invalidations")
+    filters = [FilterModel(desc=desc, value=True) for desc in ["Red", "Large"]]
+
+    async def run():
+        await asyncio.gather(
+            *(
+                cache.set_analysis_cache("vinted", f"http://foo/{i}", 1, "m", filters)
+                for i in range(10)
+            ),
+            cache.set_scraped_cache("vinted", "http://foo/0", 1, {"title": "Item"}),
+        )
+        writes = redis.round_trips
+        results = await asyncio.gather(
+            *(
+                cache.get_analysis_cache("vinted", f"http://foo/{i}", 1, "m", filters)
+                for i in range(10)
+            ),
+            cache.get_scraped_cache("vinted", "http://foo/0", 1),
+            cache.get_scraped_cache("vinted", "http://foo/1", 1),
+        )
+        return writes, results
+
+    writes, results = asyncio.run(run())
+    # Invalidations are published in the same round-trip as the writes
+    assert writes == 1
+    assert len(redis.published) == 11
+    assert redis.round_trips == 2
+    assert [{d: e.value for d, e in r.items()} for r in results[:10]] == [
+        {"Red": True, "Large": True}
+    ] * 10
+    assert results[10].value == {"title": "Item"}
+    assert not results[10].is_stale
+    assert results[11] is None
+
+
+def test_codec_round_trip_and_versioning():
+    from backend.common import codec as codec_module
+    from backend.common.codec import Codec
+
+    codec = Codec(compression="zlib", compress_threshold=64)
+    large = {"title": "Item", "description": "Soft wool " * 100}
+    for value in ["text", {"title": "Item", "price": 12.5}, True, [1, 2], large]:
+        assert codec.decode(codec.encode(value)) == value
+
+    assert codec.encode("text") == bytes([codec_module.VERSION << 4]) + b"text"
+    encoded = codec.encode(large)
+    assert encoded[0] & 0b11 == codec_module.ZLIB
+    assert len(encoded) < len(json.dumps(large))
+
+    # Values written with another configuration still decode
+    assert Codec(compression="none").decode(encoded) == large
+    # Unknown versions, legacy plain JSON and corrupt values read as misses
+    assert codec.decode_or_none(bytes([0xF0]) + b"text") is None
+    assert codec.decode_or_none(b'{"title": "Item"}') is None
+    assert codec.decode_or_none(encoded[:20]) is None
+    assert codec.decode_or_none(None) is None
+
+
+def test_scoped_cache_clear(monkeypatch):
+    from backend.common import cache
+
+    redis = FakeRedis()
+    red, large = FilterModel(desc="Red"), FilterModel(desc="Large")
+    for platform in ["vinted", "leboncoin"]:
+        for url in ["http://shop/a", "http://other/b"]:
+            redis.data[make_cache_key("scraped", platform, url, 1)] = b""
+            for f in [red, large]:
+                redis.data[make_cache_key("analysis", platform, url, 1, f, "m")] = b""
+    redis.data["image:url:http://cdn/a.png"] = b""
+    redis.data["unrelated"] = b""
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache, "get_redis_client", lambda: redis)
+
+    def clear(*args, **kwargs) -> int:
+        patterns = cache.invalidation_patterns(*args, **kwargs)
+        return asyncio.run(cache.clear_cache(patterns, batch_size=2))
+
+    assert clear(["analysis"], platform="vinted", filters=[red]) == 2
+    assert clear(["scraped", "analysis"], url_prefix="http://shop/") == 5
+    assert clear(["scraped"]) == 2
+    assert redis.round_trips == 5
+    assert clear() == 4
+    assert list(redis.data) == ["unrelated"]
+
+    assert cache.escape_glob("http://foo/?q=[a]*") == r"http://foo/\?q=\[a\]\*"
+    with pytest.raises(ValueError):
+        cache.invalidation_patterns(["image"], platform="vinted")
+
+
+def test_local_cache_tier(monkeypatch):
+    from backend.common import cache
+
+    monkeypatch.setattr(cache, "local_cache", LRUCache(max_entries=100))
+    monkeypatch.setattr(cache.settings, "cache_enabled", False)
+    filters = [FilterModel(desc="Red", value=True)]
+
+    async def write_and_read():
+        await cache.set_scraped_cache("vinted", "http://foo", 1, {"title": "Item"})
+        await cache.set_analysis_cache("vinted", "http://foo", 1, "m", filters)
+        return (
+            await cache.get_scraped_cache("vinted", "http://foo", 1),
+            await cache.get_analysis_cache("vinted", "http://foo", 1, "m", filters),
+        )
+
+    # Without Redis, the in-process tier still caches
+    scraped, analysis = asyncio.run(write_and_read())
+    assert scraped.value == {"title": "Item"}
+    assert analysis["Red"].value is True
+
+    # With Redis, writes go to both tiers and reads are answered in process
+    redis = FakeRedis()
+    monkeypatch.setattr(cache, "local_cache", LRUCache(max_entries=100))
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache, "get_batcher", lambda: cache.CommandBatcher(redis))
+    monkeypatch.setattr(cache, "get_redis_client", lambda: redis)
+    scraped, analysis = asyncio.run(write_and_read())
+    assert scraped.value == {"title": "Item"}
+    assert redis.round_trips == 2
+    scraped_key = make_cache_key("scraped", "vinted", "http://foo", 1)
+    assert redis.published[0]["keys"] == [scraped_key]
+
+    # Other workers' writes evict the entry, which is then read back from Redis
+    listener = cache.InvalidationListener("invalidations")
+    assert listener.handle(json.dumps(redis.published[0])) == 0
+    assert listener.handle(json.dumps({"origin": "other", "keys": [scraped_key]})) == 1
+    assert scraped_key not in cache.local_cache
+    assert asyncio.run(cache.get_scraped_cache("vinted", "http://foo", 1)).value == {
+        "title": "Item"
+    }
+    assert redis.round_trips == 3
+    patterns = cache.invalidation_patterns(["analysis"], url_prefix="http://foo")
+    assert listener.handle(json.dumps({"origin": "other", "patterns": patterns})) == 1
+    assert list(cache.local_cache.keys()) == [scraped_key]
+
+
+def test_invalidation_listener_polls_quiet_channel(monkeypatch):
+    from backend.common import cache
+
+    messages = [None, None, {"type": "message", "data": json.dumps({"origin": "other"})}]
+
+    class FakePubSub:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        async def subscribe(self, channel):
+            pass
+
+        async def get_message(self, ignore_subscribe_messages, timeout):
+            assert timeout is not None
+            if not messages:
+                await asyncio.sleep(3600)
+            return messages.pop(0)
+
+    class PubSubRedis:
+        def pubsub(self, ignore_subscribe_messages):
+            return FakePubSub()
+
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache.redis_probe, "available", True)
+    monkeypatch.setattr(cache, "get_redis_client", lambda: PubSubRedis())
+    listener = cache.InvalidationListener("invalidations", poll_interval=0.01)
+
+    async def run():
+        task = asyncio.create_task(listener._listen())
+        while messages:
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    assert listener.received == 1
+
+
+def test_lru_cache_expires_entries():
+    lru = LRUCache(max_entries=10, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2, ttl=0)
+    assert lru.get("a") == 1
+    assert lru.get("b") is None
+    assert lru.stats()["expirations"] == 1
+
+
+def test_redis_probe(monkeypatch):
+    from backend.common import cache
+
+    class FlakyRedis:
+        up = False
+
+        async def ping(self):
+            if not self.up:
+                raise ConnectionError("Connection refused")
+            return True
+
+    redis = FlakyRedis()
+    probe = cache.RedisProbe(interval=60)
+    monkeypatch.setattr(cache, "redis_probe", probe)
+    monkeypatch.setattr(cache, "get_redis_client", lambda: redis)
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+
+    # Assumed reachable until checked
+    assert cache.redis_available()
+    assert asyncio.run(probe.check()) is False
+    assert not cache.redis_available()
+    assert asyncio.run(cache.acquire_lock("name", "token", 1.0)) is None
+    redis.up = True
+    assert asyncio.run(probe.check()) is True
+    assert cache.redis_available()
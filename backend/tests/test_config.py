@@ -29,3 +29,19 @@ def test_secure_api_key(monkeypatch):
     settings = Settings()
     assert settings.api.key is None
     assert settings.api.is_secure is False
+
+
+def test_provider_config_follows_backend(monkeypatch):
+    monkeypatch.setenv("GROQ_MODEL_NAME", "groq-model")
+    monkeypatch.setenv("OPENAI_MODEL_NAME", "openai-model")
+    monkeypatch.setenv("OPENAI_TOKENS_PER_MINUTE", "200000")
+    assert Settings().provider.model_name == "groq-model"
+
+    monkeypatch.setenv("INFERENCE_BACKEND", "openai")
+    settings = Settings()
+    assert settings.provider.model_name == "openai-model"
+    assert settings.provider.tokens_per_minute == 200_000
+    assert settings.groq.tokens_per_minute == 30_000
+
+    monkeypatch.setenv("INFERENCE_BACKEND", "fake")
+    assert Settings().provider.model_name == "fake-model"
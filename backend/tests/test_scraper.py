@@ -53,6 +53,30 @@ def test_scraper_extract_methods(scraper, html, expected_title, expected_images,
         assert scraper.extract_description(soup) == expected_desc
 
 
+@pytest.mark.parametrize("parser", ["html.parser", "lxml", "selectolax"])
+def test_parser_backends_agree(parser):
+    import importlib.util
+
+    from backend.scraper.selectors import extract_field, get_backend
+
+    if parser != "html.parser" and importlib.util.find_spec(parser) is None:
+        pytest.skip(f"{parser} is not installed")
+    backend = get_backend(parser)
+    html = (
+        '<h1 class="text-headline-1-expanded" data-qa-id="adview_title"> LBC Title </h1>'
+        '<div class="slick-list">'
+        '  <div class="slick-slide"><picture><img src=" lbc1.jpg"></picture></div>'
+        '  <div class="slick-slide slick-active"><picture><img src="lbc1.jpg"></picture></div>'
+        '  <div class="slick-slide"><picture><img src="lbc2.jpg"></picture></div>'
+        "</div>"
+    )
+    root = backend.parse(html)
+    fields = LeboncoinScraper.fields
+    assert extract_field(backend, root, fields["title"]) == "LBC Title"
+    assert extract_field(backend, root, fields["images"]) == ["lbc1.jpg", "lbc2.jpg"]
+    assert extract_field(backend, root, fields["description"]) == ""
+
+
 def test_scrape_item_vinted():
     html = (
         '<span class="web_ui__Text__title">Vinted Title</span>'
@@ -106,3 +130,96 @@ def test_scrape_item_ebay():
     assert len(item.images) == 2
     assert item.images[0].url == "ebay1.jpg"
     assert item.images[1].url == "ebay2.jpg"
+
+
+def test_prune_html():
+    from backend.scraper.base import prune_html
+
+    html = (
+        "<p>kept</p><SCRIPT type=x>if (a<b) {}</script ><style>p {}</style>"
+        "<!-- a\ncomment --><svg><path/></svg><img src='a.jpg'>"
+    )
+    assert prune_html(html) == "<p>kept</p><img src='a.jpg'>"
+
+
+def test_prune_pattern_matches_the_lazy_pattern():
+    import random
+    import re
+
+    from backend.scraper.base import _PRUNE_PATTERN
+
+    lazy = re.compile(
+        r"<(script|style|svg)\b[^>]*>.*?</\1\s*>|<!--.*?-->", flags=re.IGNORECASE | re.DOTALL
+    )
+    fragments = (
+        "<script>|<script type='x'>|</script>|</script >|<SCRIPT>|</Script>|<style>|</style>|"
+        "<svg>|</svg>|<scripts>|</scripts>|<!--|-->|--|-|>|<|</|a|\n| |<p>|</p>|<!---->|--->"
+    ).split("|")
+    rng = random.Random(0)
+    for _ in range(5000):
+        html = "".join(rng.choice(fragments) for _ in range(rng.randint(1, 12)))
+        assert [m.group(0) for m in _PRUNE_PATTERN.finditer(html)] == [
+            m.group(0) for m in lazy.finditer(html)
+        ], html
+
+
+def _slow_parse(delay: float) -> dict:
+    import time
+
+    time.sleep(delay)
+    return {}
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_parse_executor_modes(mode):
+    import asyncio
+
+    from backend.config import ScraperConfig
+    from backend.scraper import parse_html
+    from backend.scraper.executor import ParseExecutor
+
+    html = (
+        '<span class="web_ui__Text__title">Vinted Title</span>'
+        '<div class="item-photos"><img src="img1.jpg"></div>'
+    )
+    executor = ParseExecutor(ScraperConfig(mode=mode, workers=1))
+    try:
+        data = asyncio.run(executor.run(parse_html, "vinted", html))
+    finally:
+        executor.shutdown()
+    assert data["title"] == "Vinted Title"
+    assert data["images"] == [{"url": "img1.jpg"}]
+
+
+def test_parse_executor_backpressure_and_timeout():
+    import asyncio
+
+    from backend.config import ScraperConfig
+    from backend.scraper.executor import (
+        ParseExecutor,
+        ScraperBusyError,
+        ScraperTimeoutError,
+    )
+
+    executor = ParseExecutor(ScraperConfig(mode="thread", workers=2, max_pending=1, timeout=0.1))
+
+    async def run():
+        first = asyncio.create_task(executor.run(_slow_parse, 0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(ScraperBusyError):
+            await executor.run(_slow_parse, 0)
+        await first
+        with pytest.raises(ScraperTimeoutError):
+            await executor.run(_slow_parse, 0.3)
+        # The timed-out parse still occupies a worker until it finishes
+        assert executor.pending == 1
+        with pytest.raises(ScraperBusyError):
+            await executor.run(_slow_parse, 0)
+        await asyncio.sleep(0.4)
+        assert executor.pending == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert executor.pending == 0
@@ -470,9 +470,11 @@ document.addEventListener("DOMContentLoaded", () => {
               "text-xs text-yellow-400 mt-1 min-h-[1.2em] text-center";
           } else {
             ui.apiClearCacheStatus.textContent =
-              typeof data.entries_cleared === "number"
-                ? `Cleared (${data.entries_cleared})`
-                : "Cleared";
+              data.status === "accepted"
+                ? "Clearing started"
+                : typeof data.entries_cleared === "number"
+                  ? `Cleared (${data.entries_cleared})`
+                  : "Cleared";
             ui.apiClearCacheStatus.className =
               "text-xs text-green-400 mt-1 min-h-[1.2em] text-center";
           }
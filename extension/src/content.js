@@ -47,46 +47,131 @@ async function analyzeItems(
   const sortedFilters = [...filters].sort();
   chrome.runtime.sendMessage({ type: "API_STATUS", state: "filtering" });
   const itemSources = await Promise.all(items.map(fetchItemSource));
-  const results = await Promise.all(
-    itemSources.map((itemSource) =>
-      callApiAnalyzeSingle(
-        itemSource,
-        sortedFilters,
-        apiEndpoint,
-        apiKey,
-        maxImagesPerItem,
-      ),
-    ),
+  const results = new Array(items.length).fill(null);
+  const errors = new Array(items.length).fill(null);
+  let error = null;
+  await Promise.all(
+    splitBatches(itemSources).map(async ({ offset, sources }) => {
+      try {
+        await callApiAnalyzeBatch(
+          sources,
+          sortedFilters,
+          apiEndpoint,
+          apiKey,
+          maxImagesPerItem,
+          (result) => {
+            const idx = offset + result.index;
+            results[idx] = result;
+            removeItemSpinner([items[idx]]);
+            if (result.error) {
+              errors[idx] = result.error;
+              showItemError(items[idx], result.error);
+            } else {
+              updateItemStatus([items[idx]], [result.filters], minMatch);
+            }
+          },
+        );
+      } catch (e) {
+        error ??= e.message || String(e);
+        sources.forEach((_, i) => {
+          errors[offset + i] ??= e.message || String(e);
+        });
+      }
+    }),
   );
-  results.forEach((data, idx) => {
-    removeItemSpinner([items[idx]]);
-    updateItemStatus([items[idx]], [data.filters], minMatch);
+  items.forEach((item, idx) => {
+    if (results[idx]) return;
+    errors[idx] ??= "No result received";
+    removeItemSpinner([item]);
+    showItemError(item, errors[idx]);
   });
+  const failed = errors.filter(Boolean).length;
+  if (!error && failed) {
+    error = `${failed} of ${items.length} items could not be analyzed`;
+  }
   chrome.runtime.sendMessage({ type: "API_STATUS", state: "done" });
-  chrome.runtime.sendMessage({ type: "FILTERS_APPLIED", success: true });
-  sendResponse?.({ apiResponse: { filters: results.map((r) => r.filters) } });
+  chrome.runtime.sendMessage(
+    error
+      ? { type: "FILTERS_APPLIED", success: false, error }
+      : { type: "FILTERS_APPLIED", success: true },
+  );
+  sendResponse?.({
+    apiResponse: {
+      filters: results.map((r) => r?.filters ?? null),
+      errors,
+    },
+  });
 }
 
-const callApiAnalyzeSingle = async (
-  itemSource,
+// Decoded size of the items sent in one batch request, well below the API's
+// request body limit (API_MAX_BODY_SIZE, 16 MB by default): item pages can
+// weigh a few megabytes each, so large pages are spread over several requests
+const MAX_BATCH_BYTES = 8 * 1024 * 1024;
+
+const splitBatches = (itemSources) => {
+  const batches = [];
+  let current = null;
+  itemSources.forEach((source, idx) => {
+    const size = new Blob([JSON.stringify(source)]).size;
+    if (!current || current.size + size > MAX_BATCH_BYTES) {
+      current = { offset: idx, sources: [], size: 0 };
+      batches.push(current);
+    }
+    current.sources.push(source);
+    current.size += size;
+  });
+  return batches;
+};
+
+const gzipJson = (data) =>
+  new Response(
+    new Blob([JSON.stringify(data)])
+      .stream()
+      .pipeThrough(new CompressionStream("gzip")),
+  ).arrayBuffer();
+
+const callApiAnalyzeBatch = async (
+  itemSources,
   filters,
   apiEndpoint,
   apiKey,
   maxImagesPerItem,
+  onResult,
 ) => {
-  const headers = { "Content-Type": "application/json" };
+  const headers = {
+    "Content-Type": "application/json",
+    "Content-Encoding": "gzip",
+    Accept: "application/x-ndjson",
+  };
   if (apiKey) headers["X-API-Key"] = apiKey;
   apiEndpoint = apiEndpoint.replace(/\/+$/, "");
-  const resp = await fetch(`${apiEndpoint}/item/analyze`, {
+  const resp = await fetch(`${apiEndpoint}/items/analyze`, {
     method: "POST",
     headers,
-    body: JSON.stringify({
-      item: itemSource,
+    body: await gzipJson({
+      items: itemSources,
       filters,
       max_images: maxImagesPerItem,
     }),
   });
-  return resp.json();
+  if (!resp.ok) {
+    const body = await resp.json().catch(() => null);
+    const detail =
+      typeof body?.detail === "string" ? body.detail : resp.statusText;
+    throw new Error(`API error ${resp.status}${detail ? `: ${detail}` : ""}`);
+  }
+  const reader = resp.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (value) buffer += value;
+    const lines = buffer.split("\n");
+    buffer = done ? "" : lines.pop();
+    lines
+      .filter((line) => line.trim())
+      .forEach((line) => onResult(JSON.parse(line)));
+    if (done) break;
+  }
 };
 
 function updateItemStatus(items, filtersData, minMatch) {
@@ -103,6 +188,7 @@ function updateItemStatus(items, filtersData, minMatch) {
     const filterResults = filtersData[idx] || {};
     const matchCount = Object.values(filterResults).filter(Boolean).length;
     const statusDiv = getStatusDiv(item);
+    delete statusDiv.dataset.error;
     const ordered = Object.entries(filterResults).sort(([a], [b]) =>
       a.localeCompare(b),
     );
@@ -119,10 +205,21 @@ function updateItemStatus(items, filtersData, minMatch) {
   });
 }
 
+function showItemError(item, message) {
+  const statusDiv = getStatusDiv(item);
+  statusDiv.dataset.error = "true";
+  statusDiv.innerHTML =
+    '<div class="filtergenie-status-block"><span style="display:inline-flex;align-items:center;padding:2px 8px;border-radius:8px;font-size:13px;background:rgba(234,179,8,0.13);color:#facc15;margin-bottom:2px;max-width:100%;word-break:break-word;">⚠️ <span style="margin-left:5px;"></span></span></div>';
+  statusDiv.querySelector("span span").textContent = message;
+  // Not analyzed, so neither a match nor a non-match: keep it visible
+  item.style.display = "";
+}
+
 function updateItemVisibility(minMatch, maxItems) {
   if (!platform) return;
   [...platform.getItemElements()].slice(0, maxItems).forEach((item) => {
     const statusDiv = item.querySelector(".filtergenie-status");
+    if (statusDiv?.dataset.error) return;
     const matchCount = (statusDiv?.textContent.match(/✅/g) || []).length;
     item.style.display = matchCount >= minMatch ? "" : "none";
   });